@@ -0,0 +1,4 @@
+"""
+Suite di benchmark offline per il bot
+Gli script si lanciano dalla root del progetto, es: python -m benchmarks.bench_scraper
+"""
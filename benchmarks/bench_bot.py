@@ -0,0 +1,321 @@
+"""
+Test di carico end-to-end del bot con una finta Bot API
+Riproduce flussi sintetici (album, nome, prezzo, categoria, conferma) attraverso
+il vero ConversationHandler creato da build_application e misura la latenza di
+ogni fase e le chiamate API per prodotto pubblicato.
+
+Uso:
+    python -m benchmarks.bench_bot --products 5 --latency 0.05
+    python -m benchmarks.bench_bot --products 20 --rate 2 --retry-after-rate 0.05
+    python -m benchmarks.bench_bot --users 4 --products 5
+    python -m benchmarks.bench_bot --users 4 --products 5 --publish-workers 2
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List
+
+from benchmarks.fake_bot_api import FakeBotAPI
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+FAKE_TOKEN = '123456:LOAD-TEST-TOKEN'
+OPERATOR_ID = 700000001
+FAKE_CHANNELS = {'IT': '-1001000000001', 'EN': '-1001000000002', 'ES': '-1001000000003'}
+
+# Gruppo degli handler di misura: viene eseguito dopo che il ConversationHandler ha finito
+PROBE_GROUP = 99
+
+
+def _operator_ids(users: int) -> List[int]:
+    return [OPERATOR_ID + n for n in range(users)]
+
+
+def _configure_env(users: int = 1, publish_workers: int = 0):
+    """Configura token, operatori, canali finti e dati temporanei prima di importare il bot"""
+    os.environ['PUBLISH_WORKERS'] = str(publish_workers)
+    os.environ['BOT_TOKEN'] = FAKE_TOKEN
+    os.environ['DATA_DIR'] = tempfile.mkdtemp(prefix='bench-bot-')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    # Il monitor dei prezzi non deve partire durante il test
+    os.environ['MONITOR_INTERVAL_MINUTES'] = '0'
+    # Niente scraping anticipato: i link finti porterebbero Chrome e la rete nella misura
+    os.environ['DRAFT_PREFETCH'] = '0'
+    os.environ['ADMIN_USER_ID'] = str(OPERATOR_ID)
+    os.environ['ADMIN_USER_IDS'] = ','.join(str(uid) for uid in _operator_ids(users))
+    for lang, chat_id in FAKE_CHANNELS.items():
+        os.environ[f'CHANNEL_{lang}'] = chat_id
+
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    return {
+        'count': len(ordered),
+        'p50_ms': round(statistics.median(ordered) * 1000, 1),
+        'p95_ms': round(p95 * 1000, 1),
+        'max_ms': round(ordered[-1] * 1000, 1),
+    }
+
+
+class UpdateFactory:
+    """Genera update sintetici nel formato JSON della Bot API"""
+
+    def __init__(self):
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._media_groups = itertools.count(1)
+
+    def _user(self, user_id: int) -> Dict:
+        return {'id': user_id, 'is_bot': False, 'first_name': f'Operator{user_id}'}
+
+    def _message(self, user_id: int, **extra) -> Dict:
+        return {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': self._user(user_id),
+            **extra
+        }
+
+    def _update(self, **payload) -> Dict:
+        return {'update_id': next(self._update_ids), **payload}
+
+    def album(self, user_id: int, photos: int, link: str) -> List[Dict]:
+        group_id = f"album{next(self._media_groups)}"
+        updates = []
+        for idx in range(photos):
+            extra = {
+                'media_group_id': group_id,
+                'photo': [{
+                    'file_id': f'{group_id}-photo-{idx}',
+                    'file_unique_id': f'{group_id}-u-{idx}',
+                    'width': 1280, 'height': 1280
+                }]
+            }
+            if idx == 0:
+                extra['caption'] = link
+            updates.append(self._update(message=self._message(user_id, **extra)))
+        return updates
+
+    def text(self, user_id: int, text: str) -> Dict:
+        return self._update(message=self._message(user_id, text=text))
+
+    def callback(self, user_id: int, data: str) -> Dict:
+        return self._update(callback_query={
+            'id': str(next(self._update_ids)),
+            'from': self._user(user_id),
+            'chat_instance': str(user_id),
+            'data': data,
+            'message': self._message(user_id, text='keyboard', **{'from': {
+                'id': 999000111, 'is_bot': True, 'first_name': 'FakeBot'
+            }})
+        })
+
+
+class LoadHarness:
+    """Inietta update nella coda dell'Application e misura i tempi di elaborazione"""
+
+    def __init__(self, application, step_timeout: float = 60.0):
+        self.application = application
+        self.step_timeout = step_timeout
+        self.factory = UpdateFactory()
+        self.stage_times: Dict[str, List[float]] = defaultdict(list)
+        self.step_times: Dict[str, List[float]] = defaultdict(list)
+        self.product_times: List[float] = []
+        self.published = 0
+        self.timeouts = 0
+        self._pending: Dict[int, tuple] = {}
+
+    def instrument(self):
+        """Avvolge le callback degli handler per misurare il tempo di ogni fase"""
+        from telegram.ext import ConversationHandler, TypeHandler
+        from telegram import Update
+
+        def wrap(handler):
+            callback = handler.callback
+            name = getattr(callback, '__name__', repr(callback))
+
+            async def timed(update, context):
+                t0 = time.perf_counter()
+                try:
+                    return await callback(update, context)
+                finally:
+                    self.stage_times[name].append(time.perf_counter() - t0)
+
+            handler.callback = timed
+
+        for handlers in self.application.handlers.values():
+            for handler in handlers:
+                if isinstance(handler, ConversationHandler):
+                    nested = list(handler.entry_points) + list(handler.fallbacks)
+                    for state_handlers in handler.states.values():
+                        nested.extend(state_handlers)
+                    for inner in nested:
+                        wrap(inner)
+                else:
+                    wrap(handler)
+
+        self.application.add_handler(TypeHandler(Update, self._on_processed), group=PROBE_GROUP)
+
+    async def _on_processed(self, update, context):
+        pending = self._pending.pop(update.update_id, None)
+        if pending:
+            future, step, enqueued_at = pending
+            self.step_times[step].append(time.perf_counter() - enqueued_at)
+            if not future.done():
+                future.set_result(None)
+
+    async def _send(self, step: str, payloads: List[Dict]):
+        """Mette gli update in coda e aspetta che siano stati elaborati"""
+        from telegram import Update
+
+        loop = asyncio.get_running_loop()
+        futures = []
+        for data in payloads:
+            update = Update.de_json(data, self.application.bot)
+            future = loop.create_future()
+            self._pending[update.update_id] = (future, step, time.perf_counter())
+            futures.append(future)
+            await self.application.update_queue.put(update)
+        try:
+            await asyncio.wait_for(asyncio.gather(*futures), self.step_timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+
+    async def drain(self, bot, expected: int, timeout: float):
+        """Aspetta che gli esiti di tutte le pubblicazioni in coda siano stati consegnati"""
+        deadline = time.perf_counter() + timeout
+        while len(bot.published_posts.posts) < expected:
+            if time.perf_counter() > deadline:
+                self.timeouts += 1
+                return
+            await asyncio.sleep(0.05)
+
+    async def operator(self, user_id: int, products: int, photos: int, think_time: float, interval: float):
+        """Simula un operatore che pubblica prodotti uno dopo l'altro"""
+        started = time.perf_counter()
+        for n in range(products):
+            # Rispetta il ritmo richiesto (prodotti al secondo)
+            scheduled = started + n * interval
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            t0 = time.perf_counter()
+            link = f"https://www.oopbuy.com/product/?url=https://weidian.com/item.html?itemID={user_id}{n:04d}"
+            f = self.factory
+            await self._send('album', f.album(user_id, photos, link))
+            await asyncio.sleep(think_time)
+            await self._send('name', [f.text(user_id, f"Prodotto di test {n}")])
+            await asyncio.sleep(think_time)
+            await self._send('price', [f.text(user_id, "¥399")])
+            await asyncio.sleep(think_time)
+            await self._send('category', [f.callback(user_id, 'cat_shoes')])
+            await asyncio.sleep(think_time)
+            await self._send('confirm', [f.callback(user_id, 'confirm_publish')])
+            self.product_times.append(time.perf_counter() - t0)
+            self.published += 1
+
+
+async def run_load_test(args) -> Dict:
+    _configure_env(args.users, args.publish_workers)
+    from bot import AffiliateBot, build_application
+
+    with FakeBotAPI(
+        latency=args.latency,
+        retry_after_rate=args.retry_after_rate,
+        retry_after=args.retry_after,
+        seed=args.seed
+    ) as api:
+        bot = AffiliateBot()
+        application = build_application(bot, token=FAKE_TOKEN, base_url=api.base_url, base_file_url=api.base_file_url)
+        harness = LoadHarness(application, step_timeout=args.step_timeout)
+        harness.instrument()
+
+        # Stessa sequenza di run_polling, senza il polling
+        await application.initialize()
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        api.reset()
+
+        interval = 1.0 / args.rate if args.rate > 0 else 0.0
+        wall_start = time.perf_counter()
+        # Ogni operatore lavora alle sue bozze in parallelo agli altri
+        await asyncio.gather(*(
+            harness.operator(user_id, args.products, args.photos, args.think_time, interval)
+            for user_id in _operator_ids(args.users)
+        ))
+        # Con i worker di pubblicazione la conferma ritorna subito: aspetta gli esiti
+        if args.publish_workers:
+            await harness.drain(bot, harness.published, args.step_timeout)
+        wall = time.perf_counter() - wall_start
+
+        await application.stop()
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+        counts = api.method_counts()
+        throttled = sum(1 for call in api.calls if call['throttled'])
+
+    published = harness.published or 1
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'params': vars(args),
+        'published': harness.published,
+        'step_timeouts': harness.timeouts,
+        'wall_s': round(wall, 2),
+        'throughput_per_min': round(harness.published / wall * 60, 2) if wall else 0.0,
+        'product_latency': _percentiles(harness.product_times),
+        'stages': {name: _percentiles(v) for name, v in harness.stage_times.items()},
+        'steps': {name: _percentiles(v) for name, v in harness.step_times.items()},
+        'api_calls': dict(counts),
+        'api_calls_per_product': {m: round(c / published, 2) for m, c in counts.items()},
+        'throttled_calls': throttled,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test di carico del bot con una finta Bot API")
+    parser.add_argument('--users', type=int, default=1, help="Operatori che lavorano in parallelo")
+    parser.add_argument('--products', type=int, default=3, help="Prodotti da pubblicare per operatore")
+    parser.add_argument('--photos', type=int, default=4, help="Foto per album")
+    parser.add_argument('--rate', type=float, default=0.0, help="Prodotti avviati al secondo (0 = appena possibile)")
+    parser.add_argument('--think-time', type=float, default=0.0, help="Pausa (s) tra un passo e il successivo")
+    parser.add_argument('--latency', type=float, default=0.05, help="Latenza simulata della Bot API (s)")
+    parser.add_argument('--retry-after-rate', type=float, default=0.0, help="Probabilità di 429 sugli invii")
+    parser.add_argument('--retry-after', type=int, default=1, help="retry_after restituito con il 429")
+    parser.add_argument('--publish-workers', type=int, default=0, help="Processi di pubblicazione (0 = nel bot)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--step-timeout', type=float, default=60.0)
+    parser.add_argument('--no-save', action='store_true', help="Non salvare il risultato")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    report = asyncio.run(run_load_test(args))
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        path = os.path.join(RESULTS_DIR, f"bot-{stamp}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"💾 Risultato salvato in {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+Benchmark offline dello scraper
+Esegue scrape_product sulle pagine registrate servite in locale e misura
+latenza a freddo/a caldo, picco di memoria e tasso di successo.
+
+Uso:
+    python -m benchmarks.bench_scraper --runs 5
+    python -m benchmarks.bench_scraper --modes browser --baseline benchmarks/results/xyz.json
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.fixture_server import FixtureServer
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+# Soglia oltre la quale una metrica peggiorata viene segnalata come regressione
+REGRESSION_THRESHOLD = 0.20
+
+
+def _mode_browser() -> Callable[[str], Dict]:
+    """Percorso Selenium: un Chrome per ogni scraping, profilo secondo config"""
+    from scraper import ProductScraper
+    scraper = ProductScraper()
+    return scraper.scrape_product
+
+
+def _mode_browser_full() -> Callable[[str], Dict]:
+    """Percorso Selenium con il profilo leggero disattivato (pagina completa)"""
+    from scraper import ProductScraper
+    scraper = ProductScraper()
+    scraper.lean_sites = []
+    return scraper.scrape_product
+
+
+def _mode_worker() -> Callable[[str], Dict]:
+    """Percorso Selenium eseguito nel worker isolato (include il costo dell'IPC)"""
+    from scraper_worker import ScraperWorker
+    worker = ScraperWorker()
+    return worker.scrape_product
+
+
+def _mode_tabs() -> Callable[[str], Dict]:
+    """Motore a schede: un solo Chrome nel worker isolato, una scheda per scraping"""
+    from scraper_tabs import TabScraperWorker
+    worker = TabScraperWorker()
+    return worker.scrape_product
+
+
+def _mode_extract() -> Callable[[str], Dict]:
+    """Solo le strategie senza browser degli estrattori (JSON incorporato, metadati)"""
+    from extractors import extract
+    return lambda url: extract(url, None)
+
+
+# Modalità di scraping misurabili: nome -> factory che restituisce la funzione di scraping
+MODES: Dict[str, Callable[[], Callable[[str], Dict]]] = {
+    'browser': _mode_browser,
+    'browser_full': _mode_browser_full,
+    'worker': _mode_worker,
+    'tabs': _mode_tabs,
+    'extract': _mode_extract,
+}
+
+
+def _max_rss_mb(who: int) -> float:
+    """Picco di memoria residente (ru_maxrss è in KB su Linux, byte su macOS)"""
+    rss = resource.getrusage(who).ru_maxrss
+    if sys.platform == 'darwin':
+        rss /= 1024
+    return round(rss / 1024, 1)
+
+
+def _is_success(result: Dict, expected: Dict) -> bool:
+    """Lo scraping è riuscito se il prezzo estratto contiene quello atteso"""
+    if not result.get('success'):
+        return False
+    price = result.get('price') or ''
+    return expected['price'] in price.replace(',', '')
+
+
+def _run_mode(mode: str, pages: List[Dict], runs: int, queue) -> None:
+    """Eseguito in un processo dedicato per avere misure a freddo e di memoria pulite"""
+    logging.basicConfig(level=logging.WARNING)
+    stats = {'cold_ms': {}, 'warm_ms': {}, 'attempts': 0, 'successes': 0, 'errors': []}
+
+    t0 = time.perf_counter()
+    scrape = MODES[mode]()
+    stats['setup_ms'] = round((time.perf_counter() - t0) * 1000, 1)
+
+    for page in pages:
+        samples = []
+        for run in range(runs + 1):
+            t0 = time.perf_counter()
+            try:
+                result = scrape(page['url'])
+            except Exception as e:
+                result = {'success': False, 'error': str(e)}
+            elapsed = round((time.perf_counter() - t0) * 1000, 1)
+
+            stats['attempts'] += 1
+            if _is_success(result, page['expected']):
+                stats['successes'] += 1
+            elif result.get('error'):
+                stats['errors'].append(f"{page['name']}: {result['error']}")
+
+            # La prima esecuzione sulla prima pagina è quella "a freddo"
+            if run == 0 and not stats['cold_ms']:
+                stats['cold_ms'][page['name']] = elapsed
+            else:
+                samples.append(elapsed)
+
+        if samples:
+            stats['warm_ms'][page['name']] = {
+                'p50': round(statistics.median(samples), 1),
+                'mean': round(statistics.fmean(samples), 1),
+                'max': max(samples),
+            }
+
+    stats['success_rate'] = round(stats['successes'] / stats['attempts'], 3) if stats['attempts'] else 0.0
+    stats['rss_self_max_mb'] = _max_rss_mb(resource.RUSAGE_SELF)
+    # Include Chrome e chromedriver, che sono processi figli
+    stats['rss_children_max_mb'] = _max_rss_mb(resource.RUSAGE_CHILDREN)
+    stats['errors'] = stats['errors'][:20]
+    queue.put(stats)
+
+
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+def _summary_metrics(stats: Dict) -> Dict[str, float]:
+    """Riduce le statistiche di una modalità alle metriche confrontabili tra versioni"""
+    warm = [v['p50'] for v in stats.get('warm_ms', {}).values()]
+    return {
+        'cold_ms': sum(stats.get('cold_ms', {}).values()),
+        'warm_p50_ms': statistics.fmean(warm) if warm else 0.0,
+        'rss_children_max_mb': stats.get('rss_children_max_mb', 0.0),
+        'rss_self_max_mb': stats.get('rss_self_max_mb', 0.0),
+        'failure_rate': 1.0 - stats.get('success_rate', 0.0),
+    }
+
+
+def compare_results(current: Dict, baseline: Dict) -> List[str]:
+    """Confronta due risultati e restituisce le regressioni trovate"""
+    regressions = []
+    for mode, stats in current['modes'].items():
+        if mode not in baseline.get('modes', {}):
+            continue
+        now = _summary_metrics(stats)
+        before = _summary_metrics(baseline['modes'][mode])
+        for metric, value in now.items():
+            old = before[metric]
+            if metric == 'failure_rate':
+                worse = value > old + 1e-9
+            else:
+                worse = old > 0 and (value - old) / old > REGRESSION_THRESHOLD
+            if worse:
+                regressions.append(f"{mode}.{metric}: {old:.3f} -> {value:.3f}")
+    return regressions
+
+
+def _latest_result() -> Optional[str]:
+    if not os.path.isdir(RESULTS_DIR):
+        return None
+    files = sorted(
+        f for f in os.listdir(RESULTS_DIR) if f.startswith('scraper-') and f.endswith('.json')
+    )
+    return os.path.join(RESULTS_DIR, files[-1]) if files else None
+
+
+def run_benchmark(modes: List[str], runs: int, asset_delay: float) -> Dict:
+    """Avvia il server delle fixture ed esegue ogni modalità in un processo separato"""
+    result = {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'git_rev': _git_rev(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'runs': runs,
+        'asset_delay': asset_delay,
+        'modes': {},
+    }
+
+    ctx = multiprocessing.get_context('spawn')
+    with FixtureServer(asset_delay=asset_delay) as server:
+        pages = [
+            {**page, 'url': server.url_for(page)} for page in server.manifest['pages']
+        ]
+        for mode in modes:
+            print(f"▶️  Modalità {mode}...")
+            queue = ctx.Queue()
+            proc = ctx.Process(target=_run_mode, args=(mode, pages, runs, queue))
+            proc.start()
+            proc.join()
+            result['modes'][mode] = queue.get() if not queue.empty() else {
+                'success_rate': 0.0, 'errors': [f"processo terminato con codice {proc.exitcode}"]
+            }
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline dello scraper")
+    parser.add_argument('--modes', nargs='+', default=list(MODES), choices=list(MODES))
+    parser.add_argument('--runs', type=int, default=3, help="Esecuzioni a caldo per pagina")
+    parser.add_argument('--asset-delay', type=float, default=0.05,
+                        help="Ritardo simulato (s) per ogni asset della pagina")
+    parser.add_argument('--baseline', help="Risultato precedente da confrontare (default: l'ultimo salvato)")
+    parser.add_argument('--no-save', action='store_true', help="Non salvare il risultato")
+    args = parser.parse_args()
+
+    baseline_path = args.baseline or _latest_result()
+    result = run_benchmark(args.modes, args.runs, args.asset_delay)
+
+    print(json.dumps(result['modes'], indent=2, ensure_ascii=False))
+
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        path = os.path.join(RESULTS_DIR, f"scraper-{stamp}-{result['git_rev'] or 'norev'}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        print(f"💾 Risultato salvato in {path}")
+
+    if baseline_path:
+        with open(baseline_path, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_results(result, baseline)
+        if regressions:
+            print(f"⚠️ Regressioni rispetto a {os.path.basename(baseline_path)}:")
+            for line in regressions:
+                print(f"  - {line}")
+            sys.exit(1)
+        print(f"✅ Nessuna regressione rispetto a {os.path.basename(baseline_path)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Report dei tempi di avvio del bot (import + init)
+Avvia un interprete pulito con -X importtime, crea AffiliateBot e l'Application
+senza fare polling e riporta i moduli più lenti da importare.
+
+Uso:
+    python -m benchmarks.bench_startup --runs 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+from typing import Dict, List
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Moduli pesanti che non devono essere caricati all'avvio del bot
+LAZY_MODULES = ('selenium', 'webdriver_manager', 'bs4', 'scraper')
+
+PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import bot
+t1 = time.perf_counter()
+application = bot.build_application(bot.AffiliateBot())
+t2 = time.perf_counter()
+print(json.dumps({
+    'import_ms': (t1 - t0) * 1000,
+    'init_ms': (t2 - t1) * 1000,
+    'loaded_lazy_modules': [m for m in %r if m in sys.modules],
+}))
+""" % (LAZY_MODULES,)
+
+
+def _parse_importtime(stderr: str) -> List[Dict]:
+    """Estrae i moduli importati direttamente da bot e il loro tempo cumulativo (-X importtime)"""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3:
+            continue
+        cumulative_us, name = fields[1].strip(), fields[2]
+        # Ogni livello di annidamento aggiunge due spazi (il primo spazio è il separatore)
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        if cumulative_us.isdigit() and depth == 1:
+            modules.append({'module': name.strip(), 'cumulative_ms': int(cumulative_us) / 1000})
+    return sorted(modules, key=lambda m: m['cumulative_ms'], reverse=True)
+
+
+def measure_once() -> Dict:
+    env = dict(os.environ)
+    env.setdefault('BOT_TOKEN', '123456:STARTUP-PROBE')
+    env.setdefault('ADMIN_USER_ID', '1')
+    env['DATA_DIR'] = tempfile.mkdtemp(prefix='bench-startup-')
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE],
+        cwd=PROJECT_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result['top_imports'] = _parse_importtime(proc.stderr)[:10]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report dei tempi di avvio del bot")
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--no-save', action='store_true', help="Non salvare il risultato")
+    args = parser.parse_args()
+
+    samples = [measure_once() for _ in range(args.runs)]
+    report = {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'runs': args.runs,
+        'import_ms_p50': round(statistics.median(s['import_ms'] for s in samples), 1),
+        'init_ms_p50': round(statistics.median(s['init_ms'] for s in samples), 1),
+        'loaded_lazy_modules': samples[-1]['loaded_lazy_modules'],
+        'top_imports': samples[-1]['top_imports'],
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        path = os.path.join(RESULTS_DIR, f"startup-{stamp}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"💾 Risultato salvato in {path}")
+
+    if report['loaded_lazy_modules']:
+        print(f"⚠️ Moduli di scraping caricati all'avvio: {', '.join(report['loaded_lazy_modules'])}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
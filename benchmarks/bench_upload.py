@@ -0,0 +1,128 @@
+"""
+Benchmark del caricamento delle foto locali: upload via HTTP contro server Bot API locale
+Pubblica la stessa bozza con foto locali (come quelle scaricate dallo scraping
+in downloaded_images/) sulla finta Bot API, prima caricando i file via multipart e poi in
+modalità locale (--local), dove il server li legge dal disco tramite file://.
+Il report confronta tempo di pubblicazione e byte inviati al server.
+
+Uso:
+    python -m benchmarks.bench_upload --photos 8 --size-kb 2048
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Dict, List
+
+from benchmarks.fake_bot_api import FakeBotAPI
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+FAKE_TOKEN = '123456:UPLOAD-TEST-TOKEN'
+FAKE_CHANNELS = {'IT': '-1001000000001', 'EN': '-1001000000002', 'ES': '-1001000000003'}
+
+
+def _configure_env():
+    """Canali finti e dati temporanei prima di importare i moduli del bot"""
+    os.environ['BOT_TOKEN'] = FAKE_TOKEN
+    os.environ['DATA_DIR'] = tempfile.mkdtemp(prefix='bench-upload-')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    for lang, chat_id in FAKE_CHANNELS.items():
+        os.environ[f'CHANNEL_{lang}'] = chat_id
+
+
+def _make_photos(count: int, size_kb: int) -> List[str]:
+    """File finti al posto delle immagini scaricate (la finta API non ne legge il contenuto)"""
+    folder = tempfile.mkdtemp(prefix='bench-upload-images-')
+    paths = []
+    for idx in range(count):
+        path = os.path.join(folder, f"product_{idx}.jpg")
+        with open(path, 'wb') as f:
+            f.write(os.urandom(size_kb * 1024))
+        paths.append(path)
+    return paths
+
+
+async def _publish_once(api: FakeBotAPI, photos: List[str], local_mode: bool) -> Dict:
+    from telegram import Bot
+    from publisher import publish_draft
+    from rate_limit import RateLimiter
+
+    draft = {
+        'product_name': "Prodotto di test",
+        'price': "¥399",
+        'price_by_lang': {},
+        'referral_link': "https://example.com/item/1",
+        'category': 'shoes',
+        'photos': photos,
+        'photos_are_urls': True,
+        'photo_uids': [],
+        'photo_hashes': [],
+    }
+    api.local_mode = local_mode
+    api.reset()
+    bot = Bot(FAKE_TOKEN, base_url=api.base_url, base_file_url=api.base_file_url, local_mode=local_mode)
+    async with bot:
+        started = time.perf_counter()
+        results = await publish_draft(bot, RateLimiter(per_chat_interval=0), draft)
+        elapsed = time.perf_counter() - started
+    return {
+        'seconds': elapsed,
+        'ok': all(result['success'] for result in results.values()),
+        'errors': [result['error'] for result in results.values() if result['error']],
+        'request_bytes': sum(call['bytes'] for call in api.calls),
+        'local_files': api.local_files,
+    }
+
+
+async def run_benchmark(args) -> Dict:
+    _configure_env()
+    photos = _make_photos(args.photos, args.size_kb)
+    report = {}
+    with FakeBotAPI(latency=args.latency) as api:
+        for mode, local_mode in (('upload', False), ('local', True)):
+            runs = [await _publish_once(api, photos, local_mode) for _ in range(args.runs)]
+            report[mode] = {
+                'success': all(run['ok'] for run in runs),
+                'errors': sorted({error for run in runs for error in run['errors']}),
+                'median_ms': round(statistics.median(run['seconds'] for run in runs) * 1000, 1),
+                'request_mb': round(runs[-1]['request_bytes'] / (1024 * 1024), 2),
+                'files_read_by_server': runs[-1]['local_files'],
+            }
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'params': vars(args),
+        **report,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Upload via HTTP contro server Bot API in modalità locale")
+    parser.add_argument('--photos', type=int, default=6, help="Foto per album")
+    parser.add_argument('--size-kb', type=int, default=1024, help="Dimensione di ogni foto (KB)")
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.0, help="Latenza simulata della Bot API (s)")
+    parser.add_argument('--no-save', action='store_true', help="Non salvare il risultato")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    report = asyncio.run(run_benchmark(args))
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        path = os.path.join(RESULTS_DIR, f"upload-{stamp}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"💾 Risultato salvato in {path}")
+
+
+if __name__ == "__main__":
+    main()
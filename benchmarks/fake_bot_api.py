@@ -0,0 +1,301 @@
+"""
+Finta Bot API di Telegram per i test di carico
+Registra ogni chiamata, simula la latenza di rete e risposte 429 (RetryAfter).
+Con local_mode=True si comporta come un server self-hosted avviato con --local:
+accetta le foto passate come file:// e le legge dal disco.
+"""
+
+import email.parser
+import email.policy
+import hashlib
+import itertools
+import json
+import os
+import random
+import struct
+import threading
+import time
+import zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, unquote, urlsplit
+
+FAKE_BOT_ID = 999000111
+
+# Metodi che possono ricevere un 429 simulato (quelli che pubblicano contenuti)
+RATE_LIMITED_METHODS = {'sendMessage', 'sendMediaGroup', 'sendPhoto', 'editMessageReplyMarkup', 'editMessageCaption'}
+
+
+def _fake_thumbnail(file_id: str, size: int = 16) -> bytes:
+    """PNG in scala di grigi con pixel derivati dal file_id: foto diverse, impronte diverse"""
+    seed = hashlib.sha256(file_id.encode()).digest()
+    rows = b''.join(
+        b'\x00' + bytes(seed[(y * size + x) % len(seed)] ^ ((x * 7 + y * 13) & 0xFF) for x in range(size))
+        for y in range(size)
+    )
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    return (
+        b'\x89PNG\r\n\x1a\n'
+        + chunk(b'IHDR', struct.pack('>IIBBBBB', size, size, 8, 0, 0, 0, 0))
+        + chunk(b'IDAT', zlib.compress(rows))
+        + chunk(b'IEND', b'')
+    )
+
+
+class ApiError(Exception):
+    """Errore restituito dalla finta API con status 400"""
+
+
+def _parse_params(content_type: str, body: bytes) -> Dict[str, str]:
+    """Decodifica i parametri di una richiesta della Bot API (form, multipart o JSON)"""
+    if not body:
+        return {}
+    if content_type.startswith('application/json'):
+        return json.loads(body)
+    if content_type.startswith('multipart/form-data'):
+        message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+            b'Content-Type: ' + content_type.encode() + b'\r\n\r\n' + body
+        )
+        params = {}
+        for part in message.iter_parts():
+            name = part.get_param('name', header='content-disposition')
+            if name and part.get_filename() is None:
+                params[name] = part.get_content()
+        return params
+    return {key: values[0] for key, values in parse_qs(body.decode()).items()}
+
+
+class FakeBotAPI:
+    """
+    Server HTTP che risponde come la Bot API
+
+    Args:
+        latency: Latenza simulata (s) per ogni chiamata
+        retry_after_rate: Probabilità che un invio riceva 429 Too Many Requests
+        retry_after: Valore di retry_after restituito con il 429
+        seed: Seed per rendere riproducibili i 429 simulati
+        local_mode: Simula un server Bot API avviato con --local (foto via file://)
+    """
+
+    def __init__(
+        self,
+        host: str = '127.0.0.1',
+        port: int = 0,
+        latency: float = 0.0,
+        retry_after_rate: float = 0.0,
+        retry_after: int = 1,
+        seed: int = 0,
+        local_mode: bool = False
+    ):
+        self.latency = latency
+        self.local_mode = local_mode
+        self.retry_after_rate = retry_after_rate
+        self.retry_after = retry_after
+        self.calls: List[Dict] = []
+        # Foto lette dal disco in modalità locale (numero e byte)
+        self.local_files = 0
+        self.local_bytes = 0
+        self._random = random.Random(seed)
+        self._message_ids = itertools.count(1000)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        """Da passare come base_url all'Application (il token viene aggiunto da PTB)"""
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/bot"
+
+    @property
+    def base_file_url(self) -> str:
+        """Da passare come base_file_url: i download restituiscono miniature PNG generate"""
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/file/bot"
+
+    def method_counts(self) -> Counter:
+        """Numero di chiamate per metodo"""
+        with self._lock:
+            return Counter(call['method'] for call in self.calls)
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+            self.local_files = 0
+            self.local_bytes = 0
+
+    # ---------- Costruzione risposte ----------
+
+    def _message(self, params: Dict, **extra) -> Dict:
+        chat_id = params.get('chat_id', 0)
+        try:
+            chat_id = int(chat_id)
+            chat = {'id': chat_id, 'type': 'private' if chat_id > 0 else 'channel'}
+        except (TypeError, ValueError):
+            # Ogni username ha il suo ID numerico stabile
+            username = str(chat_id).lstrip('@')
+            chat = {'id': -1002000000000 - zlib.crc32(username.encode()), 'type': 'channel', 'username': username}
+        return {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': chat,
+            **extra
+        }
+
+    def _check_media(self, media: str) -> None:
+        """Come la Bot API: file:// solo in modalità locale e solo per file esistenti"""
+        if not media.startswith('file://'):
+            return
+        if not self.local_mode:
+            raise ApiError("Bad Request: wrong file identifier/HTTP URL specified")
+        path = unquote(urlsplit(media).path)
+        if not os.path.isfile(path):
+            raise ApiError(f"Bad Request: file {path} not found")
+        with self._lock:
+            self.local_files += 1
+            self.local_bytes += os.path.getsize(path)
+
+    def _result_for(self, method: str, params: Dict):
+        if method == 'getMe':
+            return {
+                'id': FAKE_BOT_ID, 'is_bot': True, 'first_name': 'FakeBot',
+                'username': 'fake_load_test_bot', 'can_join_groups': True,
+                'can_read_all_group_messages': False, 'supports_inline_queries': False
+            }
+        if method == 'sendMessage':
+            return self._message(params, text=params.get('text', ''))
+        if method == 'sendPhoto':
+            return self._message(params, photo=[{
+                'file_id': 'fake-photo', 'file_unique_id': 'fake-photo-u', 'width': 90, 'height': 90
+            }])
+        if method == 'sendMediaGroup':
+            media = params.get('media', '[]')
+            items = json.loads(media) if isinstance(media, str) else media
+            for item in items:
+                self._check_media(item.get('media', ''))
+            group_id = str(next(self._message_ids))
+            return [
+                self._message(params, media_group_id=group_id, photo=[{
+                    'file_id': f'fake-photo-{idx}', 'file_unique_id': f'fake-u-{idx}',
+                    'width': 90, 'height': 90
+                }])
+                for idx, _ in enumerate(items)
+            ]
+        if method in ('editMessageText', 'editMessageReplyMarkup', 'editMessageCaption'):
+            if 'inline_message_id' in params:
+                return True
+            return self._message(params, text=params.get('text', ''))
+        if method == 'getChat':
+            return self._message(params)['chat']
+        if method == 'getChatMember':
+            return {
+                'status': 'administrator',
+                'user': {'id': FAKE_BOT_ID, 'is_bot': True, 'first_name': 'FakeBot'},
+                'can_be_edited': False, 'is_anonymous': False, 'can_manage_chat': True,
+                'can_delete_messages': True, 'can_manage_video_chats': False,
+                'can_restrict_members': False, 'can_promote_members': False,
+                'can_change_info': False, 'can_invite_users': True,
+                'can_post_messages': True, 'can_edit_messages': True
+            }
+        if method == 'getFile':
+            file_id = params.get('file_id', '')
+            return {
+                'file_id': file_id, 'file_unique_id': f'{file_id}-u',
+                'file_size': len(_fake_thumbnail(file_id)), 'file_path': f'photos/{file_id}.png'
+            }
+        if method == 'getUpdates':
+            return []
+        return True
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                if not self.path.startswith('/file/'):
+                    return self.do_POST()
+                file_id = self.path.rsplit('/', 1)[-1].rsplit('.', 1)[0]
+                with server._lock:
+                    server.calls.append({'method': 'downloadFile', 'time': time.time(), 'bytes': 0, 'throttled': False})
+                body = _fake_thumbnail(file_id)
+                self.send_response(200)
+                self.send_header('Content-Type', 'image/png')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length)
+                method = self.path.rsplit('/', 1)[-1]
+                params = _parse_params(self.headers.get('Content-Type', ''), body)
+
+                started = time.time()
+                if server.latency:
+                    time.sleep(server.latency)
+
+                with server._lock:
+                    throttled = (
+                        method in RATE_LIMITED_METHODS
+                        and server._random.random() < server.retry_after_rate
+                    )
+                    server.calls.append({
+                        'method': method,
+                        'time': started,
+                        'bytes': len(body),
+                        'throttled': throttled,
+                    })
+                error = None
+                if not throttled:
+                    try:
+                        result = server._result_for(method, params)
+                    except ApiError as e:
+                        error = str(e)
+
+                if throttled:
+                    payload = {
+                        'ok': False,
+                        'error_code': 429,
+                        'description': f"Too Many Requests: retry after {server.retry_after}",
+                        'parameters': {'retry_after': server.retry_after}
+                    }
+                    self._send(429, payload)
+                elif error is not None:
+                    self._send(400, {'ok': False, 'error_code': 400, 'description': error})
+                else:
+                    self._send(200, {'ok': True, 'result': result})
+
+            def _send(self, status: int, payload: Dict):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> 'FakeBotAPI':
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,119 @@
+"""
+Server HTTP locale che serve le pagine registrate di Oopbuy e Weidian
+Permette di misurare lo scraper senza contattare i siti reali
+"""
+
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def load_manifest() -> Dict:
+    """Carica il manifest con pagine e asset registrati"""
+    with open(os.path.join(FIXTURES_DIR, 'manifest.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+
+class FixtureServer:
+    """
+    Server delle fixture in un thread separato
+
+    Le pagine vengono servite al loro path registrato, gli asset (immagini,
+    font, CSS, JS, video) sono generati con la dimensione indicata nel
+    manifest e con un ritardo opzionale per simulare la rete reale.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, asset_delay: float = 0.0):
+        self.manifest = load_manifest()
+        self.asset_delay = asset_delay
+        self.requests_log: List[str] = []
+        self._pages = {
+            urlsplit(page['path']).path: page for page in self.manifest['pages']
+        }
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def url_for(self, page: Dict) -> str:
+        """URL completo di una pagina del manifest"""
+        return self.base_url + page['path']
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = urlsplit(self.path).path
+                server.requests_log.append(path)
+
+                if path in server._pages:
+                    page = server._pages[path]
+                    with open(os.path.join(FIXTURES_DIR, page['file']), 'rb') as f:
+                        body = f.read()
+                    self._send(200, 'text/html; charset=utf-8', body)
+                    return
+
+                if path.startswith('/assets/'):
+                    asset = server.manifest['assets'].get(path[len('/assets/'):])
+                    if asset:
+                        if server.asset_delay:
+                            time.sleep(server.asset_delay)
+                        self._send(200, asset['type'], b' ' * asset['size'])
+                        return
+
+                self._send(404, 'text/plain', b'not found')
+
+            def _send(self, status: int, content_type: str, body: bytes):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # Il browser può chiudere la connessione (es. risorse bloccate)
+                    pass
+
+            def log_message(self, format, *args):
+                # Silenzia il log di default su stderr
+                pass
+
+        return Handler
+
+    def start(self) -> 'FixtureServer':
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    with FixtureServer(port=8765) as server:
+        for page in server.manifest['pages']:
+            print(f"{page['name']}: {server.url_for(page)}")
+        print("Premi Ctrl+C per fermare il server")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
@@ -3,46 +3,92 @@ Telegram Bot per Affiliate Marketing - Main File
 Bot multilingua per pubblicare prodotti su diversi canali Telegram
 """
 
+import time
+
+# Istante di avvio dell'import, per il report dei tempi di avvio
+_IMPORT_STARTED = time.perf_counter()
+
 import logging
 import re
 import asyncio
 from typing import List, Dict, Optional
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, ReplyKeyboardRemove
+from telegram.error import TelegramError
 from telegram.ext import (
     Application,
     CommandHandler,
     MessageHandler,
     CallbackQueryHandler,
     ConversationHandler,
+    TypeHandler,
     filters,
     ContextTypes
 )
 from telegram.constants import ParseMode
-import os
 
 # Import configurazioni e moduli personalizzati
 from config import (
     BOT_TOKEN,
     ADMIN_USER_ID,
+    ADMIN_USER_IDS,
+    CONCURRENT_UPDATES,
+    PREFLIGHT_TIMEOUT,
+    BOT_API_BASE_URL,
+    BOT_API_FILE_URL,
+    BOT_API_LOCAL_MODE,
     CHANNELS,
     CATEGORIES,
+    CATEGORY_AUTO_SELECT,
     STATE_WAITING_CATEGORY,
     STATE_WAITING_PRICE,
     STATE_PREVIEW,
     STATE_CONFIRM,
     STATE_WAITING_PHOTOS,
     STATE_WAITING_PRODUCT_NAME,
-    LOG_LEVEL,
-    LOG_FORMAT
+    MONITOR_INTERVAL_MINUTES,
+    PUBLISH_WORKERS,
+    PUBLISH_POLL_SECONDS,
+    PHASH_MAX_DISTANCE,
+    DRAFT_TTL_MINUTES,
+    DRAFT_PREFETCH,
+    SCRAPER_ENGINE,
+    DIGEST_MODE,
+    DIGEST_MAX_PRODUCTS,
+    DIGEST_FLUSH_MINUTES
 )
-from scraper import ProductScraper
-from templates import create_post_caption, get_bot_messages, SYSTEM_MESSAGES
-
-# Configurazione logging
-logging.basicConfig(
-    format=LOG_FORMAT,
-    level=getattr(logging, LOG_LEVEL)
+from classifier import classify
+from digest import DigestQueue, build_digest
+from drafts import (
+    EVICTED_KEY,
+    PHOTO_HASH_TASKS_KEY,
+    SWEEP_INTERVAL,
+    DraftJanitor,
+    discard_draft,
+    settle_photo_hashes,
+    touch
 )
+from duplicates import PublishedIndex, canonical_item_id
+from fanout import Fanout, FanoutStore
+from http_pools import build_bot_request, build_updates_request
+import image_hash
+from post_editor import delete_post, edit_post
+import prefetch
+from price_monitor import PriceMonitor
+from preflight import run_preflight
+from pricing import parse_price, render_prices
+from published_store import PublishedStore
+from publisher import build_draft, publish_draft, record_publication
+from rate_limit import RateLimiter
+from templates import build_captions, get_bot_messages, SYSTEM_MESSAGES
+from log_setup import setup_logging
+from metrics import metrics
+from update_processor import ConversationOrderedProcessor
+
+# Tempo speso negli import del modulo (lo scraping non è incluso: viene caricato al primo uso)
+_IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
+
+# Configurazione logging (coda non bloccante, livelli per modulo da LOG_LEVEL)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 
@@ -51,9 +97,44 @@ class AffiliateBot:
     
     def __init__(self):
         """Inizializza il bot"""
-        self.scraper = ProductScraper()
+        # Lo scraping (Selenium, webdriver-manager, BeautifulSoup) viene caricato al primo uso
+        self._scraper = None
+        self.published_index = PublishedIndex()
+        self.published_posts = PublishedStore()
+        # Stato per canale delle pubblicazioni non completate (vedi fanout.py)
+        self.fanouts = FanoutStore()
+        self._fanouts_running = set()
+        # Prodotti confermati in attesa del digest (solo con DIGEST_MODE)
+        self.digest_queue = DigestQueue()
+        self.rate_limiter = RateLimiter()
+        # Pool di worker di pubblicazione (solo con PUBLISH_WORKERS > 0, vedi build_application)
+        self.publisher_pool = None
+        self.price_monitor = PriceMonitor(
+            self.published_posts,
+            scrape=lambda url: self.scraper.scrape(url, background=True),
+            is_busy=lambda: self._scraper is not None and self._scraper.busy,
+            limiter=self.rate_limiter
+        )
         self.messages = get_bot_messages('IT')  # Messaggi in italiano per l'admin
         
+    @property
+    def scraper(self):
+        """
+        Componente di scraping, importato e creato solo al primo utilizzo
+        Lo scraping gira in un processo figlio supervisionato (vedi scraper_worker.py),
+        con un Chrome per link o con un solo Chrome a schede (SCRAPER_ENGINE=tabs)
+        """
+        if self._scraper is None:
+            started = time.perf_counter()
+            if SCRAPER_ENGINE == 'tabs':
+                from scraper_tabs import TabScraperWorker
+                self._scraper = TabScraperWorker()
+            else:
+                from scraper_worker import ScraperWorker
+                self._scraper = ScraperWorker()
+            logger.info("Componente di scraping caricato in %.0f ms", (time.perf_counter() - started) * 1000)
+        return self._scraper
+    
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         """
         Handler per il comando /start
@@ -62,12 +143,12 @@ class AffiliateBot:
         user_id = update.effective_user.id
         
         # Verifica se l'utente è autorizzato
-        if user_id != ADMIN_USER_ID:
+        if user_id not in ADMIN_USER_IDS:
             await update.message.reply_text(
                 self.messages['unauthorized'],
                 parse_mode=ParseMode.MARKDOWN
             )
-            logger.warning(f"Tentativo di accesso non autorizzato da user_id: {user_id}")
+            logger.warning("Tentativo di accesso non autorizzato da user_id: %s", user_id)
             return ConversationHandler.END
         
         # Benvenuto all'admin
@@ -76,9 +157,152 @@ class AffiliateBot:
             parse_mode=ParseMode.MARKDOWN
         )
         
-        logger.info(f"Admin {user_id} ha avviato il bot")
+        logger.info("Admin %s ha avviato il bot", user_id)
         return ConversationHandler.END
     
+    async def _check_duplicate(
+        self,
+        message,
+        context: ContextTypes.DEFAULT_TYPE,
+        link: Optional[str] = None,
+        fingerprint: Optional[str] = None,
+        photo_hash: Optional[int] = None
+    ) -> bool:
+        """
+        Avvisa l'admin se il link o la foto (identica o quasi) risultano già pubblicati
+        Il controllo è un lookup in memoria e avviene prima di scraping e upload
+
+        Returns:
+            True se il link o la foto risultano già pubblicati (l'avviso parte una volta sola)
+        """
+        entry = None
+        if link:
+            entry = self.published_index.find_item(link)
+        if not entry and fingerprint:
+            entry = self.published_index.find_media([fingerprint])
+        if not entry and photo_hash is not None:
+            entry = self.published_index.find_similar(photo_hash)
+        
+        if entry and not context.user_data.get('duplicate_warned'):
+            context.user_data['duplicate_warned'] = True
+            published_on = time.strftime('%d/%m/%Y', time.localtime(entry['published_at']))
+            logger.info("Possibile duplicato di %s", entry['item_id'])
+            await message.reply_text(
+                self.messages['duplicate_warning'].format(
+                    product=entry['product_name'],
+                    date=published_on
+                )
+            )
+        return entry is not None
+    
+    async def _photo_hash(self, bot, message) -> Optional[int]:
+        """
+        Impronta percettiva della foto, calcolata sulla miniatura più piccola
+        (pochi KB da scaricare); None se Pillow manca o il download fallisce
+        """
+        if not image_hash.available():
+            return None
+        try:
+            telegram_file = await bot.get_file(message.photo[0].file_id)
+            data = await telegram_file.download_as_bytearray()
+        except TelegramError as e:
+            logger.warning("Miniatura della foto non scaricabile: %s", e)
+            return None
+        return await asyncio.to_thread(image_hash.dhash, bytes(data))
+
+    async def _add_photo(self, message, context: ContextTypes.DEFAULT_TYPE, photos: List[str]) -> None:
+        """
+        Aggiunge alla bozza la foto del messaggio e controlla i duplicati
+
+        Il controllo sulle foto identiche è immediato; l'impronta percettiva viene
+        calcolata in background (vedi _start_photo_hash), senza ritardare la risposta.
+        """
+        photo = message.photo[-1]
+        photos.append(photo.file_id)
+        context.user_data.setdefault('photo_uids', []).append(photo.file_unique_id)
+
+        await self._check_duplicate(message, context, fingerprint=photo.file_unique_id)
+        if image_hash.available():
+            self._start_photo_hash(message, context, photos)
+
+    def _start_photo_hash(self, message, context: ContextTypes.DEFAULT_TYPE, photos: List[str]) -> asyncio.Task:
+        """
+        Calcola in background l'impronta percettiva della foto e controlla i doppioni
+
+        Una foto quasi uguale a un'altra già nella bozza viene tolta (capita con gli
+        album che ripetono lo stesso scatto); una già pubblicata genera l'avviso.
+        """
+        photo = message.photo[-1]
+        user_data = context.user_data
+
+        async def run() -> None:
+            photo_hash = await self._photo_hash(context.bot, message)
+            # La bozza può essere stata annullata o azzerata mentre l'impronta era in calcolo
+            if photo_hash is None or photo.file_id not in photos:
+                return
+            # Le altre foto dell'album possono essere già state registrate
+            draft_hashes = user_data.setdefault('photo_hashes', {})
+            for file_id, other in draft_hashes.items():
+                if file_id in photos and image_hash.hamming(photo_hash, other) <= PHASH_MAX_DISTANCE:
+                    photos.remove(photo.file_id)
+                    photo_uids = user_data.get('photo_uids', [])
+                    if photo.file_unique_id in photo_uids:
+                        photo_uids.remove(photo.file_unique_id)
+                    logger.info("Foto quasi uguale a un'altra della bozza, scartata")
+                    await message.reply_text(self.messages['duplicate_photo_dropped'])
+                    return
+            draft_hashes[photo.file_id] = photo_hash
+            await self._check_duplicate(message, context, photo_hash=photo_hash)
+
+        task = asyncio.create_task(run(), name='photo_hash')
+        tasks = user_data.setdefault(PHOTO_HASH_TASKS_KEY, set())
+        tasks.add(task)
+
+        def forget(done: asyncio.Task) -> None:
+            tasks.discard(done)
+            if not done.cancelled() and done.exception() is not None:
+                logger.warning("Controllo della foto non riuscito: %s", done.exception())
+
+        task.add_done_callback(forget)
+        return task
+
+    def _start_prefetch(self, message, context: ContextTypes.DEFAULT_TYPE, link: str) -> None:
+        """Avvia lo scraping anticipato del link mentre l'operatore completa la bozza (vedi prefetch.py)"""
+        if not DRAFT_PREFETCH:
+            return
+        bot, chat_id, user_data = context.bot, message.chat_id, context.user_data
+
+        async def offer(found: Dict[str, Optional[str]]) -> None:
+            await self._offer_suggestion(bot, chat_id, user_data)
+
+        prefetch.start(user_data, link, self.scraper.scrape, on_ready=offer)
+
+    @staticmethod
+    def _suggestion_keyboard(value: Optional[str]):
+        """Tastiera con il valore suggerito da toccare, o rimozione della tastiera precedente"""
+        if not value:
+            return ReplyKeyboardRemove()
+        return ReplyKeyboardMarkup([[value]], resize_keyboard=True, one_time_keyboard=True)
+
+    async def _offer_suggestion(self, bot, chat_id: int, user_data: Dict) -> None:
+        """
+        Propone il suggerimento dello scraping per il campo che l'operatore sta scrivendo
+        (se lo scraping finisce dopo la domanda); con la bozza ancora senza foto aspetta
+        """
+        if not (user_data.get('photos') or user_data.get('media_groups')):
+            return
+        for field, message_key in (('product_name', 'suggest_name'), ('price', 'suggest_price')):
+            if field in user_data:
+                continue
+            value = prefetch.suggestion(user_data, field)
+            if value:
+                await bot.send_message(
+                    chat_id=chat_id,
+                    text=self.messages[message_key],
+                    reply_markup=self._suggestion_keyboard(value)
+                )
+            return
+
     async def handle_media_group(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         """
         Handler per ricevere gruppo di foto o solo link
@@ -87,7 +311,7 @@ class AffiliateBot:
         user_id = update.effective_user.id
         
         # Verifica autorizzazione
-        if user_id != ADMIN_USER_ID:
+        if user_id not in ADMIN_USER_IDS:
             return ConversationHandler.END
         
         message = update.message
@@ -106,21 +330,23 @@ class AffiliateBot:
             # Salva il link se presente (solo dalla prima foto del gruppo)
             if urls and not context.user_data.get('referral_link'):
                 context.user_data['referral_link'] = urls[0]
+                # Lo scraping anticipato parte solo per i link mai pubblicati
+                if not await self._check_duplicate(message, context, link=urls[0]):
+                    self._start_prefetch(message, context, urls[0])
             
             # Inizializza il gruppo se non esiste
             if media_group_id not in context.user_data['media_groups']:
                 context.user_data['media_groups'][media_group_id] = {'photos': []}
-                logger.info(f"Media group {media_group_id}: INIZIATO")
+                logger.info("Media group %s: INIZIATO", media_group_id)
             
             # Aggiungi foto al gruppo
             if message.photo:
-                photo = message.photo[-1]
-                context.user_data['media_groups'][media_group_id]['photos'].append(photo.file_id)
+                await self._add_photo(message, context, context.user_data['media_groups'][media_group_id]['photos'])
                 num_photos = len(context.user_data['media_groups'][media_group_id]['photos'])
-                logger.info(f"Media group {media_group_id}: aggiunta foto {num_photos}")
+                logger.debug("Media group %s: aggiunta foto %s", media_group_id, num_photos)
             
             # ASPETTA che tutte le foto arrivino (max 3 secondi)
-            logger.info(f"Media group {media_group_id}: aspetto altre foto...")
+            logger.debug("Media group %s: aspetto altre foto...", media_group_id)
             await asyncio.sleep(3.0)
             
             # Verifica se il gruppo è stato aggiornato (significa che altre foto sono arrivate)
@@ -128,11 +354,11 @@ class AffiliateBot:
             if media_group_id in context.user_data['media_groups']:
                 photos_after_wait = context.user_data['media_groups'][media_group_id]['photos']
                 current_photos_count = len(photos_after_wait)
-                logger.info(f"Media group {media_group_id}: {current_photos_count} foto dopo attesa")
+                logger.debug("Media group %s: %s foto dopo attesa", media_group_id, current_photos_count)
                 
                 # Completa il media group
                 context.user_data['photos'] = photos_after_wait
-                logger.info(f"Media group {media_group_id}: COMPLETATO con {current_photos_count} foto")
+                logger.info("Media group %s: COMPLETATO con %s foto", media_group_id, current_photos_count)
                 
                 # Rimuovi il gruppo processato
                 del context.user_data['media_groups'][media_group_id]
@@ -143,8 +369,7 @@ class AffiliateBot:
         else:
             # Aggiungi foto se presente
             if message.photo:
-                photo = message.photo[-1]
-                context.user_data['photos'].append(photo.file_id)
+                await self._add_photo(message, context, context.user_data['photos'])
         
         # Verifica se abbiamo link
         if not urls and not context.user_data.get('referral_link'):
@@ -153,8 +378,16 @@ class AffiliateBot:
             return ConversationHandler.END
         
         # Salva il link se non già salvato
-        if urls and not context.user_data.get('referral_link'):
+        new_link = bool(urls) and not context.user_data.get('referral_link')
+        if new_link:
             context.user_data['referral_link'] = urls[0]
+        
+        # Controllo duplicati prima di qualsiasi altra operazione (le foto sono già controllate da _add_photo)
+        is_duplicate = await self._check_duplicate(message, context, link=context.user_data['referral_link'])
+        
+        # Lo scraping anticipato parte solo per i link mai pubblicati
+        if new_link and not is_duplicate:
+            self._start_prefetch(message, context, urls[0])
 
         # Se non ci sono foto, chiedi foto
         if not context.user_data['photos']:
@@ -165,16 +398,40 @@ class AffiliateBot:
         await message.reply_text(f"✅ {len(context.user_data['photos'])} foto ricevuta/e!\n\n✏️ Scrivi il nome del prodotto:")
         return STATE_WAITING_PRODUCT_NAME
     
-    async def ask_category(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    async def ask_category(self, update: Update, context: ContextTypes.DEFAULT_TYPE, auto: bool = True) -> int:
         """
         Chiede all'utente di selezionare la categoria
-        Fase 2 del flusso
+        Fase 2 del flusso: se il nome del prodotto indica una sola categoria
+        (vedi classifier.py) la seleziona da solo e passa all'anteprima, dove
+        resta il bottone per cambiarla
         """
-        # Crea la tastiera con le categorie
+        found = classify(context.user_data.get('product_name', ''))
+        if auto and CATEGORY_AUTO_SELECT and found.confident:
+            context.user_data['category'] = found.category
+            context.user_data['category_auto'] = True
+            metrics.increment('categories_auto_selected')
+            logger.info("Categoria riconosciuta dal nome: %s", found.category)
+            cat_values = CATEGORIES[found.category]['IT']
+            target_message = update.callback_query.message if update.callback_query else update.message
+            await target_message.reply_text(
+                self.messages['category_detected'].format(name=f"{cat_values['emoji']} {cat_values['name']}")
+            )
+            return await self.show_preview(update, context)
+        
+        # Crea la tastiera con le categorie (quella suggerita per prima)
+        suggested = found.category or prefetch.suggestion(context.user_data, 'category')
         keyboard = []
         for cat_key, cat_values in CATEGORIES.items():
             cat_name_it = cat_values['IT']['name']
             emoji = cat_values['IT']['emoji']
+            if cat_key == suggested:
+                keyboard.insert(0, [
+                    InlineKeyboardButton(
+                        self.messages['suggested_category'].format(name=f"{emoji} {cat_name_it}"),
+                        callback_data=f"cat_{cat_key}"
+                    )
+                ])
+                continue
             keyboard.append([
                 InlineKeyboardButton(
                     f"{emoji} {cat_name_it}",
@@ -208,8 +465,9 @@ class AffiliateBot:
         # Estrai la categoria
         category = query.data.replace('cat_', '')
         context.user_data['category'] = category
+        context.user_data.pop('category_auto', None)
         
-        logger.info(f"Categoria selezionata: {category}")
+        logger.info("Categoria selezionata: %s", category)
         
         # Conferma la selezione
         cat_name = CATEGORIES[category]['IT']['name']
@@ -218,6 +476,14 @@ class AffiliateBot:
         # Passa all'anteprima
         return await self.show_preview(update, context)
     
+    async def change_category(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+        """Handler del bottone "Cambia categoria" nell'anteprima: mostra la tastiera delle categorie"""
+        query = update.callback_query
+        await query.answer()
+        context.user_data.pop('category_auto', None)
+        await query.edit_message_reply_markup(reply_markup=None)
+        return await self.ask_category(update, context, auto=False)
+    
     async def handle_product_name(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         """
         Handler per il nome prodotto inserito manualmente
@@ -230,9 +496,12 @@ class AffiliateBot:
         
         # Salva il nome prodotto
         context.user_data['product_name'] = product_name
-        logger.info(f"Nome prodotto inserito: {product_name}")
+        logger.info("Nome prodotto inserito: %s", product_name)
         
-        await update.message.reply_text(f"✅ Nome salvato: {product_name}\n\n💰 Ora scrivi il prezzo (es: $49.99, €35, 299¥):")
+        await update.message.reply_text(
+            f"✅ Nome salvato: {product_name}\n\n💰 Ora scrivi il prezzo (es: $49.99, €35, 299¥):",
+            reply_markup=self._suggestion_keyboard(prefetch.suggestion(context.user_data, 'price'))
+        )
         
         return STATE_WAITING_PRICE
     
@@ -242,16 +511,19 @@ class AffiliateBot:
         """
         price_text = update.message.text.strip()
         
-        # Valida il formato del prezzo (deve contenere numeri)
-        if not any(c.isdigit() for c in price_text):
+        # Interpreta importo e valuta
+        parsed = parse_price(price_text)
+        if parsed is None:
             await update.message.reply_text(self.messages['invalid_price'])
             return STATE_WAITING_PRICE
         
-        # Salva il prezzo
+        # Salva il prezzo e le versioni localizzate per ogni canale (calcolate una sola volta)
         context.user_data['price'] = price_text
-        logger.info(f"Prezzo inserito manualmente: {price_text}")
+        context.user_data['price_value'] = {'amount': parsed.amount, 'currency': parsed.currency}
+        context.user_data['price_by_lang'] = render_prices(price_text)
+        logger.info("Prezzo inserito manualmente: %s (%s %s)", price_text, parsed.amount, parsed.currency)
         
-        await update.message.reply_text(f"✅ Prezzo salvato: {price_text}")
+        await update.message.reply_text(f"✅ Prezzo salvato: {price_text}", reply_markup=ReplyKeyboardRemove())
         
         # Passa alla selezione categoria
         return await self.ask_category(update, context)
@@ -269,11 +541,12 @@ class AffiliateBot:
             await message.reply_text("⚠️ Inviami almeno una foto del prodotto (puoi aggiungere caption se vuoi).")
             return STATE_WAITING_PHOTOS
 
-        photo = message.photo[-1]
-        context.user_data.setdefault('photos', [])
-        context.user_data['photos'].append(photo.file_id)
+        await self._add_photo(message, context, context.user_data.setdefault('photos', []))
 
-        await message.reply_text("✅ Foto ricevuta!\n\n✏️ Ora scrivi il nome del prodotto:")
+        await message.reply_text(
+            "✅ Foto ricevuta!\n\n✏️ Ora scrivi il nome del prodotto:",
+            reply_markup=self._suggestion_keyboard(prefetch.suggestion(context.user_data, 'product_name'))
+        )
 
         return STATE_WAITING_PRODUCT_NAME
     
@@ -282,10 +555,26 @@ class AffiliateBot:
         Mostra l'anteprima dei post per tutti i canali
         Fase 3 del flusso
         """
-        product_name = context.user_data.get('product_name', 'Prodotto')
-        price = context.user_data.get('price', 'N/A')
-        referral_link = context.user_data.get('referral_link', '')
-        category = context.user_data.get('category', 'clothing')
+        # Caption di tutte le lingue create e controllate in locale, prima di qualsiasi upload
+        draft = build_draft(context.user_data)
+        captions, problems = build_captions(draft, CHANNELS)
+        target_message = update.callback_query.message if update.callback_query else update.message
+        if problems:
+            details = "\n".join(f"• {lang_code}: {'; '.join(errors)}" for lang_code, errors in problems.items())
+            logger.warning("Caption non valide nell'anteprima: %s", problems)
+            # Il nome viene già accorciato da solo: se anche con un nome minimo la caption
+            # non va, il problema è il prezzo e va riscritto quello
+            _, without_name = build_captions({**draft, 'product_name': 'X'}, CHANNELS)
+            if without_name:
+                await target_message.reply_text(
+                    f"❌ Il post non può essere pubblicato:\n{details}\n\n"
+                    f"💰 Il prezzo è troppo lungo per la caption, scrivine uno più corto:"
+                )
+                return STATE_WAITING_PRICE
+            await target_message.reply_text(
+                f"❌ Il post non può essere pubblicato:\n{details}\n\n✏️ Scrivi di nuovo il nome del prodotto:"
+            )
+            return STATE_WAITING_PRODUCT_NAME
         
         # Messaggio introduttivo
         preview_text = self.messages['preview_intro'] + "\n"
@@ -297,17 +586,9 @@ class AffiliateBot:
                 name=channel_info['name']
             )
             
-            # Genera la caption per questa lingua
-            caption = create_post_caption(
-                product_name=product_name,
-                price=price,
-                referral_link=referral_link,
-                category=category,
-                language=lang_code
-            )
-            
-            # Aggiungi l'anteprima (primi 200 caratteri)
-            preview_text += f"```\n{caption[:200]}...\n```\n"
+            # Aggiungi l'anteprima (primi 200 caratteri, senza backtick che chiuderebbero il blocco)
+            snippet = captions[lang_code][:200].replace('`', "'")
+            preview_text += f"```\n{snippet}...\n```\n"
         
         # Invia l'anteprima
         if update.callback_query:
@@ -335,6 +616,14 @@ class AffiliateBot:
                 )
             ]
         ]
+        # Categoria scelta dal bot: l'operatore può ancora cambiarla
+        if context.user_data.get('category_auto'):
+            keyboard.append([
+                InlineKeyboardButton(
+                    self.messages['button_change_category'],
+                    callback_data="change_category"
+                )
+            ])
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         await target_message.reply_text(
@@ -354,153 +643,449 @@ class AffiliateBot:
         
         if query.data == "cancel_publish":
             await query.edit_message_text(self.messages['cancelled'])
-            context.user_data.clear()
+            discard_draft(context.user_data)
             return ConversationHandler.END
         
-        # Conferma ricevuta, inizia la pubblicazione
-        await query.edit_message_text(self.messages['publishing'])
-        
-        product_name = context.user_data.get('product_name', 'Prodotto')
-        price = context.user_data.get('price', 'N/A')
-        referral_link = context.user_data.get('referral_link', '')
-        category = context.user_data.get('category', 'clothing')
-        photos = context.user_data.get('photos', [])
-        photos_are_urls = context.user_data.get('photos_are_urls', False)
+        # Conferma ricevuta: la bozza diventa un dizionario serializzabile
+        # (con le impronte delle foto e gli eventuali doppioni già tolti)
+        await settle_photo_hashes(context.user_data)
+        draft = build_draft(context.user_data)
+        prefetch.cancel(context.user_data)
+        context.user_data.clear()
         
-        if not photos:
+        if not draft['photos']:
             await query.message.reply_text("❌ Nessuna foto trovata!")
             return ConversationHandler.END
         
-        # Pubblica su ogni canale
-        publish_results = []
+        # In modalità digest il prodotto aspetta gli altri e viene pubblicato insieme a loro
+        if DIGEST_MODE:
+            waiting = self.digest_queue.add(draft)
+            await query.edit_message_text(self.messages['digest_queued'].format(count=waiting, max=DIGEST_MAX_PRODUCTS))
+            logger.info("Prodotto aggiunto al digest (%d in attesa)", waiting)
+            if waiting >= DIGEST_MAX_PRODUCTS:
+                await self._publish_digest(context.bot, query.message.chat_id)
+            return ConversationHandler.END
         
-        for lang_code, channel_info in CHANNELS.items():
-            channel_id = channel_info['chat_id']
-            channel_name = f"{channel_info['emoji_flag']} {channel_info['name']}"
-            button_labels = {
-                'IT': '🛒 Acquista qui',
-                'EN': '🛒 Buy here',
-                'ES': '🛒 Comprar aquí'
-            }
-            
+        # Con i worker di pubblicazione la bozza va in coda e l'esito arriva più tardi
+        if self.publisher_pool is not None:
+            job_id = self._enqueue_fanout(draft, query.message.chat_id)
+            await query.edit_message_text(f"📥 Pubblicazione in coda ({self.publisher_pool.queue.backlog()} in attesa)")
+            logger.info("Bozza %s affidata ai worker di pubblicazione", job_id)
+            return ConversationHandler.END
+        
+        await query.edit_message_text(self.messages['publishing'])
+        fanout = self.fanouts.create(draft, CHANNELS, notify_chat_id=query.message.chat_id)
+        await self._run_fanout(context.bot, fanout)
+        
+        return ConversationHandler.END
+    
+    def _enqueue_fanout(self, draft: Dict, chat_id: int, fanout: Optional[Fanout] = None) -> str:
+        """Affida ai worker la pubblicazione (nuova o da completare) e restituisce l'ID del job"""
+        if fanout is None:
+            fanout = self.fanouts.create(draft, CHANNELS, notify_chat_id=chat_id, queued=True)
+        else:
+            fanout.set(queued=True, notify_chat_id=chat_id)
+        return self.publisher_pool.queue.enqueue(fanout.draft, notify_chat_id=chat_id)
+    
+    async def _run_fanout(self, bot, fanout: Fanout) -> Optional[Dict[str, Dict]]:
+        """
+        Pubblica i canali non ancora completati, registra il post e invia l'esito
+        
+        Returns:
+            Risultati per canale, o None se la stessa pubblicazione è già in corso
+        """
+        if fanout.fanout_id in self._fanouts_running:
+            return None
+        self._fanouts_running.add(fanout.fanout_id)
+        try:
+            results = await publish_draft(bot, self.rate_limiter, fanout.draft, fanout)
+        finally:
+            self._fanouts_running.discard(fanout.fanout_id)
+        await self._finish_fanout(bot, fanout, results)
+        return results
+    
+    async def _finish_fanout(self, bot, fanout: Fanout, results: Dict[str, Dict]) -> None:
+        """Registra il post (aggiungendo i canali di un nuovo tentativo) e chiude o conserva lo stato"""
+        post_id = record_publication(
+            self.published_index, self.published_posts, fanout.draft, results, post_id=fanout.post_id
+        )
+        if fanout.complete():
+            self.fanouts.remove(fanout)
+            retry_id = None
+        else:
+            fanout.set(post_id=post_id, queued=False)
+            retry_id = fanout.fanout_id
+            metrics.increment('fanouts_incomplete')
+        await self._report_publication(bot, fanout.data['notify_chat_id'], results, post_id, retry_id)
+    
+    async def _publish_digest(self, bot, chat_id: int) -> bool:
+        """
+        Pubblica i prodotti in attesa come un solo album per canale (vedi digest.py)
+        
+        Returns:
+            False se non c'erano prodotti in attesa
+        """
+        products = self.digest_queue.take(DIGEST_MAX_PRODUCTS)
+        if not products:
+            return False
+        digest = build_digest(products)
+        metrics.increment('digests_published')
+        metrics.increment('digest_products', len(products))
+        
+        if self.publisher_pool is not None:
+            job_id = self._enqueue_fanout(digest, chat_id)
+            await bot.send_message(
+                chat_id=chat_id,
+                text=f"📥 Digest di {len(products)} prodotti in coda ({self.publisher_pool.queue.backlog()} in attesa)"
+            )
+            logger.info("Digest %s affidato ai worker di pubblicazione", job_id)
+            return True
+        
+        await bot.send_message(chat_id=chat_id, text=self.messages['digest_publishing'].format(count=len(products)))
+        # I canali non raggiunti si riprovano con /retry, come per un singolo prodotto
+        await self._run_fanout(bot, self.fanouts.create(digest, CHANNELS, notify_chat_id=chat_id))
+        return True
+    
+    async def publish_digest_now(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Handler per il comando /digest: pubblica subito i prodotti in attesa"""
+        if not await self._publish_digest(context.bot, update.effective_chat.id):
+            await update.message.reply_text(self.messages['digest_empty'])
+    
+    async def digest_job(self, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Job periodico: pubblica il digest in attesa, anche se incompleto; l'esito va all'admin principale"""
+        await self._publish_digest(context.bot, ADMIN_USER_ID)
+    
+    async def _report_publication(
+        self,
+        bot,
+        chat_id: int,
+        results: Dict[str, Dict],
+        post_id: Optional[str],
+        retry_id: Optional[str] = None
+    ) -> None:
+        """Invia all'operatore l'esito della pubblicazione canale per canale e il riepilogo"""
+        summary_lines = []
+        for lang_code, result in results.items():
+            channel_info = CHANNELS.get(lang_code, {})
+            channel_name = f"{channel_info.get('emoji_flag', '')} {channel_info.get('name', lang_code)}".strip()
+            summary_lines.append(f"{'✅' if result['success'] else '❌'} {channel_name}")
+            if result['success']:
+                text = self.messages['publish_success'].format(channel=channel_name)
+            else:
+                text = self.messages['publish_error'].format(channel=channel_name, error=result['error'])
+            await bot.send_message(chat_id=chat_id, text=text)
+        
+        await bot.send_message(
+            chat_id=chat_id,
+            text=self.messages['publish_complete'].format(summary="\n".join(summary_lines))
+        )
+        if post_id:
+            await bot.send_message(
+                chat_id=chat_id,
+                text=f"🆔 ID del post: {post_id}\n"
+                     f"Per modificarlo: /edit {post_id} prezzo|nome|link <valore>\n"
+                     f"Per eliminarlo: /delete {post_id}"
+            )
+        if retry_id:
+            await bot.send_message(
+                chat_id=chat_id,
+                text=f"🔁 Per ripubblicare solo sui canali falliti: /retry {retry_id}"
+            )
+    
+    async def collect_publish_results(self, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """
+        Job periodico in modalità worker: consegna gli esiti delle pubblicazioni
+        Il bot resta l'unico processo che scrive indice e archivio dei post
+        """
+        pool = self.publisher_pool
+        await asyncio.to_thread(pool.ensure_alive)
+        for job in pool.queue.collect():
+            fanout_id = job['draft'].get('fanout_id')
+            fanout = self.fanouts.load(fanout_id)
             try:
-                # Genera la caption per questa lingua
-                caption = create_post_caption(
-                    product_name=product_name,
-                    price=price,
-                    referral_link=referral_link,
-                    category=category,
-                    language=lang_code
-                )
-                
-                # Prepara il media group con file aperti
-                media_group = []
-                files_to_close = []
-                
-                try:
-                    for idx, photo_id in enumerate(photos):
-                        if idx == 0:
-                            # Prima foto con caption
-                            if photos_are_urls or photo_id.startswith('/') or photo_id.startswith('\\') or os.path.exists(photo_id):
-                                # Se è un file locale, aprilo e tienilo aperto
-                                f = open(photo_id, 'rb')
-                                files_to_close.append(f)
-                                media_group.append(
-                                    InputMediaPhoto(
-                                        media=f,
-                                        caption=caption,
-                                        parse_mode=ParseMode.MARKDOWN
-                                    )
-                                )
-                            else:
-                                # Se è file_id dell'utente
-                                media_group.append(
-                                    InputMediaPhoto(
-                                        media=photo_id,
-                                        caption=caption,
-                                        parse_mode=ParseMode.MARKDOWN
-                                    )
-                                )
-                        else:
-                            # Altre foto senza caption
-                            if photos_are_urls or photo_id.startswith('/') or photo_id.startswith('\\') or os.path.exists(photo_id):
-                                f = open(photo_id, 'rb')
-                                files_to_close.append(f)
-                                media_group.append(InputMediaPhoto(media=f))
-                            else:
-                                media_group.append(InputMediaPhoto(media=photo_id))
-                
-                    # Invia il media group al canale
-                    sent_messages = await context.bot.send_media_group(
-                        chat_id=channel_id,
-                        media=media_group
-                    )
-
-                    # Aggiungi il bottone al primo messaggio del media group
-                    if referral_link and sent_messages:
-                        label = button_labels.get(lang_code, '🛒 Buy here')
-                        await context.bot.edit_message_reply_markup(
-                            chat_id=channel_id,
-                            message_id=sent_messages[0].message_id,
-                            reply_markup=InlineKeyboardMarkup([
-                                [InlineKeyboardButton(label, url=referral_link)]
-                            ])
-                        )
-                finally:
-                    # Chiudi tutti i file aperti
-                    for f in files_to_close:
-                        f.close()
-                
-                publish_results.append({
-                    'channel': channel_name,
-                    'success': True
-                })
-                
-                logger.info(f"Post pubblicato con successo su {channel_name}")
-                
-                await query.message.reply_text(
-                    self.messages['publish_success'].format(channel=channel_name)
-                )
-                
-            except Exception as e:
-                logger.error(f"Errore nella pubblicazione su {channel_name}: {e}")
-                publish_results.append({
-                    'channel': channel_name,
-                    'success': False,
-                    'error': str(e)
-                })
-                
-                await query.message.reply_text(
-                    self.messages['publish_error'].format(
-                        channel=channel_name,
-                        error=str(e)
-                    )
-                )
+                if fanout is not None:
+                    await self._finish_fanout(context.bot, fanout, job['results'])
+                elif fanout_id is None:
+                    # Job accodato prima dello stato per canale
+                    post_id = record_publication(self.published_index, self.published_posts, job['draft'], job['results'])
+                    await self._report_publication(context.bot, job['notify_chat_id'], job['results'], post_id)
+                else:
+                    logger.info("Job %s già completato da un tentativo precedente", job['job_id'])
+            except TelegramError as e:
+                logger.error("Impossibile notificare l'esito del job %s: %s", job['job_id'], e)
+            pool.queue.acknowledge(job)
+    
+    async def retry_publication(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """
+        Handler per il comando /retry [id]
+        Senza ID elenca le pubblicazioni incomplete; con l'ID ripubblica solo i canali non completati
+        """
+        args = context.args or []
+        if not args:
+            incomplete = [fanout for fanout in self.fanouts.all() if fanout.failed_languages()]
+            if not incomplete:
+                await update.message.reply_text("✅ Nessuna pubblicazione da completare.")
+                return
+            lines = ["🔁 Pubblicazioni da completare:"]
+            for fanout in incomplete[:10]:
+                flags = "".join(CHANNELS.get(lang, {}).get('emoji_flag', lang) for lang in fanout.failed_languages())
+                lines.append(f"🆔 {fanout.fanout_id} · {fanout.draft['product_name']} · ❌ {flags}")
+            lines.append("Per riprovare: /retry <id>")
+            await update.message.reply_text("\n".join(lines))
+            return
+        
+        fanout = self.fanouts.load(args[0])
+        if fanout is None:
+            await update.message.reply_text(f"❌ Nessuna pubblicazione da completare con ID {args[0]}. Usa /retry per l'elenco.")
+            return
+        if fanout.fanout_id in self._fanouts_running or fanout.data.get('queued'):
+            await update.message.reply_text(f"⏳ La pubblicazione {fanout.fanout_id} è già in corso.")
+            return
+        
+        chat_id = update.effective_chat.id
+        languages = fanout.languages_to_send()
+        if self.publisher_pool is not None:
+            self._enqueue_fanout(fanout.draft, chat_id, fanout)
+            await update.message.reply_text(f"📥 Nuovo tentativo su {len(languages)} canali in coda")
+            return
+        fanout.set(notify_chat_id=chat_id)
+        await update.message.reply_text(f"🔁 Ripubblico su {len(languages)} canali...")
+        await self._run_fanout(context.bot, fanout)
+    
+    async def resume_fanouts(self, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Job all'avvio: completa le pubblicazioni interrotte da un arresto del bot"""
+        queued_ids = self.publisher_pool.queue.fanout_ids() if self.publisher_pool is not None else set()
+        for fanout in self.fanouts.all():
+            if fanout.data.get('queued') and self.publisher_pool is not None:
+                # Quelle affidate ai worker tornano in coda da sole (vedi PublishQueue.requeue),
+                # a meno che l'arresto non sia arrivato prima di accodare il job
+                if fanout.fanout_id not in queued_ids:
+                    logger.warning("Pubblicazione %s senza job in coda: la riaccodo", fanout.fanout_id)
+                    metrics.increment('fanouts_resumed')
+                    self._enqueue_fanout(fanout.draft, fanout.data['notify_chat_id'], fanout)
+                continue
+            if not fanout.interrupted():
+                continue
+            logger.warning(
+                "Riprendo la pubblicazione %s interrotta (%s)",
+                fanout.fanout_id, ", ".join(fanout.languages_to_send())
+            )
+            metrics.increment('fanouts_resumed')
+            try:
+                await self._run_fanout(context.bot, fanout)
+            except TelegramError as e:
+                logger.error("Impossibile notificare la ripresa di %s: %s", fanout.fanout_id, e)
+    
+    # Campi modificabili con /edit (nomi in italiano e in inglese)
+    EDITABLE_FIELDS = {
+        'prezzo': 'price', 'price': 'price',
+        'nome': 'product_name', 'name': 'product_name',
+        'link': 'referral_link'
+    }
+    
+    def _format_results(self, results: Dict[str, Optional[str]]) -> str:
+        """Riepilogo per canale di un'operazione in blocco"""
+        lines = []
+        for lang_code, error in results.items():
+            channel_info = CHANNELS.get(lang_code, {})
+            channel_name = f"{channel_info.get('emoji_flag', '')} {channel_info.get('name', lang_code)}".strip()
+            lines.append(f"{'✅' if error is None else '❌'} {channel_name}" + (f": {error}" if error else ""))
+        return "\n".join(lines)
+    
+    async def list_posts(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Handler per il comando /posts: ultimi post pubblicati con il loro ID"""
+        posts = self.published_posts.recent(10)
+        if not posts:
+            await update.message.reply_text("📭 Nessun post pubblicato.")
+            return
+        
+        lines = ["🗂 Ultimi post pubblicati:"]
+        for record in posts:
+            published_on = time.strftime('%d/%m %H:%M', time.localtime(record['published_at']))
+            flags = "".join(CHANNELS.get(lang, {}).get('emoji_flag', lang) for lang in record['channels'])
+            lines.append(f"🆔 {record['post_id']} · {record['product_name']} · {published_on} · {flags}")
+            outdated = PublishedStore.outdated_languages(record)
+            if outdated:
+                stale_flags = "".join(CHANNELS.get(lang, {}).get('emoji_flag', lang) for lang in outdated)
+                lines.append(f"   ⚠️ Da aggiornare su {stale_flags}: /edit {record['post_id']}")
+        await update.message.reply_text("\n".join(lines))
+    
+    async def edit_published_post(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """
+        Handler per il comando /edit <id> prezzo|nome|link <valore>
+        Aggiorna il post su tutti i canali in parallelo; /edit <id> da solo
+        riprova sui canali rimasti indietro dopo una modifica fallita
+        """
+        args = context.args or []
+        field = self.EDITABLE_FIELDS.get(args[1].lower()) if len(args) >= 3 else None
+        if field is None and len(args) != 1:
+            await update.message.reply_text("ℹ️ Uso: /edit <id> prezzo|nome|link <nuovo valore>")
+            return
+        
+        record = self.published_posts.get(args[0])
+        if record is None:
+            await update.message.reply_text(f"❌ Nessun post con ID {args[0]}. Usa /posts per l'elenco.")
+            return
+        if field is None:
+            await self._retry_outdated(update, context, record)
+            return
+        if record.get('products'):
+            await update.message.reply_text(
+                f"ℹ️ Il post {record['post_id']} è un digest: eliminalo con /delete {record['post_id']} e ripubblica i prodotti."
+            )
+            return
+        
+        value = " ".join(args[2:]).strip()
+        changes = {field: value}
+        if field == 'price':
+            if parse_price(value) is None:
+                await update.message.reply_text(self.messages['invalid_price'])
+                return
+            changes['price_by_lang'] = render_prices(value)
+        elif field == 'referral_link':
+            if not re.match(r'https?://\S+$', value):
+                await update.message.reply_text("❌ Link non valido.")
+                return
+            changes['item_id'] = canonical_item_id(value)
+        
+        # Controllo locale delle nuove caption prima di toccare archivio e canali
+        _, problems = build_captions({**record, **changes}, record['channels'])
+        if problems:
+            details = "\n".join(f"• {lang_code}: {'; '.join(errors)}" for lang_code, errors in problems.items())
+            await update.message.reply_text(f"❌ Modifica non applicata, caption non valida:\n{details}")
+            return
         
-        # Riepilogo finale
-        summary = "\n".join([
-            f"{'✅' if r['success'] else '❌'} {r['channel']}"
-            for r in publish_results
-        ])
+        await update.message.reply_text(f"✏️ Aggiorno il post {record['post_id']} su {len(record['channels'])} canali...")
         
-        await query.message.reply_text(
-            self.messages['publish_complete'].format(summary=summary)
+        # L'archivio cambia solo dopo le modifiche, e solo per i canali aggiornati
+        results = await edit_post(context.bot, self.rate_limiter, {**record, **changes})
+        failed = [lang_code for lang_code, error in results.items() if error]
+        if len(failed) == len(results):
+            await update.message.reply_text(
+                f"❌ Post {record['post_id']} non modificato:\n{self._format_results(results)}"
+            )
+            return
+        
+        record = self.published_posts.apply_edit(record['post_id'], changes, failed)
+        if field == 'referral_link':
+            # Il nuovo link entra nell'indice dei duplicati
+            self.published_index.add(value, [], record['product_name'])
+        logger.info("Post %s modificato (%s)", record['post_id'], field)
+        retry = f"\nPer riprovare sui canali rimasti: /edit {record['post_id']}" if failed else ""
+        await update.message.reply_text(
+            f"✏️ Post {record['post_id']} aggiornato:\n{self._format_results(results)}{retry}"
         )
+    
+    async def _retry_outdated(self, update: Update, context: ContextTypes.DEFAULT_TYPE, record: Dict) -> None:
+        """Riscrive caption e bottone sui canali in cui l'ultima modifica non è riuscita"""
+        outdated = PublishedStore.outdated_languages(record)
+        if not outdated:
+            await update.message.reply_text(f"✅ Il post {record['post_id']} è aggiornato su tutti i canali.")
+            return
         
-        # Pulisci i dati utente
-        context.user_data.clear()
+        await update.message.reply_text(f"✏️ Aggiorno il post {record['post_id']} su {len(outdated)} canali...")
+        results = await edit_post(context.bot, self.rate_limiter, record, outdated)
+        failed = [lang_code for lang_code, error in results.items() if error]
+        self.published_posts.apply_edit(record['post_id'], {}, failed)
+        retry = f"\nPer riprovare: /edit {record['post_id']}" if failed else ""
+        await update.message.reply_text(
+            f"✏️ Post {record['post_id']} aggiornato:\n{self._format_results(results)}{retry}"
+        )
+    
+    async def delete_published_post(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Handler per il comando /delete <id>: elimina il post da tutti i canali"""
+        args = context.args or []
+        if len(args) != 1:
+            await update.message.reply_text("ℹ️ Uso: /delete <id>")
+            return
         
-        return ConversationHandler.END
+        record = self.published_posts.get(args[0])
+        if record is None:
+            await update.message.reply_text(f"❌ Nessun post con ID {args[0]}. Usa /posts per l'elenco.")
+            return
+        
+        results = await delete_post(context.bot, self.rate_limiter, record)
+        self.published_posts.remove_channels(
+            record['post_id'],
+            [lang_code for lang_code, error in results.items() if error is None]
+        )
+        logger.info("Post %s eliminato", record['post_id'])
+        await update.message.reply_text(
+            f"🗑 Post {record['post_id']} eliminato:\n{self._format_results(results)}"
+        )
+    
+    async def show_stats(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Handler per il comando /stats: contatori del bot dall'avvio"""
+        values = metrics.snapshot()
+        values['posts_archived'] = len(self.published_posts.posts)
+        if self.publisher_pool is not None:
+            values['publish_backlog'] = self.publisher_pool.queue.backlog()
+        if DIGEST_MODE:
+            values['digest_waiting'] = len(self.digest_queue)
+        lines = ["📊 Statistiche del bot:"]
+        lines.extend(f"{name}: {value}" for name, value in sorted(values.items()))
+        await update.message.reply_text("\n".join(lines))
+    
+    async def touch_draft(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Registra l'attività degli operatori, per la scadenza delle bozze (vedi drafts.py)"""
+        if update.effective_user and update.effective_user.id in ADMIN_USER_IDS:
+            touch(context.user_data)
+    
+    async def draft_expired(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Handler TIMEOUT della conversazione: elimina la bozza abbandonata e avvisa l'operatore"""
+        evicted = context.user_data.get(EVICTED_KEY, False)
+        removed = discard_draft(context.user_data)
+        metrics.increment('drafts_evicted' if evicted else 'drafts_expired')
+        logger.info("Bozza %s (%d immagini eliminate)", "eliminata per il limite" if evicted else "scaduta", removed)
+        if update.effective_chat:
+            await context.bot.send_message(
+                chat_id=update.effective_chat.id,
+                text=self.messages['draft_evicted' if evicted else 'draft_expired']
+            )
     
     async def cancel(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         """Handler per il comando /cancel"""
         await update.message.reply_text(self.messages['cancelled'])
-        context.user_data.clear()
+        discard_draft(context.user_data)
         return ConversationHandler.END
     
+    async def startup(self, application: Application) -> None:
+        """
+        Chiamato all'avvio dell'Application, prima del polling: controlla i canali
+        (vedi preflight.py) e avvia i worker di pubblicazione se configurati
+        """
+        if PREFLIGHT_TIMEOUT > 0:
+            problems = await run_preflight(application.bot)
+            failed = {lang: problem for lang, problem in problems.items() if problem}
+            if failed:
+                details = "\n".join(
+                    f"• {CHANNELS[lang]['emoji_flag']} {CHANNELS[lang]['name']}: {problem}"
+                    for lang, problem in failed.items()
+                )
+                print(f"⚠️ Canali con problemi:\n{details}")
+                try:
+                    await application.bot.send_message(
+                        chat_id=ADMIN_USER_ID,
+                        text=self.messages['preflight_problems'].format(details=details)
+                    )
+                except TelegramError as e:
+                    logger.warning("Impossibile avvisare l'admin dei problemi sui canali: %s", e)
+        if not image_hash.available():
+            logger.warning("Pillow non installato: il controllo delle foto quasi uguali è disattivato")
+        # I worker partono dopo il pre-flight e leggono gli ID numerici appena salvati
+        if self.publisher_pool is not None:
+            await asyncio.to_thread(self.publisher_pool.start)
+    
+    async def shutdown(self, application: Application) -> None:
+        """Chiamato allo spegnimento dell'Application: ferma i worker di scraping e di pubblicazione"""
+        if self._scraper is not None:
+            await asyncio.to_thread(self._scraper.close)
+        if self.publisher_pool is not None:
+            await asyncio.to_thread(self.publisher_pool.stop)
+    
     async def error_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Handler globale per gli errori"""
-        logger.error(f"Errore: {context.error}", exc_info=context.error)
+        logger.error("Errore: %s", context.error, exc_info=context.error)
         
         if update and update.effective_message:
             await update.effective_message.reply_text(
@@ -508,36 +1093,59 @@ class AffiliateBot:
             )
 
 
-def main():
-    """Funzione principale per avviare il bot"""
-    
-    # Verifica che il token sia configurato
-    if not BOT_TOKEN or BOT_TOKEN == 'YOUR_BOT_TOKEN_HERE':
-        logger.error("⚠️ BOT_TOKEN non configurato! Modifica il file .env o config.py")
-        return
-    
-    if ADMIN_USER_ID == 0:
-        logger.error("⚠️ ADMIN_USER_ID non configurato! Modifica il file .env o config.py")
-        return
+def build_application(
+    bot: AffiliateBot,
+    token: str = BOT_TOKEN,
+    base_url: Optional[str] = BOT_API_BASE_URL or None,
+    base_file_url: Optional[str] = BOT_API_FILE_URL or None,
+    local_mode: bool = BOT_API_LOCAL_MODE
+) -> Application:
+    """
+    Crea l'Application con tutti gli handler registrati
     
-    # Crea l'istanza del bot
-    bot = AffiliateBot()
+    Args:
+        bot: Istanza di AffiliateBot con gli handler
+        token: Token del bot
+        base_url: URL base della Bot API (server self-hosted o finta API dei test di carico)
+        base_file_url: URL base per scaricare i file (miniature per le impronte delle foto)
+        local_mode: True se il server Bot API gira con --local (foto passate per percorso)
+        
+    Returns:
+        Application pronta per essere avviata
+    """
+    # Update in parallelo, ma in ordine all'interno di ogni conversazione
+    builder = (
+        Application.builder()
+        .token(token)
+        .request(build_bot_request())
+        .get_updates_request(build_updates_request())
+        .concurrent_updates(ConversationOrderedProcessor(CONCURRENT_UPDATES))
+        .post_init(bot.startup)
+        .post_shutdown(bot.shutdown)
+    )
+    if base_url:
+        builder = builder.base_url(base_url)
+    if base_file_url:
+        builder = builder.base_file_url(base_file_url)
+    if local_mode:
+        builder = builder.local_mode(True)
+    application = builder.build()
     
-    # Crea l'applicazione
-    application = Application.builder().token(BOT_TOKEN).build()
+    # Solo gli operatori autorizzati possono usare il bot
+    admin_filter = filters.User(user_id=ADMIN_USER_IDS)
     
     # Definisci il ConversationHandler
     conv_handler = ConversationHandler(
         entry_points=[
             MessageHandler(
-                (filters.PHOTO | filters.TEXT) & filters.User(user_id=ADMIN_USER_ID),
+                (filters.PHOTO | filters.TEXT) & admin_filter,
                 bot.handle_media_group
             )
         ],
         states={
             STATE_WAITING_PRODUCT_NAME: [
                 MessageHandler(
-                    filters.TEXT & ~filters.COMMAND & filters.User(user_id=ADMIN_USER_ID),
+                    filters.TEXT & ~filters.COMMAND & admin_filter,
                     bot.handle_product_name
                 )
             ],
@@ -549,13 +1157,13 @@ def main():
             ],
             STATE_WAITING_PRICE: [
                 MessageHandler(
-                    filters.TEXT & ~filters.COMMAND & filters.User(user_id=ADMIN_USER_ID),
+                    filters.TEXT & ~filters.COMMAND & admin_filter,
                     bot.handle_manual_price
                 )
             ],
             STATE_WAITING_PHOTOS: [
                 MessageHandler(
-                    filters.PHOTO & filters.User(user_id=ADMIN_USER_ID),
+                    filters.PHOTO & admin_filter,
                     bot.handle_waiting_photos
                 )
             ],
@@ -563,30 +1171,133 @@ def main():
                 CallbackQueryHandler(
                     bot.handle_publish_confirmation,
                     pattern=r'^(confirm|cancel)_publish$'
+                ),
+                CallbackQueryHandler(
+                    bot.change_category,
+                    pattern=r'^change_category$'
                 )
             ],
+            ConversationHandler.TIMEOUT: [
+                TypeHandler(Update, bot.draft_expired)
+            ],
         },
         fallbacks=[
-            CommandHandler('cancel', bot.cancel, filters=filters.User(user_id=ADMIN_USER_ID))
+            CommandHandler('cancel', bot.cancel, filters=admin_filter)
         ],
+        # Le bozze abbandonate scadono (vedi drafts.py)
+        conversation_timeout=DRAFT_TTL_MINUTES * 60 if DRAFT_TTL_MINUTES > 0 else None,
     )
     
     # Aggiungi gli handlers
+    # I comandi sui post pubblicati vengono prima del ConversationHandler, che accetta qualsiasi testo
+    application.add_handler(TypeHandler(Update, bot.touch_draft), group=-1)
     application.add_handler(CommandHandler('start', bot.start))
+    application.add_handler(CommandHandler('stats', bot.show_stats, filters=admin_filter))
+    application.add_handler(CommandHandler('posts', bot.list_posts, filters=admin_filter))
+    application.add_handler(CommandHandler('edit', bot.edit_published_post, filters=admin_filter))
+    application.add_handler(CommandHandler('delete', bot.delete_published_post, filters=admin_filter))
+    application.add_handler(CommandHandler('digest', bot.publish_digest_now, filters=admin_filter))
+    application.add_handler(CommandHandler('retry', bot.retry_publication, filters=admin_filter))
     application.add_handler(conv_handler)
     
+    # Scadenza e limite delle bozze aperte
+    if application.job_queue is None:
+        logger.warning("JobQueue non disponibile: le bozze abbandonate non scadranno")
+    else:
+        application.job_queue.run_repeating(
+            DraftJanitor(conv_handler).job,
+            interval=SWEEP_INTERVAL,
+            first=SWEEP_INTERVAL,
+            name='draft_janitor'
+        )
+    
+    # Ripresa delle pubblicazioni interrotte da un arresto del bot
+    if application.job_queue is None:
+        logger.warning("JobQueue non disponibile: le pubblicazioni interrotte si riprendono con /retry")
+    else:
+        application.job_queue.run_once(bot.resume_fanouts, when=1, name='resume_fanouts')
+    
+    # Pubblicazione periodica del digest in attesa
+    if DIGEST_MODE and DIGEST_FLUSH_MINUTES > 0:
+        if application.job_queue is None:
+            logger.warning("JobQueue non disponibile: il digest partirà solo con /digest o a %d prodotti", DIGEST_MAX_PRODUCTS)
+        else:
+            application.job_queue.run_repeating(
+                bot.digest_job,
+                interval=DIGEST_FLUSH_MINUTES * 60,
+                first=DIGEST_FLUSH_MINUTES * 60,
+                name='digest'
+            )
+    
+    # Monitor dei prezzi in background (richiede python-telegram-bot[job-queue])
+    if MONITOR_INTERVAL_MINUTES > 0:
+        if application.job_queue is None:
+            logger.warning("JobQueue non disponibile: installa python-telegram-bot[job-queue] per il monitor dei prezzi")
+        else:
+            application.job_queue.run_repeating(
+                bot.price_monitor.job,
+                interval=MONITOR_INTERVAL_MINUTES * 60,
+                first=60,
+                name='price_monitor'
+            )
+    
+    # Pubblicazione affidata a processi separati tramite la coda su disco
+    if PUBLISH_WORKERS > 0:
+        if application.job_queue is None:
+            logger.warning("JobQueue non disponibile: i worker di pubblicazione sono disattivati")
+        else:
+            from publish_worker import PublisherPool
+            bot.publisher_pool = PublisherPool(
+                token,
+                base_url=base_url,
+                base_file_url=base_file_url,
+                local_mode=local_mode,
+                workers=PUBLISH_WORKERS
+            )
+            application.job_queue.run_repeating(
+                bot.collect_publish_results,
+                interval=PUBLISH_POLL_SECONDS,
+                first=PUBLISH_POLL_SECONDS,
+                name='publish_results'
+            )
+    
     # Aggiungi error handler
     application.add_error_handler(bot.error_handler)
+
+    return application
+
+
+def main():
+    """Funzione principale per avviare il bot"""
+    
+    # Verifica che il token sia configurato
+    if not BOT_TOKEN or BOT_TOKEN == 'YOUR_BOT_TOKEN_HERE':
+        logger.error("⚠️ BOT_TOKEN non configurato! Modifica il file .env o config.py")
+        return
+    
+    if not ADMIN_USER_IDS:
+        logger.error("⚠️ ADMIN_USER_ID non configurato! Modifica il file .env o config.py")
+        return
+    
+    # Crea l'istanza del bot e l'applicazione con tutti gli handler
+    init_started = time.perf_counter()
+    bot = AffiliateBot()
+    application = build_application(bot)
+    init_seconds = time.perf_counter() - init_started
     
     # Avvia il bot
     logger.info(SYSTEM_MESSAGES['start_bot'])
     print("\n" + "="*50)
     print("🤖 BOT AVVIATO CON SUCCESSO!")
     print("="*50)
-    print(f"📱 Admin User ID: {ADMIN_USER_ID}")
+    print(f"📱 Operatori autorizzati: {', '.join(str(uid) for uid in ADMIN_USER_IDS)}")
     print(f"🌍 Canali configurati: {len(CHANNELS)}")
     print(f"📂 Categorie disponibili: {len(CATEGORIES)}")
+    if BOT_API_BASE_URL:
+        print(f"🛰️ Bot API: {BOT_API_BASE_URL}{' (modalità locale)' if BOT_API_LOCAL_MODE else ''}")
+    print(f"⏱️ Avvio: import {_IMPORT_SECONDS * 1000:.0f} ms, init {init_seconds * 1000:.0f} ms")
     print("="*50 + "\n")
+    logger.info("Tempi di avvio: import %.0f ms, init %.0f ms", _IMPORT_SECONDS * 1000, init_seconds * 1000)
     
     # Polling
     application.run_polling(allowed_updates=Update.ALL_TYPES)
@@ -0,0 +1,144 @@
+"""
+Circuit breaker per sito dello scraping
+Dopo CIRCUIT_FAILURE_THRESHOLD scraping falliti di fila sullo stesso dominio
+il circuito si apre: gli scraping successivi falliscono subito, senza occupare
+il worker (e Chrome) per tutti i timeout dei selettori. Trascorsa l'attesa il
+circuito passa a semi-aperto e lascia passare un solo scraping di prova: se
+riesce il circuito si chiude, altrimenti si riapre con un'attesa doppia (fino a
+CIRCUIT_MAX_OPEN_SECONDS), con una variazione casuale perché i siti non
+vengano riprovati tutti nello stesso istante.
+"""
+
+import logging
+import random
+import threading
+import time
+from typing import Callable, Dict
+
+from config import CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_MAX_OPEN_SECONDS, CIRCUIT_OPEN_SECONDS
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+# Variazione casuale massima dell'attesa (±20%)
+JITTER = 0.2
+
+
+class CircuitBreaker:
+    """
+    Circuito di un dominio (thread-safe: gli scraping girano in thread separati)
+
+    Args:
+        name: Dominio del sito, per i log
+        failure_threshold: Fallimenti consecutivi che aprono il circuito
+        open_seconds: Attesa dopo la prima apertura
+        max_open_seconds: Attesa massima dopo aperture ripetute
+        clock: Orologio monotono (sostituibile nei benchmark)
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        open_seconds: float = CIRCUIT_OPEN_SECONDS,
+        max_open_seconds: float = CIRCUIT_MAX_OPEN_SECONDS,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.clock = clock
+        self.state = STATE_CLOSED
+        self.failures = 0
+        # Aperture consecutive senza una prova riuscita (raddoppiano l'attesa)
+        self.opens = 0
+        self.open_until = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """
+        True se lo scraping può partire; nello stato semi-aperto passa
+        solo la prova, finché non ne viene registrato l'esito
+        """
+        with self._lock:
+            if self.state == STATE_CLOSED:
+                return True
+            if self.state == STATE_OPEN:
+                if self.clock() < self.open_until:
+                    return False
+                self.state = STATE_HALF_OPEN
+                logger.info("Circuito di %s semi-aperto: scraping di prova", self.name)
+            if self._probing:
+                return False
+            self._probing = True
+            metrics.increment('circuit_probes')
+            return True
+
+    def retry_after(self) -> float:
+        """Secondi mancanti alla prossima prova (0 se il circuito non è aperto)"""
+        with self._lock:
+            if self.state != STATE_OPEN:
+                return 0.0
+            return max(0.0, self.open_until - self.clock())
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != STATE_CLOSED:
+                logger.info("Circuito di %s chiuso: il sito risponde di nuovo", self.name)
+            self.state = STATE_CLOSED
+            self.failures = 0
+            self.opens = 0
+            self._probing = False
+        _update_gauge()
+
+    def record_failure(self) -> None:
+        with self._lock:
+            if self.state == STATE_OPEN:
+                # Scraping partito prima dell'apertura: l'attesa resta quella decisa
+                return
+            self.failures += 1
+            if self.state == STATE_CLOSED and self.failures < self.failure_threshold:
+                return
+            delay = min(self.open_seconds * 2 ** self.opens, self.max_open_seconds)
+            delay *= random.uniform(1 - JITTER, 1 + JITTER)
+            self.state = STATE_OPEN
+            self.opens += 1
+            self.open_until = self.clock() + delay
+            self._probing = False
+            metrics.increment('circuit_opened')
+            logger.warning(
+                "Circuito di %s aperto dopo %d fallimenti: nuova prova tra %.0f s",
+                self.name, self.failures, delay
+            )
+        _update_gauge()
+
+    def release(self) -> None:
+        """Lo scraping è finito senza un esito sul sito (es. annullato): libera la prova"""
+        with self._lock:
+            self._probing = False
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker_for(domain: str) -> CircuitBreaker:
+    """Circuito del dominio, creato al primo uso"""
+    with _breakers_lock:
+        breaker = _breakers.get(domain)
+        if breaker is None:
+            breaker = _breakers[domain] = CircuitBreaker(domain)
+        return breaker
+
+
+def _update_gauge() -> None:
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    metrics.set('circuits_open', sum(1 for breaker in breakers if breaker.state != STATE_CLOSED))
+
@@ -0,0 +1,236 @@
+"""
+Categoria dal nome del prodotto
+Un indice di parole chiave per categoria in italiano, inglese, spagnolo e cinese
+(i nomi dei negozi sono spesso in cinese), più i nomi e gli hashtag di
+CATEGORIES e il dizionario personalizzato CATEGORY_KEYWORDS_FILE, compilato in
+un automa di Aho-Corasick: il nome viene letto una sola volta, qualunque sia il
+numero di parole chiave. Vince la categoria con più parole chiave trovate; se
+nessun'altra categoria ne ha trovate la scelta è sicura e il bot la seleziona
+da solo (vedi AffiliateBot.ask_category).
+"""
+
+import logging
+import os
+from collections import Counter, deque
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from config import CATEGORIES, CATEGORY_KEYWORDS_FILE
+from storage import load_json
+
+logger = logging.getLogger(__name__)
+
+# Parole chiave per categoria (minuscole); quelle cinesi vengono cercate come sottostringhe,
+# quindi mai di un solo carattere generico (包 è anche in 包邮, "spedizione gratuita"; 帽 in 连帽, "con cappuccio")
+CATEGORY_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    'shoes': (
+        'scarpe', 'scarpa', 'sneaker', 'sneakers', 'stivali', 'mocassini', 'sandali',
+        'shoes', 'shoe', 'boots', 'trainers', 'loafers', 'sandals',
+        'zapatos', 'zapatillas', 'botas', 'sandalias',
+        'jordan', 'yeezy', 'dunk', 'air force', 'air max',
+        '鞋', '靴',
+    ),
+    'clothing': (
+        'felpa', 'giacca', 'giubbotto', 'maglia', 'maglietta', 'camicia', 'pantaloni', 'cappotto', 'piumino',
+        'hoodie', 'sweatshirt', 'jacket', 'shirt', 't-shirt', 'tee', 'pants', 'jeans', 'shorts', 'coat', 'sweater',
+        'sudadera', 'chaqueta', 'camiseta', 'camisa', 'pantalones', 'abrigo', 'jersey',
+        '夹克', '卫衣', '外套', 't恤', '衬衫', '裤', '羽绒服', '毛衣',
+    ),
+    'accessories': (
+        'cappello', 'cintura', 'occhiali', 'sciarpa', 'collana', 'bracciale', 'anello',
+        'hat', 'cap', 'beanie', 'belt', 'sunglasses', 'scarf', 'necklace', 'bracelet', 'ring',
+        'gorra', 'sombrero', 'cinturón', 'cinturon', 'gafas', 'bufanda', 'collar', 'pulsera', 'anillo',
+        '帽子', '棒球帽', '鸭舌帽', '渔夫帽', '毛线帽', '腰带', '皮带', '眼镜', '围巾', '项链', '手链', '戒指',
+    ),
+    'bags': (
+        'borsa', 'borsello', 'zaino', 'portafoglio', 'marsupio',
+        'bag', 'backpack', 'tote', 'wallet', 'handbag', 'crossbody',
+        'bolso', 'bolsa', 'mochila', 'cartera', 'riñonera',
+        '包包', '手提包', '挎包', '斜挎包', '单肩包', '双肩包', '腰包', '钱包', '背包',
+    ),
+    'watches': (
+        'orologio', 'watch', 'reloj',
+        'rolex', 'omega', 'patek', 'audemars', 'cartier',
+        '手表', '腕表',
+    ),
+}
+
+
+class Classification(NamedTuple):
+    """Esito della classificazione: categoria (o None), parole trovate, True se senza concorrenti"""
+    category: Optional[str]
+    matches: int
+    confident: bool
+
+
+def _is_cjk(keyword: str) -> bool:
+    return any('一' <= c <= '鿿' for c in keyword)
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char in "'-"
+
+
+class KeywordIndex:
+    """
+    Automa di Aho-Corasick sulle parole chiave: trova tutte le occorrenze in una
+    sola passata sul testo. Le parole non cinesi valgono solo se intere (non
+    precedute o seguite da lettere, cifre, apostrofi o trattini).
+
+    Args:
+        keywords: Coppie (parola chiave, categoria); una parola può indicare più categorie
+    """
+
+    def __init__(self, keywords: Iterable[Tuple[str, str]]):
+        # Nodo: transizioni per carattere; i nodi finali hanno le parole che vi terminano
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[Tuple[str, Set[str]]]] = [[]]
+        self.size = 0
+
+        categories_by_keyword: Dict[str, Set[str]] = {}
+        for keyword, category in keywords:
+            keyword = keyword.strip().lower()
+            if keyword:
+                categories_by_keyword.setdefault(keyword, set()).add(category)
+        for keyword, categories in categories_by_keyword.items():
+            self._add(keyword, categories)
+        self._build_links()
+
+    def _add(self, keyword: str, categories: Set[str]) -> None:
+        node = 0
+        for char in keyword:
+            following = self._goto[node].get(char)
+            if following is None:
+                following = len(self._goto)
+                self._goto[node][char] = following
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            node = following
+        self._output[node].append((keyword, categories))
+        self.size += 1
+
+    def _build_links(self) -> None:
+        """Collegamenti di fallimento in ampiezza; ogni nodo eredita le parole del suo suffisso"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, following in self._goto[node].items():
+                queue.append(following)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[following] = self._goto[fail].get(char, 0)
+                self._output[following] = self._output[following] + self._output[self._fail[following]]
+
+    def scores(self, text: str) -> Counter:
+        """Parole chiave distinte trovate nel testo, contate per categoria"""
+        text = (text or '').lower()
+        found: Set[str] = set()
+        scores: Counter = Counter()
+        node = 0
+        for end, char in enumerate(text):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for keyword, categories in self._output[node]:
+                if keyword in found:
+                    continue
+                start = end - len(keyword) + 1
+                if not _is_cjk(keyword) and (
+                    (start > 0 and _is_word_char(text[start - 1]))
+                    or (end + 1 < len(text) and _is_word_char(text[end + 1]))
+                ):
+                    continue
+                found.add(keyword)
+                scores.update(categories)
+        return scores
+
+
+def _index_keywords(custom: Dict[str, List[str]]) -> Iterable[Tuple[str, str]]:
+    """Parole chiave predefinite, nomi e hashtag delle categorie, dizionario personalizzato"""
+    for category, keywords in CATEGORY_KEYWORDS.items():
+        if category in CATEGORIES:
+            for keyword in keywords:
+                yield keyword, category
+    for category, languages in CATEGORIES.items():
+        for info in languages.values():
+            yield info['name'], category
+            yield info['hashtag'].lstrip('#'), category
+    for category, keywords in custom.items():
+        if category not in CATEGORIES:
+            logger.warning("Categoria sconosciuta nel dizionario %s: %s", CATEGORY_KEYWORDS_FILE, category)
+            continue
+        for keyword in keywords:
+            yield str(keyword), category
+
+
+_index_cache: Dict[str, object] = {'key': None, 'index': None}
+
+
+def keyword_index(path: str = CATEGORY_KEYWORDS_FILE) -> KeywordIndex:
+    """
+    Indice delle parole chiave, ricompilato solo quando cambia il dizionario personalizzato
+
+    Formato del file: {"shoes": ["air jordan", "new balance"], "bags": ["lv"]}
+    """
+    try:
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        key = (path, None, None)
+
+    if _index_cache['key'] != key:
+        custom = load_json(path, {}) if key[1] is not None else {}
+        if not isinstance(custom, dict):
+            logger.warning("Dizionario delle categorie %s non valido, lo ignoro", path)
+            custom = {}
+        index = KeywordIndex(_index_keywords(custom))
+        logger.info("Indice delle categorie compilato: %d parole chiave", index.size)
+        _index_cache['key'] = key
+        _index_cache['index'] = index
+    return _index_cache['index']
+
+
+def classify(text: str) -> Classification:
+    """
+    Categoria del nome del prodotto
+
+    Returns:
+        Classification: category None se nessuna parola chiave compare o c'è un
+        pareggio; confident True se nessun'altra categoria ha parole chiave nel nome
+    """
+    ranked = keyword_index().scores(text).most_common(2)
+    if not ranked or (len(ranked) > 1 and ranked[0][1] == ranked[1][1]):
+        return Classification(None, 0, False)
+    category, matches = ranked[0]
+    return Classification(category, matches, len(ranked) == 1)
+
+
+def guess_category(text: str) -> Optional[str]:
+    """
+    Categoria più probabile per il nome del prodotto
+
+    Returns:
+        Chiave di CATEGORIES, o None se nessuna parola chiave compare o c'è un pareggio
+    """
+    return classify(text).category
+
+
+if __name__ == "__main__":
+    # Test del classificatore
+    cases = {
+        'Nike Air Force 1 sneakers': 'shoes',
+        'Felpa con cappuccio Stone Island': 'clothing',
+        '耐克 包邮 新款': None,
+        '连帽卫衣 包邮': 'clothing',
+        '棒球帽 男女同款': 'accessories',
+        '斜挎包 包邮': 'bags',
+        'Rolex Submariner watch': 'watches',
+        'Prodotto generico': None,
+    }
+    for text, expected in cases.items():
+        found = classify(text)
+        status = "✅" if found.category == expected else "❌"
+        print(f"{status} {text!r} → {found}")
+        assert found.category == expected, f"{text!r}: atteso {expected}, ottenuto {found.category}"
@@ -19,6 +19,27 @@ BOT_TOKEN = os.getenv('BOT_TOKEN', 'YOUR_BOT_TOKEN_HERE')
 # Il tuo User ID Telegram (per sicurezza)
 ADMIN_USER_ID = int(os.getenv('ADMIN_USER_ID', '0'))  # Sostituisci con il tuo ID
 
+# Altri operatori autorizzati (User ID separati da virgola): ognuno lavora alle sue bozze in parallelo
+ADMIN_USER_IDS = [int(uid) for uid in os.getenv('ADMIN_USER_IDS', '').split(',') if uid.strip()]
+if ADMIN_USER_ID and ADMIN_USER_ID not in ADMIN_USER_IDS:
+    ADMIN_USER_IDS.insert(0, ADMIN_USER_ID)
+# L'admin principale riceve gli avvisi del bot (il primo della lista se ADMIN_USER_ID manca)
+ADMIN_USER_ID = ADMIN_USER_ID or (ADMIN_USER_IDS[0] if ADMIN_USER_IDS else 0)
+
+# Update elaborati in parallelo (quelli della stessa conversazione restano in ordine)
+CONCURRENT_UPDATES = int(os.getenv('CONCURRENT_UPDATES', '32'))
+
+# Tempo massimo (s) del controllo dei canali all'avvio (0 = nessun controllo)
+PREFLIGHT_TIMEOUT = float(os.getenv('PREFLIGHT_TIMEOUT', '10'))
+
+# Server Bot API self-hosted (telegram-bot-api): URL delle chiamate e dei file
+# (vuoti = API pubblica di Telegram)
+BOT_API_BASE_URL = os.getenv('BOT_API_BASE_URL', '').strip()
+BOT_API_FILE_URL = os.getenv('BOT_API_FILE_URL', '').strip()
+# Server avviato con --local: le foto locali vengono passate per percorso invece
+# di essere caricate via HTTP (il server deve vedere gli stessi file del bot)
+BOT_API_LOCAL_MODE = os.getenv('BOT_API_LOCAL_MODE', '0') == '1'
+
 # ============================================
 # CONFIGURAZIONE CANALI
 # ============================================
@@ -28,20 +49,33 @@ CHANNELS = {
     'IT': {
         'chat_id': os.getenv('CHANNEL_IT', '@your_italian_channel'),
         'name': 'Italiano',
-        'emoji_flag': '🇮🇹'
+        'emoji_flag': '🇮🇹',
+        'currency': os.getenv('CURRENCY_IT', 'EUR')  # Valuta mostrata nei post
     },
     'EN': {
         'chat_id': os.getenv('CHANNEL_EN', '@your_english_channel'),
         'name': 'English',
-        'emoji_flag': '🇬🇧'
+        'emoji_flag': '🇬🇧',
+        'currency': os.getenv('CURRENCY_EN', 'USD')  # Valuta mostrata nei post
     },
     'ES': {
         'chat_id': os.getenv('CHANNEL_ES', '@your_spanish_channel'),
         'name': 'Español',
-        'emoji_flag': '🇪🇸'
+        'emoji_flag': '🇪🇸',
+        'currency': os.getenv('CURRENCY_ES', 'EUR')  # Valuta mostrata nei post
     }
 }
 
+# ============================================
+# PREZZI E VALUTE
+# ============================================
+
+# Valuta assunta quando il prezzo inserito non ne indica una (i negozi sono cinesi)
+DEFAULT_PRICE_CURRENCY = os.getenv('DEFAULT_PRICE_CURRENCY', 'CNY')
+
+# File locale con i tassi di cambio (ricaricato solo quando cambia)
+RATES_FILE = os.getenv('RATES_FILE', 'rates.json')
+
 # ============================================
 # CATEGORIE PRODOTTI
 # ============================================
@@ -74,6 +108,13 @@ CATEGORIES = {
     }
 }
 
+# Parole chiave aggiuntive per riconoscere la categoria dal nome del prodotto
+# (JSON {categoria: [parole]}, ricaricato solo quando cambia; vedi classifier.py)
+CATEGORY_KEYWORDS_FILE = os.getenv('CATEGORY_KEYWORDS_FILE', 'category_keywords.json')
+
+# Seleziona da solo la categoria quando il nome la indica senza ambiguità (0 = chiedi sempre)
+CATEGORY_AUTO_SELECT = os.getenv('CATEGORY_AUTO_SELECT', '1') == '1'
+
 # ============================================
 # CONFIGURAZIONE WEB SCRAPING
 # ============================================
@@ -84,6 +125,171 @@ SCRAPING_TIMEOUT = 15
 # User-Agent per le richieste
 USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
 
+# Siti per cui usare il profilo "leggero" del browser: niente immagini, media,
+# font e tracker, caricamento 'eager' (leggiamo solo il testo del DOM)
+SCRAPING_LEAN_SITES = [
+    site.strip().lower()
+    for site in os.getenv('SCRAPING_LEAN_SITES', 'oopbuy,weidian').split(',')
+    if site.strip()
+]
+
+# Risorse bloccate nel profilo leggero (pattern per Network.setBlockedURLs)
+SCRAPING_BLOCKED_URLS = [
+    # Immagini, media e font
+    '*.jpg', '*.jpeg', '*.png', '*.gif', '*.webp', '*.svg', '*.ico',
+    '*.mp4', '*.webm', '*.m3u8', '*.mp3',
+    '*.woff', '*.woff2', '*.ttf', '*.otf',
+    # Host di terze parti (analytics, tracker, chat)
+    '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*',
+    '*facebook.net*', '*facebook.com/tr*', '*hotjar.com*', '*clarity.ms*',
+    '*tiktok.com*', '*hm.baidu.com*', '*cnzz.com*', '*tawk.to*', '*intercom.io*',
+]
+
+# Circuit breaker per sito: dopo N scraping falliti di fila sullo stesso dominio
+# gli scraping falliscono subito per CIRCUIT_OPEN_SECONDS, poi parte uno scraping
+# di prova; a ogni prova fallita l'attesa raddoppia fino a CIRCUIT_MAX_OPEN_SECONDS
+CIRCUIT_FAILURE_THRESHOLD = max(1, int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '5')))
+CIRCUIT_OPEN_SECONDS = float(os.getenv('CIRCUIT_OPEN_SECONDS', '30'))
+CIRCUIT_MAX_OPEN_SECONDS = float(os.getenv('CIRCUIT_MAX_OPEN_SECONDS', '600'))
+
+# Worker di scraping in un processo separato: viene riciclato dopo N job,
+# se la memoria del processo (Chrome incluso) supera la soglia o se un job si blocca
+SCRAPER_WORKER_MAX_JOBS = int(os.getenv('SCRAPER_WORKER_MAX_JOBS', '20'))
+SCRAPER_WORKER_MAX_RSS_MB = int(os.getenv('SCRAPER_WORKER_MAX_RSS_MB', '700'))
+SCRAPER_WORKER_JOB_TIMEOUT = int(os.getenv('SCRAPER_WORKER_JOB_TIMEOUT', '120'))
+
+# Motore di scraping: 'process' (un Chrome per ogni link) o 'tabs' (un solo Chrome
+# con una scheda per link, fino a SCRAPER_MAX_TABS scraping contemporanei)
+SCRAPER_ENGINE = os.getenv('SCRAPER_ENGINE', 'process').lower()
+SCRAPER_MAX_TABS = int(os.getenv('SCRAPER_MAX_TABS', '4'))
+
+# Cartella delle immagini scaricate dallo scraping
+IMAGES_CACHE_DIR = os.getenv('IMAGES_CACHE_DIR', 'downloaded_images')
+
+# ============================================
+# BOZZE
+# ============================================
+
+# Minuti di inattività dopo cui una bozza scade e viene eliminata (0 = mai)
+DRAFT_TTL_MINUTES = int(os.getenv('DRAFT_TTL_MINUTES', '30'))
+
+# Bozze aperte al massimo in memoria: oltre il limite vengono eliminate le più vecchie
+DRAFT_MAX_ACTIVE = int(os.getenv('DRAFT_MAX_ACTIVE', '50'))
+
+# Scraping del link appena arriva, per suggerire nome, prezzo e categoria mentre l'operatore scrive
+DRAFT_PREFETCH = os.getenv('DRAFT_PREFETCH', '1') == '1'
+
+# ============================================
+# MONITORAGGIO PREZZI
+# ============================================
+
+# Ogni quanti minuti gira il monitor dei prezzi dei post pubblicati (0 = disattivato, es. 30)
+MONITOR_INTERVAL_MINUTES = int(os.getenv('MONITOR_INTERVAL_MINUTES', '0'))
+
+# Prodotti ricontrollati al massimo per ogni giro (lo scraping interattivo ha sempre la precedenza)
+MONITOR_BUDGET = int(os.getenv('MONITOR_BUDGET', '5'))
+
+# Intervallo minimo e massimo (ore) tra due controlli dello stesso prodotto:
+# i prodotti recenti e con prezzi che cambiano spesso sono ricontrollati prima
+MONITOR_MIN_INTERVAL_HOURS = float(os.getenv('MONITOR_MIN_INTERVAL_HOURS', '6'))
+MONITOR_MAX_INTERVAL_HOURS = float(os.getenv('MONITOR_MAX_INTERVAL_HOURS', '168'))
+
+# Prodotti pubblicati da più giorni di così non vengono più controllati
+MONITOR_MAX_AGE_DAYS = int(os.getenv('MONITOR_MAX_AGE_DAYS', '60'))
+
+# Se 1, quando il prezzo cambia aggiorna anche le caption nei canali (altrimenti avvisa solo l'admin)
+MONITOR_UPDATE_CAPTIONS = os.getenv('MONITOR_UPDATE_CAPTIONS', '0') == '1'
+
+# ============================================
+# DATI PERSISTENTI
+# ============================================
+
+# Cartella con gli archivi locali del bot (indici, post pubblicati, code)
+DATA_DIR = os.getenv('DATA_DIR', 'data')
+
+# Indice dei prodotti già pubblicati (ID articolo canonico e impronte delle foto)
+PUBLISHED_INDEX_FILE = os.path.join(DATA_DIR, 'published_index.json')
+
+# Post pubblicati: prodotto -> canale -> message_id (per modificarli o eliminarli in blocco)
+PUBLISHED_POSTS_FILE = os.path.join(DATA_DIR, 'published_posts.json')
+
+# Coda delle pubblicazioni per i worker (pending/ -> processing/ -> done/)
+PUBLISH_QUEUE_DIR = os.path.join(DATA_DIR, 'publish_queue')
+
+# Stato del monitor dei prezzi (ultimo controllo, cambi e errori per post)
+PRICE_MONITOR_FILE = os.path.join(DATA_DIR, 'price_monitor.json')
+
+# ID numerici dei canali risolti all'avvio (username configurato -> chat_id)
+CHANNEL_IDS_FILE = os.path.join(DATA_DIR, 'channel_ids.json')
+
+# Stato per canale delle pubblicazioni non completate (ripresa all'avvio e /retry)
+FANOUT_DIR = os.path.join(DATA_DIR, 'fanouts')
+
+# Prodotti confermati in attesa del prossimo digest
+DIGEST_QUEUE_FILE = os.path.join(DATA_DIR, 'digest_queue.json')
+
+# Impronte percettive (dHash) delle foto pubblicate
+PHOTO_HASH_INDEX_FILE = os.path.join(DATA_DIR, 'photo_hashes.json')
+
+# Bit di differenza (su 64) entro cui due foto sono considerate la stessa immagine
+# (0 = solo foto identiche, massimo 7; serve Pillow, altrimenti il controllo è disattivato)
+PHASH_MAX_DISTANCE = int(os.getenv('PHASH_MAX_DISTANCE', '6'))
+
+# ============================================
+# LIMITI DI INVIO TELEGRAM
+# ============================================
+
+# Intervallo minimo (s) tra due chiamate sullo stesso canale
+CHANNEL_MIN_INTERVAL = float(os.getenv('CHANNEL_MIN_INTERVAL', '1.0'))
+
+# Chiamate al secondo in totale verso la Bot API (Telegram tollera circa 30/s)
+GLOBAL_RATE_LIMIT = float(os.getenv('GLOBAL_RATE_LIMIT', '25'))
+
+# Tentativi dopo un errore 429 (RetryAfter) prima di arrendersi
+API_MAX_RETRIES = int(os.getenv('API_MAX_RETRIES', '3'))
+
+# ============================================
+# CONNESSIONI ALLA BOT API
+# ============================================
+
+# Connessioni contemporanee per le chiamate normali e per upload/download di foto
+# (getUpdates ha sempre la sua connessione dedicata, vedi http_pools.py)
+HTTP_POOL_SIZE = max(1, int(os.getenv('HTTP_POOL_SIZE', '32')))
+HTTP_MEDIA_POOL_SIZE = max(1, int(os.getenv('HTTP_MEDIA_POOL_SIZE', '8')))
+
+# Secondi per cui una connessione inattiva resta aperta per essere riusata
+HTTP_KEEPALIVE_SECONDS = float(os.getenv('HTTP_KEEPALIVE_SECONDS', '60'))
+
+# Timeout (s): connessione, lettura/scrittura delle chiamate normali, upload e
+# download di foto, attesa di una connessione libera nel pool
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '10'))
+HTTP_WRITE_TIMEOUT = float(os.getenv('HTTP_WRITE_TIMEOUT', '10'))
+HTTP_MEDIA_TIMEOUT = float(os.getenv('HTTP_MEDIA_TIMEOUT', '120'))
+HTTP_POOL_TIMEOUT = float(os.getenv('HTTP_POOL_TIMEOUT', '10'))
+
+# ============================================
+# PUBBLICAZIONE
+# ============================================
+
+# Processi dedicati alla pubblicazione (0 = il bot pubblica da solo).
+# Con N > 0 il bot mette le bozze confermate in una coda su disco e N worker,
+# ognuno con il suo client Bot, caricano gli album sui canali
+PUBLISH_WORKERS = int(os.getenv('PUBLISH_WORKERS', '0'))
+
+# Ogni quanti secondi il bot raccoglie i risultati dei worker
+PUBLISH_POLL_SECONDS = float(os.getenv('PUBLISH_POLL_SECONDS', '1.0'))
+
+# Digest: i prodotti confermati si accumulano e vengono pubblicati insieme,
+# un solo album per canale con un bottone di acquisto per prodotto
+DIGEST_MODE = os.getenv('DIGEST_MODE', '0') == '1'
+
+# Prodotti per digest: al raggiungimento il digest parte subito (massimo 10, il limite di un album)
+DIGEST_MAX_PRODUCTS = max(1, min(int(os.getenv('DIGEST_MAX_PRODUCTS', '10')), 10))
+
+# Ogni quanti minuti viene pubblicato il digest in attesa, anche se incompleto (0 = solo con /digest)
+DIGEST_FLUSH_MINUTES = int(os.getenv('DIGEST_FLUSH_MINUTES', '30'))
+
 # ============================================
 # STATI CONVERSATION HANDLER
 # ============================================
@@ -99,6 +305,9 @@ STATE_WAITING_PRODUCT_NAME = 6
 # LOGGING
 # ============================================
 
-# Livello di logging
-LOG_LEVEL = 'INFO'
+# Livello di logging, anche per modulo (es. 'INFO,scraper=DEBUG,httpx=WARNING')
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
 LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Record JSON strutturati (una riga per evento) invece del testo LOG_FORMAT
+LOG_JSON = os.getenv('LOG_JSON', '0') == '1'
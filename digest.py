@@ -0,0 +1,90 @@
+"""
+Digest: più prodotti in un solo post per canale (DIGEST_MODE=1)
+Le bozze confermate si accumulano in una coda su disco; il digest unisce le
+loro foto in un solo album per canale, con l'elenco dei prodotti nella caption
+e un bottone di acquisto per prodotto. Con N prodotti le chiamate per canale
+sono 2 invece di 2N (send_media_group + edit_message_reply_markup).
+"""
+
+import logging
+from typing import Any, Dict, List
+
+from config import DIGEST_MAX_PRODUCTS, DIGEST_QUEUE_FILE
+from storage import load_json, save_json
+
+logger = logging.getLogger(__name__)
+
+# Foto al massimo in un album di Telegram
+ALBUM_MAX_PHOTOS = 10
+
+
+class DigestQueue:
+    """Bozze confermate in attesa del prossimo digest, in ordine di conferma"""
+
+    def __init__(self, path: str = DIGEST_QUEUE_FILE):
+        self.path = path
+        self.drafts: List[Dict[str, Any]] = load_json(path, [])
+
+    def __len__(self) -> int:
+        return len(self.drafts)
+
+    def add(self, draft: Dict[str, Any]) -> int:
+        """
+        Accoda una bozza confermata e salva la coda
+
+        Returns:
+            Prodotti in attesa, compreso questo
+        """
+        self.drafts.append(draft)
+        save_json(self.path, self.drafts)
+        return len(self.drafts)
+
+    def take(self, limit: int = DIGEST_MAX_PRODUCTS) -> List[Dict[str, Any]]:
+        """Toglie dalla coda i primi `limit` prodotti e salva la coda"""
+        taken, self.drafts = self.drafts[:limit], self.drafts[limit:]
+        if taken:
+            save_json(self.path, self.drafts)
+        return taken
+
+
+def _album_photos(products: List[Dict[str, Any]]) -> List[str]:
+    """
+    Foto del digest: almeno la prima di ogni prodotto, poi le altre a turno
+    finché l'album non è pieno; le foto di un prodotto restano vicine
+    """
+    quotas = [0] * len(products)
+    remaining = ALBUM_MAX_PHOTOS
+    while remaining:
+        assigned = False
+        for i, product in enumerate(products):
+            if remaining and quotas[i] < len(product['photos']):
+                quotas[i] += 1
+                remaining -= 1
+                assigned = True
+        if not assigned:
+            break
+    return [photo for product, quota in zip(products, quotas) for photo in product['photos'][:quota]]
+
+
+def build_digest(products: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Unisce le bozze in un digest pubblicabile con publish_draft
+
+    Il digest ha gli stessi campi di una bozza (vedi publisher.build_draft) più
+    la lista 'products'; caption e bottoni vengono creati dai prodotti.
+    """
+    products = products[:ALBUM_MAX_PHOTOS]
+    photos = _album_photos(products)
+    return {
+        'product_name': f"Digest ({len(products)} prodotti)",
+        'price': '',
+        'price_by_lang': {},
+        'referral_link': '',
+        'category': products[0]['category'] if products else 'clothing',
+        'photos': photos,
+        # I file locali vengono riconosciuti dal percorso (vedi publisher._is_local_file)
+        'photos_are_urls': False,
+        'photo_uids': [uid for product in products for uid in product['photo_uids']],
+        'photo_hashes': [value for product in products for value in product.get('photo_hashes', [])],
+        'products': products,
+    }
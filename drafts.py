@@ -0,0 +1,184 @@
+"""
+Scadenza delle bozze abbandonate
+Una bozza (foto, link, album in arrivo) vive in context.user_data finché la
+conversazione non termina. Le bozze inattive da più di DRAFT_TTL_MINUTES
+scadono, e oltre DRAFT_MAX_ACTIVE bozze aperte vengono eliminate le più vecchie.
+Le immagini scaricate dallo scraping per la bozza vengono cancellate; lo
+scraping anticipato e i calcoli delle impronte delle foto ancora in corso
+vengono annullati.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, MutableMapping, Tuple
+
+from telegram.ext import Application, ConversationHandler, ContextTypes
+
+from config import DRAFT_MAX_ACTIVE, DRAFT_TTL_MINUTES, IMAGES_CACHE_DIR
+from metrics import metrics
+import prefetch
+
+logger = logging.getLogger(__name__)
+
+# Ogni quanti secondi vengono controllate le bozze aperte
+SWEEP_INTERVAL = 60
+
+# Chiave di user_data con l'istante dell'ultimo update dell'operatore
+TOUCHED_KEY = 'draft_touched_at'
+
+# Chiave impostata quando la bozza viene eliminata per il limite di bozze aperte
+EVICTED_KEY = 'draft_evicted'
+
+# Chiave di user_data con i calcoli delle impronte delle foto ancora in corso
+PHOTO_HASH_TASKS_KEY = 'photo_hash_tasks'
+
+# Secondi concessi alla conferma per finire le impronte ancora in calcolo
+PHOTO_HASH_WAIT = 5.0
+
+# Chiavi di user_data che indicano una bozza in corso
+DRAFT_KEYS = ('photos', 'media_groups', 'referral_link')
+
+
+def touch(user_data: MutableMapping[str, Any]) -> None:
+    """Registra l'attività dell'operatore sulla sua bozza"""
+    user_data[TOUCHED_KEY] = time.time()
+
+
+def has_draft(user_data: MutableMapping[str, Any]) -> bool:
+    return any(key in user_data for key in DRAFT_KEYS)
+
+
+def cancel_photo_hashes(user_data: MutableMapping[str, Any]) -> int:
+    """
+    Annulla i calcoli delle impronte delle foto ancora in corso
+
+    Returns:
+        Numero di calcoli annullati
+    """
+    cancelled = 0
+    for task in user_data.pop(PHOTO_HASH_TASKS_KEY, set()):
+        if not task.done():
+            task.cancel()
+            cancelled += 1
+    return cancelled
+
+
+async def settle_photo_hashes(user_data: MutableMapping[str, Any], timeout: float = PHOTO_HASH_WAIT) -> None:
+    """Aspetta le impronte delle foto ancora in calcolo (al massimo timeout secondi), poi annulla le altre"""
+    pending = [task for task in user_data.get(PHOTO_HASH_TASKS_KEY, ()) if not task.done()]
+    if pending:
+        await asyncio.wait(pending, timeout=timeout)
+    cancel_photo_hashes(user_data)
+
+
+def discard_draft(user_data: MutableMapping[str, Any], cache_dir: str = IMAGES_CACHE_DIR) -> int:
+    """
+    Elimina la bozza e le immagini scaricate per lei, annullando lo scraping
+    anticipato e i calcoli delle impronte delle foto
+
+    Vengono cancellati solo i file dentro la cartella delle immagini dello scraping:
+    le foto inviate dall'operatore sono file_id di Telegram.
+
+    Returns:
+        Numero di file eliminati
+    """
+    prefetch.cancel(user_data)
+    cancel_photo_hashes(user_data)
+    cache_root = os.path.abspath(cache_dir)
+    removed = 0
+    for photo in user_data.get('photos', []):
+        path = os.path.abspath(photo)
+        if os.path.dirname(path) != cache_root:
+            continue
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning("Impossibile eliminare l'immagine %s: %s", path, e)
+    user_data.clear()
+    if removed:
+        metrics.increment('draft_files_removed', removed)
+    return removed
+
+
+class DraftJanitor:
+    """
+    Job periodico che applica scadenza e limite alle bozze aperte
+
+    Quando la conversazione ha un timeout in corso, la bozza viene chiusa
+    anticipando quel timeout: così passa dagli handler TIMEOUT del
+    ConversationHandler, che avvisano l'operatore e chiudono la conversazione.
+    Le bozze rimaste senza conversazione vengono eliminate direttamente.
+    """
+
+    def __init__(
+        self,
+        conversation: ConversationHandler,
+        ttl_seconds: float = DRAFT_TTL_MINUTES * 60,
+        max_active: int = DRAFT_MAX_ACTIVE
+    ):
+        self.conversation = conversation
+        self.ttl_seconds = ttl_seconds
+        self.max_active = max_active
+
+    def _timeout_job(self, user_id: int):
+        for key, job in self.conversation.timeout_jobs.items():
+            if key[-1] == user_id:
+                return job
+        return None
+
+    def _close(self, user_id: int, user_data: MutableMapping[str, Any], evicted: bool) -> None:
+        job = self._timeout_job(user_id)
+        if evicted:
+            user_data[EVICTED_KEY] = True
+        if job is not None and job.job is not None:
+            # Il timeout scatta subito e segue il percorso normale (handler TIMEOUT)
+            job.job.modify(next_run_time=datetime.now(timezone.utc))
+            return
+        discard_draft(user_data)
+        metrics.increment('drafts_evicted' if evicted else 'drafts_expired')
+        logger.info("Bozza dell'operatore %s eliminata senza conversazione attiva", user_id)
+
+    def sweep(self, application: Application) -> Dict[str, int]:
+        """
+        Chiude le bozze scadute e quelle oltre il limite, dalla più vecchia
+
+        Returns:
+            {'active', 'expired', 'evicted'}
+        """
+        now = time.time()
+        drafts: List[Tuple[float, int, MutableMapping[str, Any]]] = sorted(
+            (user_data.get(TOUCHED_KEY, now), user_id, user_data)
+            for user_id, user_data in list(application.user_data.items())
+            if has_draft(user_data) and not user_data.get(EVICTED_KEY)
+        )
+
+        expired = 0
+        if self.ttl_seconds > 0:
+            while drafts and now - drafts[0][0] >= self.ttl_seconds:
+                _, user_id, user_data = drafts.pop(0)
+                self._close(user_id, user_data, evicted=False)
+                expired += 1
+
+        evicted = 0
+        while len(drafts) > self.max_active:
+            _, user_id, user_data = drafts.pop(0)
+            self._close(user_id, user_data, evicted=True)
+            evicted += 1
+
+        metrics.set('drafts_active', len(drafts))
+        if expired or evicted:
+            logger.info(
+                "Bozze: %d attive, %d scadute, %d eliminate per il limite",
+                len(drafts), expired, evicted,
+                extra={'drafts': {'active': len(drafts), 'expired': expired, 'evicted': evicted}}
+            )
+        return {'active': len(drafts), 'expired': expired, 'evicted': evicted}
+
+    async def job(self, context: ContextTypes.DEFAULT_TYPE) -> None:
+        self.sweep(context.application)
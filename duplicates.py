@@ -0,0 +1,160 @@
+"""
+Indice dei prodotti già pubblicati per riconoscere i duplicati
+Ogni link viene ridotto a un ID articolo canonico (es. 'weidian:7231458890'),
+indipendente dall'agente (Oopbuy, ...) e dai parametri di referral
+"""
+
+import logging
+import re
+import time
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import parse_qs, urlsplit, urlencode
+
+from config import PUBLISHED_INDEX_FILE
+from image_hash import PhotoHashIndex
+from storage import load_json, save_json
+
+logger = logging.getLogger(__name__)
+
+# Parametri che negli agenti contengono il link del negozio originale
+WRAPPED_URL_PARAMS = ('url', 'link', 'goodsurl', 'producturl', 'shop_url', 'itemurl')
+
+# Parametri di tracking/referral ignorati nell'ID di fallback
+TRACKING_PARAMS = {
+    'invitecode', 'ref', 'referral', 'partnercode', 'affcode', 'utm_source',
+    'utm_medium', 'utm_campaign', 'utm_content', 'spm', 'share_crt_v', 'sp_tk'
+}
+
+# Piattaforme riconosciute nei link degli agenti del tipo /product/<piattaforma>/<id>
+PLATFORM_ALIASES = {
+    'weidian': 'weidian', 'wd': 'weidian',
+    'taobao': 'taobao', 'tb': 'taobao', 'tmall': 'taobao',
+    '1688': '1688', 'ali_1688': '1688', 'alibaba': '1688',
+}
+
+
+def _host(url: str) -> str:
+    host = (urlsplit(url).hostname or '').lower()
+    for prefix in ('www.', 'm.', 'h5.'):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    return host
+
+
+def canonical_item_id(url: str) -> str:
+    """
+    Riduce un link prodotto al suo ID articolo canonico
+
+    Args:
+        url: Link del prodotto (anche racchiuso in un link di un agente)
+
+    Returns:
+        ID del tipo 'weidian:123', 'taobao:456', '1688:789' oppure
+        'url:<host><path>' ripulito dai parametri di tracking
+    """
+    parts = urlsplit(url.strip())
+    query = {k.lower(): v for k, v in parse_qs(parts.query).items()}
+
+    # Link di un agente che racchiude il link del negozio
+    for param in WRAPPED_URL_PARAMS:
+        inner = query.get(param, [''])[0]
+        if inner.startswith('http'):
+            return canonical_item_id(inner)
+
+    host = _host(url)
+    path = parts.path.rstrip('/')
+
+    if 'weidian.com' in host:
+        item_id = (query.get('itemid') or query.get('id') or [''])[0]
+        if item_id:
+            return f"weidian:{item_id}"
+    if 'taobao.com' in host or 'tmall.com' in host:
+        item_id = query.get('id', [''])[0]
+        if item_id:
+            return f"taobao:{item_id}"
+    if '1688.com' in host:
+        match = re.search(r'/offer/(\d+)', path)
+        if match:
+            return f"1688:{match.group(1)}"
+
+    # Agenti con link del tipo /product/weidian/123 o con i parametri id + platform
+    segments = [s.lower() for s in path.split('/') if s]
+    for platform_segment, item_id in zip(segments, segments[1:]):
+        if platform_segment in PLATFORM_ALIASES and item_id.isdigit():
+            return f"{PLATFORM_ALIASES[platform_segment]}:{item_id}"
+    platform = (query.get('platform') or query.get('shop_type') or query.get('source') or [''])[0].lower()
+    item_id = (query.get('id') or query.get('itemid') or query.get('goodsid') or [''])[0]
+    if platform in PLATFORM_ALIASES and item_id:
+        return f"{PLATFORM_ALIASES[platform]}:{item_id}"
+
+    clean_query = urlencode(sorted(
+        (k, v[0]) for k, v in query.items() if k not in TRACKING_PARAMS
+    ))
+    return f"url:{host}{path}" + (f"?{clean_query}" if clean_query else '')
+
+
+class PublishedIndex:
+    """
+    Indice persistente dei prodotti pubblicati
+
+    Mantiene in memoria due dizionari (lookup O(1)):
+    - items: ID articolo canonico -> dati della pubblicazione
+    - media: impronta della foto (file_unique_id di Telegram) -> ID articolo
+    Le impronte percettive (foto simili ma non identiche) sono in photo_hashes.
+    """
+
+    def __init__(self, path: str = PUBLISHED_INDEX_FILE, photo_hashes: Optional[PhotoHashIndex] = None):
+        self.path = path
+        data = load_json(path, {})
+        self.items: Dict[str, Dict] = data.get('items', {})
+        self.media: Dict[str, str] = data.get('media', {})
+        self.photo_hashes = photo_hashes if photo_hashes is not None else PhotoHashIndex()
+
+    def find_item(self, url: str) -> Optional[Dict]:
+        """Restituisce la pubblicazione precedente dello stesso articolo, se esiste"""
+        return self.items.get(canonical_item_id(url))
+
+    def find_media(self, fingerprints: Iterable[str]) -> Optional[Dict]:
+        """Restituisce la pubblicazione che conteneva una delle foto indicate, se esiste"""
+        for fingerprint in fingerprints:
+            item_id = self.media.get(fingerprint)
+            if item_id and item_id in self.items:
+                return self.items[item_id]
+        return None
+
+    def find_similar(self, photo_hash: int) -> Optional[Dict]:
+        """Restituisce la pubblicazione con una foto quasi uguale (impronta percettiva), se esiste"""
+        match = self.photo_hashes.find(photo_hash)
+        if match and match[0] in self.items:
+            return self.items[match[0]]
+        return None
+
+    def add(
+        self,
+        url: str,
+        fingerprints: List[str],
+        product_name: str,
+        photo_hashes: Iterable[int] = ()
+    ) -> str:
+        """
+        Registra una pubblicazione e salva l'indice su disco
+
+        Returns:
+            ID articolo canonico registrato
+        """
+        item_id = canonical_item_id(url)
+        self.items[item_id] = {
+            'item_id': item_id,
+            'product_name': product_name,
+            'url': url,
+            'published_at': int(time.time())
+        }
+        for fingerprint in fingerprints:
+            self.media[fingerprint] = item_id
+        try:
+            save_json(self.path, {'items': self.items, 'media': self.media})
+            if self.photo_hashes.add(photo_hashes, item_id):
+                self.photo_hashes.save()
+        except OSError as e:
+            logger.error("Impossibile salvare l'indice dei prodotti pubblicati: %s", e)
+        return item_id
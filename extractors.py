@@ -0,0 +1,315 @@
+"""
+Registro degli estrattori per sito
+Ogni sito (negozio o agente) registra il suo estrattore con i suoi host e la
+strategia più economica che funziona per lui:
+    json     una GET e il JSON incorporato nella pagina (es. Weidian)
+    http     una GET e i meta tag / JSON-LD della pagina
+    browser  Chrome, per le pagine che caricano il prezzo via JavaScript
+Il dispatch è un lookup per host; i link degli agenti che racchiudono il link
+del negozio vengono prima risolti sul negozio. Gli host sconosciuti provano
+solo la lettura dei meta tag, senza avviare il browser.
+"""
+
+import json
+import logging
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from bs4 import BeautifulSoup
+
+from config import SCRAPING_TIMEOUT, USER_AGENT
+from duplicates import canonical_item_id
+
+logger = logging.getLogger(__name__)
+
+STRATEGY_JSON = 'json'
+STRATEGY_HTTP = 'http'
+STRATEGY_BROWSER = 'browser'
+
+# Host locali: il primo segmento del path indica il sito (pagine registrate dei benchmark)
+LOOPBACK_HOSTS = {'127.0.0.1', 'localhost', '::1'}
+
+# Prefissi di host che non cambiano il sito (versioni mobile)
+HOST_PREFIXES = ('www.', 'm.', 'h5.')
+
+# Simbolo per le valute più comuni nei prezzi estratti dai meta tag
+CURRENCY_SYMBOLS = {'CNY': '¥', 'RMB': '¥', 'USD': '$', 'EUR': '€', 'GBP': '£'}
+
+# Link diretto al negozio per gli ID articolo canonici (vedi duplicates.canonical_item_id)
+STORE_URLS = {
+    'weidian': 'https://weidian.com/item.html?itemID={}',
+    'taobao': 'https://item.taobao.com/item.htm?id={}',
+    '1688': 'https://detail.1688.com/offer/{}.html',
+}
+
+# Funzione che esegue lo scraping con il browser: (sito dei selettori, url) -> risultato
+BrowserScrape = Callable[[str, str], Dict[str, Optional[str]]]
+
+
+class Extractor:
+    """
+    Estrattore di un sito
+
+    Args:
+        name: Nome del sito (anche alias nei path locali dei benchmark)
+        hosts: Domini gestiti (i sottodomini sono inclusi)
+        strategy: Strategia più economica (json, http o browser)
+        parse: HTML -> {'price', 'product_name'} per le strategie json/http
+        browser_site: Selettori da usare nel browser ('oopbuy' o 'weidian'); None = mai il browser
+        agent: True se i link possono racchiudere il link del negozio
+    """
+
+    def __init__(
+        self,
+        name: str,
+        hosts: Tuple[str, ...],
+        strategy: str,
+        parse: Optional[Callable[[str], Optional[Dict[str, str]]]] = None,
+        browser_site: Optional[str] = None,
+        agent: bool = False
+    ):
+        self.name = name
+        self.hosts = hosts
+        self.strategy = strategy
+        self.parse = parse
+        self.browser_site = browser_site
+        self.agent = agent
+
+
+# ---------- Parser ----------
+
+def _format_price(amount, currency: Optional[str]) -> Optional[str]:
+    if amount in (None, ''):
+        return None
+    amount = str(amount).strip()
+    if not any(c.isdigit() for c in amount):
+        return None
+    currency = (currency or '').upper()
+    symbol = CURRENCY_SYMBOLS.get(currency)
+    if symbol:
+        return f"{symbol}{amount}"
+    return f"{amount} {currency}".strip()
+
+
+def _json_ld_products(soup: BeautifulSoup) -> List[Dict]:
+    products = []
+    for script in soup.find_all('script', type='application/ld+json'):
+        try:
+            data = json.loads(script.string or '')
+        except ValueError:
+            continue
+        if isinstance(data, dict):
+            data = data.get('@graph', [data])
+        for node in data if isinstance(data, list) else []:
+            if isinstance(node, dict) and node.get('@type') == 'Product':
+                products.append(node)
+    return products
+
+
+def parse_meta(html: str) -> Optional[Dict[str, str]]:
+    """
+    Nome e prezzo dai metadati standard della pagina (Open Graph, JSON-LD, microdata)
+
+    Returns:
+        {'price', 'product_name'} o None se il prezzo non è presente
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+
+    def meta(*keys: str) -> Optional[str]:
+        for key in keys:
+            tag = soup.find('meta', attrs={'property': key}) or soup.find('meta', attrs={'name': key})
+            if tag and tag.get('content'):
+                return tag['content'].strip()
+        return None
+
+    price = _format_price(
+        meta('product:price:amount', 'og:price:amount'),
+        meta('product:price:currency', 'og:price:currency')
+    )
+    name = meta('og:title', 'twitter:title')
+
+    for product in _json_ld_products(soup):
+        name = name or product.get('name')
+        offers = product.get('offers') or {}
+        if isinstance(offers, list):
+            offers = offers[0] if offers else {}
+        price = price or _format_price(offers.get('price') or offers.get('lowPrice'), offers.get('priceCurrency'))
+
+    if not price:
+        tag = soup.find(attrs={'itemprop': 'price'})
+        if tag is not None:
+            currency = soup.find(attrs={'itemprop': 'priceCurrency'})
+            price = _format_price(
+                tag.get('content') or tag.get_text(strip=True),
+                currency.get('content') if currency is not None else None
+            )
+
+    if not price:
+        return None
+    if not name:
+        heading = soup.find('h1')
+        if heading is not None:
+            name = heading.get_text(strip=True)
+        elif soup.title is not None and soup.title.string:
+            name = soup.title.string.strip()
+    return {'price': price, 'product_name': name or 'Prodotto'}
+
+
+_ROCKER_DATA = re.compile(r'window\.__rocker_data__\s*=\s*(\{.*?\})\s*;?\s*</script>', re.S)
+
+
+def parse_weidian(html: str) -> Optional[Dict[str, str]]:
+    """Weidian: dati dell'articolo nel JSON incorporato window.__rocker_data__"""
+    match = _ROCKER_DATA.search(html)
+    if match:
+        try:
+            info = json.loads(match.group(1))['result']['default_model']['item_info']
+            price = _format_price(info.get('price'), 'CNY')
+            if price:
+                return {'price': price, 'product_name': (info.get('itemName') or '').strip() or 'Prodotto'}
+        except (ValueError, KeyError, TypeError) as e:
+            logger.debug("JSON Weidian non riconosciuto: %s", e)
+    return parse_meta(html)
+
+
+# ---------- Registro ----------
+
+_BY_HOST: Dict[str, Extractor] = {}
+_BY_NAME: Dict[str, Extractor] = {}
+
+# Host senza estrattore dedicato: solo metadati, niente browser
+GENERIC = Extractor('generic', (), STRATEGY_HTTP, parse=parse_meta)
+
+
+def register(extractor: Extractor) -> Extractor:
+    """Registra un estrattore per tutti i suoi host (l'ultimo registrato vince)"""
+    _BY_NAME[extractor.name] = extractor
+    for host in extractor.hosts:
+        _BY_HOST[host] = extractor
+    return extractor
+
+
+register(Extractor('weidian', ('weidian.com', 'koudai.com'), STRATEGY_JSON, parse=parse_weidian, browser_site='weidian'))
+register(Extractor('taobao', ('taobao.com', 'tmall.com'), STRATEGY_HTTP, parse=parse_meta, browser_site='oopbuy'))
+register(Extractor('1688', ('1688.com',), STRATEGY_HTTP, parse=parse_meta, browser_site='oopbuy'))
+register(Extractor('oopbuy', ('oopbuy.com',), STRATEGY_BROWSER, browser_site='oopbuy', agent=True))
+register(Extractor(
+    'agent',
+    (
+        'cssbuy.com', 'hoobuy.com', 'kakobuy.com', 'mulebuy.com', 'allchinabuy.com',
+        'superbuy.com', 'sugargoo.com', 'cnfans.com', 'acbuy.com', 'litbuy.com',
+        'orientdig.com', 'joyabuy.com', 'lovegobuy.com'
+    ),
+    STRATEGY_BROWSER,
+    browser_site='oopbuy',
+    agent=True
+))
+
+
+def _lookup(url: str) -> Tuple[str, Extractor]:
+    """Dominio del sito e suo estrattore (vedi extractor_for e site_domain)"""
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or '').lower()
+    if host in LOOPBACK_HOSTS:
+        segment = parts.path.strip('/').split('/', 1)[0].lower()
+        return f"{host}/{segment}", _BY_NAME.get(segment, GENERIC)
+
+    for prefix in HOST_PREFIXES:
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    labels = host.split('.')
+    for start in range(len(labels) - 1):
+        domain = '.'.join(labels[start:])
+        extractor = _BY_HOST.get(domain)
+        if extractor is not None:
+            return domain, extractor
+    return host, GENERIC
+
+
+def extractor_for(url: str) -> Extractor:
+    """
+    Estrattore del link: lookup dell'host e dei suoi domini padre
+    (item.taobao.com -> taobao.com), GENERIC se il sito non è registrato
+    """
+    return _lookup(url)[1]
+
+
+def site_domain(url: str) -> str:
+    """
+    Dominio del sito del link: il dominio registrato (item.taobao.com -> taobao.com)
+    o l'host senza prefissi mobile per i siti sconosciuti
+    """
+    return _lookup(url)[0]
+
+
+def unwrap_agent_link(url: str) -> Optional[str]:
+    """Link diretto al negozio racchiuso in un link di un agente, se riconoscibile"""
+    platform, _, item_id = canonical_item_id(url).partition(':')
+    template = STORE_URLS.get(platform)
+    return template.format(item_id) if template and item_id else None
+
+
+def _fetch(url: str) -> str:
+    response = requests.get(url, timeout=SCRAPING_TIMEOUT, headers={'User-Agent': USER_AGENT})
+    response.raise_for_status()
+    if 'charset' not in response.headers.get('Content-Type', '').lower():
+        response.encoding = 'utf-8'
+    return response.text
+
+
+def _result(**fields) -> Dict[str, Optional[str]]:
+    result = {'price': None, 'product_name': None, 'images': [], 'success': False, 'error': None}
+    result.update(fields)
+    return result
+
+
+def extract(url: str, browser_scrape: Optional[BrowserScrape]) -> Dict[str, Optional[str]]:
+    """
+    Scraping del link con la strategia più economica disponibile
+
+    Ordine dei tentativi: JSON/HTTP del negozio racchiuso nel link dell'agente,
+    JSON/HTTP del link stesso, infine il browser (se il sito lo prevede).
+
+    Args:
+        url: Link del prodotto
+        browser_scrape: Scraping con il browser (None = solo strategie senza browser)
+
+    Returns:
+        Dizionario nello stesso formato di ProductScraper.scrape_product, con 'strategy'
+    """
+    extractor = extractor_for(url)
+    candidates = [(extractor, url)]
+    if extractor.agent and urlsplit(url).hostname not in LOOPBACK_HOSTS:
+        inner = unwrap_agent_link(url)
+        if inner:
+            candidates.insert(0, (extractor_for(inner), inner))
+
+    error = None
+    for candidate, target in candidates:
+        if candidate.parse is None:
+            continue
+        try:
+            data = candidate.parse(_fetch(target))
+        except requests.RequestException as e:
+            error = f"Pagina non raggiungibile: {e}"
+            logger.info("Estrattore %s (%s) fallito: %s", candidate.name, candidate.strategy, e)
+            continue
+        if data:
+            logger.info("Scraping %s completato senza browser (%s)", candidate.name, candidate.strategy)
+            return _result(success=True, strategy=candidate.strategy, **data)
+        error = "Prezzo non trovato sulla pagina"
+
+    # Il browser parte dal link originale, come farebbe l'operatore
+    if browser_scrape is not None:
+        for candidate, target in sorted(candidates, key=lambda c: c[1] != url):
+            if candidate.browser_site:
+                result = browser_scrape(candidate.browser_site, target)
+                result['strategy'] = STRATEGY_BROWSER
+                return result
+
+    if error is None:
+        error = "Il sito richiede il browser" if extractor.browser_site else "Sito non supportato"
+    logger.warning("Scraping di %s non riuscito: %s", url[:50], error)
+    return _result(error=error, strategy=extractor.strategy)
@@ -0,0 +1,167 @@
+"""
+Stato per canale delle pubblicazioni (fan-out), salvato su disco
+Ogni pubblicazione confermata ha una chiave di idempotenza e un file in
+data/fanouts/ con lo stato di ogni canale:
+    pending  non ancora inviato
+    sending  album in invio (se il processo si ferma qui l'esito è sconosciuto)
+    sent     album inviato, bottoni ancora da aggiungere
+    done     completato: non viene mai ripubblicato
+    failed   errore: si riprova con /retry
+Un nuovo tentativo riguarda solo i canali non completati e, se l'album è già
+stato inviato, solo i bottoni. Le pubblicazioni interrotte da un arresto del
+bot riprendono all'avvio; il file viene eliminato quando tutti i canali sono completati.
+"""
+
+import logging
+import os
+import re
+import secrets
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from config import FANOUT_DIR
+from storage import load_json, save_json
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDING = 'pending'
+STATUS_SENDING = 'sending'
+STATUS_SENT = 'sent'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+# Stati di un canale lasciato a metà da un arresto del processo
+INTERRUPTED_STATUSES = (STATUS_PENDING, STATUS_SENDING, STATUS_SENT)
+
+# Formato degli ID generati da FanoutStore.create (secrets.token_hex(4))
+_FANOUT_ID_RE = re.compile(r'[0-9a-f]{8}')
+
+
+class Fanout:
+    """
+    Una pubblicazione su tutti i canali, con lo stato di ognuno
+
+    Formato del file:
+        {'fanout_id', 'draft', 'notify_chat_id', 'queued', 'post_id', 'created_at',
+         'channels': {lingua: {'status', 'message_ids', 'error', 'attempts'}}}
+    """
+
+    def __init__(self, path: str, data: Dict[str, Any]):
+        self.path = path
+        self.data = data
+
+    @property
+    def fanout_id(self) -> str:
+        return self.data['fanout_id']
+
+    @property
+    def draft(self) -> Dict[str, Any]:
+        return self.data['draft']
+
+    @property
+    def channels(self) -> Dict[str, Dict[str, Any]]:
+        return self.data['channels']
+
+    @property
+    def post_id(self) -> Optional[str]:
+        return self.data.get('post_id')
+
+    def languages_to_send(self) -> List[str]:
+        """Canali non ancora completati"""
+        return [lang for lang, state in self.channels.items() if state['status'] != STATUS_DONE]
+
+    def failed_languages(self) -> List[str]:
+        return [lang for lang, state in self.channels.items() if state['status'] == STATUS_FAILED]
+
+    def interrupted(self) -> bool:
+        """True se almeno un canale è rimasto a metà (processo fermato durante l'invio)"""
+        return any(state['status'] in INTERRUPTED_STATUSES for state in self.channels.values())
+
+    def complete(self) -> bool:
+        return not self.languages_to_send()
+
+    def update(self, language: str, **fields) -> None:
+        """Aggiorna lo stato di un canale e lo salva subito"""
+        self.channels[language].update(fields)
+        self.save()
+
+    def set(self, **fields) -> None:
+        self.data.update(fields)
+        self.save()
+
+    def save(self) -> None:
+        save_json(self.path, self.data)
+
+
+class FanoutStore:
+    """Pubblicazioni non ancora completate, un file per chiave di idempotenza"""
+
+    def __init__(self, root: str = FANOUT_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, fanout_id: str) -> str:
+        return os.path.join(self.root, f"{fanout_id}.json")
+
+    def create(
+        self,
+        draft: Dict[str, Any],
+        languages: Iterable[str],
+        notify_chat_id: int,
+        queued: bool = False
+    ) -> Fanout:
+        """
+        Registra una nuova pubblicazione prima del primo invio
+
+        Args:
+            draft: Bozza (o digest) da pubblicare
+            languages: Canali di destinazione
+            notify_chat_id: Chat a cui inviare l'esito
+            queued: True se la pubblicano i worker (la ripresa spetta alla coda)
+        """
+        while True:
+            fanout_id = secrets.token_hex(4)
+            if not os.path.exists(self._path(fanout_id)):
+                break
+        fanout = Fanout(self._path(fanout_id), {
+            'fanout_id': fanout_id,
+            'draft': {**draft, 'fanout_id': fanout_id},
+            'notify_chat_id': notify_chat_id,
+            'queued': queued,
+            'post_id': None,
+            'created_at': time.time(),
+            'channels': {
+                lang: {'status': STATUS_PENDING, 'message_ids': [], 'error': None, 'attempts': 0}
+                for lang in languages
+            }
+        })
+        fanout.save()
+        return fanout
+
+    def load(self, fanout_id: Optional[str]) -> Optional[Fanout]:
+        """Pubblicazione con l'ID dato (None se l'ID non è nel formato generato da create)"""
+        if not fanout_id:
+            return None
+        fanout_id = fanout_id.strip().lower()
+        # Solo ID esadecimali: l'argomento di /retry non diventa mai un percorso arbitrario
+        if not _FANOUT_ID_RE.fullmatch(fanout_id):
+            return None
+        path = self._path(fanout_id)
+        data = load_json(path, None)
+        return Fanout(path, data) if data else None
+
+    def all(self) -> List[Fanout]:
+        """Pubblicazioni non completate, dalla più vecchia"""
+        fanouts = []
+        for name in sorted(os.listdir(self.root)):
+            if name.endswith('.json') and not name.startswith('.'):
+                fanout = self.load(name[:-len('.json')])
+                if fanout is not None:
+                    fanouts.append(fanout)
+        return sorted(fanouts, key=lambda f: f.data.get('created_at', 0))
+
+    def remove(self, fanout: Fanout) -> None:
+        try:
+            os.remove(fanout.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,206 @@
+"""
+Pool di connessioni HTTP verso la Bot API
+Tre pool separati, ognuno con i suoi timeout:
+    updates  getUpdates (una sola richiesta alla volta, in long polling)
+    api      chiamate normali (messaggi, bottoni, modifiche)
+    media    upload di foto (multipart) e download dei file
+Così un album in caricamento non occupa le connessioni delle chiamate brevi e
+un upload lento non scade con i timeout pensati per un sendMessage.
+Ogni pool misura quanto le richieste aspettano una connessione libera
+(metriche http_<pool>_* in /stats): se l'attesa cresce, il collo di bottiglia è il pool.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Optional, Tuple
+
+import httpx
+from telegram.error import TimedOut
+from telegram.request import BaseRequest, HTTPXRequest, RequestData
+
+from config import (
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_KEEPALIVE_SECONDS,
+    HTTP_MEDIA_POOL_SIZE,
+    HTTP_MEDIA_TIMEOUT,
+    HTTP_POOL_SIZE,
+    HTTP_POOL_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+    HTTP_WRITE_TIMEOUT
+)
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Attese sotto questa soglia (ms) non contano come richieste rimaste in coda
+WAIT_THRESHOLD_MS = 1.0
+
+
+class MeteredRequest(HTTPXRequest):
+    """
+    HTTPXRequest con keep-alive configurabile e misura dell'attesa nel pool
+
+    Le richieste prendono uno dei connection_pool_size posti prima di arrivare a
+    httpx: il tempo speso ad aspettarlo è l'attesa nel pool. Scaduto
+    pool_timeout la richiesta non parte (TimedOut, come HTTPXRequest).
+
+    Args:
+        name: Nome del pool nelle metriche (updates, api, media)
+        connection_pool_size: Connessioni contemporanee
+        keepalive_expiry: Secondi per cui una connessione inattiva resta aperta
+        **kwargs: Timeout di HTTPXRequest (read, write, connect, pool)
+    """
+
+    def __init__(self, name: str, connection_pool_size: int, keepalive_expiry: float, **kwargs):
+        self.name = name
+        self.keepalive_expiry = keepalive_expiry
+        self._slots = asyncio.Semaphore(connection_pool_size)
+        self._requests = 0
+        self._wait_total_ms = 0.0
+        self._wait_max_ms = 0.0
+        super().__init__(connection_pool_size=connection_pool_size, **kwargs)
+
+    def _build_client(self) -> httpx.AsyncClient:
+        limits: httpx.Limits = self._client_kwargs['limits']
+        self._client_kwargs['limits'] = httpx.Limits(
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry
+        )
+        return super()._build_client()
+
+    def _record_wait(self, wait_ms: float) -> None:
+        self._requests += 1
+        self._wait_total_ms += wait_ms
+        self._wait_max_ms = max(self._wait_max_ms, wait_ms)
+        prefix = f'http_{self.name}'
+        metrics.increment(f'{prefix}_requests')
+        if wait_ms >= WAIT_THRESHOLD_MS:
+            metrics.increment(f'{prefix}_pool_waited')
+        metrics.set(f'{prefix}_pool_wait_avg_ms', round(self._wait_total_ms / self._requests, 1))
+        metrics.set(f'{prefix}_pool_wait_max_ms', round(self._wait_max_ms, 1))
+
+    async def do_request(
+        self,
+        url: str,
+        method: str,
+        request_data: Optional[RequestData] = None,
+        read_timeout=BaseRequest.DEFAULT_NONE,
+        write_timeout=BaseRequest.DEFAULT_NONE,
+        connect_timeout=BaseRequest.DEFAULT_NONE,
+        pool_timeout=BaseRequest.DEFAULT_NONE,
+    ) -> Tuple[int, bytes]:
+        if pool_timeout is BaseRequest.DEFAULT_NONE:
+            pool_timeout = self._client.timeout.pool
+        # HTTPXRequest usa 20 s fissi per gli upload: vale il timeout di questo pool
+        if write_timeout is BaseRequest.DEFAULT_NONE:
+            write_timeout = self._client.timeout.write
+
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=pool_timeout)
+        except asyncio.TimeoutError as e:
+            metrics.increment(f'http_{self.name}_pool_timeouts')
+            raise TimedOut(
+                f"Pool timeout: nessuna connessione libera nel pool {self.name} entro {pool_timeout} s"
+            ) from e
+        self._record_wait((time.perf_counter() - started) * 1000)
+        try:
+            return await super().do_request(
+                url,
+                method,
+                request_data=request_data,
+                read_timeout=read_timeout,
+                write_timeout=write_timeout,
+                connect_timeout=connect_timeout,
+                pool_timeout=pool_timeout
+            )
+        finally:
+            self._slots.release()
+
+
+class SplitRequest(BaseRequest):
+    """
+    Smista le chiamate del bot tra il pool api e il pool media
+
+    Vanno nel pool media le richieste con file da caricare (multipart) e i
+    download (GET sull'URL dei file); tutte le altre nel pool api.
+    """
+
+    def __init__(self, api: BaseRequest, media: BaseRequest):
+        self.api = api
+        self.media = media
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return self.api.read_timeout
+
+    async def initialize(self) -> None:
+        await asyncio.gather(self.api.initialize(), self.media.initialize())
+
+    async def shutdown(self) -> None:
+        await asyncio.gather(self.api.shutdown(), self.media.shutdown())
+
+    async def do_request(
+        self,
+        url: str,
+        method: str,
+        request_data: Optional[RequestData] = None,
+        read_timeout=BaseRequest.DEFAULT_NONE,
+        write_timeout=BaseRequest.DEFAULT_NONE,
+        connect_timeout=BaseRequest.DEFAULT_NONE,
+        pool_timeout=BaseRequest.DEFAULT_NONE,
+    ) -> Tuple[int, bytes]:
+        is_media = method == 'GET' or (request_data is not None and request_data.contains_files)
+        target = self.media if is_media else self.api
+        return await target.do_request(
+            url,
+            method,
+            request_data=request_data,
+            read_timeout=read_timeout,
+            write_timeout=write_timeout,
+            connect_timeout=connect_timeout,
+            pool_timeout=pool_timeout
+        )
+
+
+def build_bot_request() -> SplitRequest:
+    """Pool api e media per le chiamate del bot (e dei worker di pubblicazione)"""
+    timeouts = {
+        'connect_timeout': HTTP_CONNECT_TIMEOUT,
+        'pool_timeout': HTTP_POOL_TIMEOUT,
+    }
+    api = MeteredRequest(
+        'api',
+        connection_pool_size=HTTP_POOL_SIZE,
+        keepalive_expiry=HTTP_KEEPALIVE_SECONDS,
+        read_timeout=HTTP_READ_TIMEOUT,
+        write_timeout=HTTP_WRITE_TIMEOUT,
+        **timeouts
+    )
+    media = MeteredRequest(
+        'media',
+        connection_pool_size=HTTP_MEDIA_POOL_SIZE,
+        keepalive_expiry=HTTP_KEEPALIVE_SECONDS,
+        read_timeout=HTTP_MEDIA_TIMEOUT,
+        write_timeout=HTTP_MEDIA_TIMEOUT,
+        **timeouts
+    )
+    return SplitRequest(api, media)
+
+
+def build_updates_request() -> MeteredRequest:
+    """
+    Pool per getUpdates: una sola connessione, sempre riusata. PTB aggiunge da
+    solo al timeout di lettura la durata del long polling.
+    """
+    return MeteredRequest(
+        'updates',
+        connection_pool_size=1,
+        keepalive_expiry=HTTP_KEEPALIVE_SECONDS,
+        read_timeout=HTTP_READ_TIMEOUT,
+        write_timeout=HTTP_WRITE_TIMEOUT,
+        connect_timeout=HTTP_CONNECT_TIMEOUT,
+        pool_timeout=HTTP_POOL_TIMEOUT
+    )
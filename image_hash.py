@@ -0,0 +1,162 @@
+"""
+Impronte percettive delle foto (dHash a 64 bit) e indice per distanza di Hamming
+Due foto uguali ma ricompresse, ridimensionate o ritagliate di poco hanno
+impronte che differiscono per pochi bit: basta confrontare gli interi, non le immagini.
+
+Senza Pillow dhash() restituisce None e restano attivi solo i controlli
+esatti (file_unique_id di Telegram); il bot lo segnala all'avvio.
+"""
+
+import io
+import logging
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from config import PHASH_MAX_DISTANCE, PHOTO_HASH_INDEX_FILE
+from storage import load_json, save_json
+
+try:
+    from PIL import Image
+except ImportError:  # pragma: no cover - dipende dall'ambiente
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# L'impronta è divisa in 8 bande da 8 bit: due impronte a distanza <= 7 hanno
+# per forza almeno una banda identica, quindi i candidati si trovano con un lookup
+BANDS = 8
+BAND_BITS = 64 // BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+MAX_SEARCH_DISTANCE = BANDS - 1
+
+try:
+    _popcount = int.bit_count  # Python 3.10+
+except AttributeError:  # pragma: no cover
+    def _popcount(value: int) -> int:
+        return bin(value).count('1')
+
+
+def available() -> bool:
+    """True se Pillow è installato e le impronte percettive sono attive"""
+    return Image is not None
+
+
+def dhash(source: Union[bytes, bytearray, str]) -> Optional[int]:
+    """
+    Calcola il difference hash a 64 bit di un'immagine
+
+    L'immagine viene ridotta a 9x8 in scala di grigi e ogni bit dice se un pixel
+    è più chiaro del suo vicino di destra. Lavora bene anche sulle miniature.
+
+    Args:
+        source: Contenuto dell'immagine o percorso di un file locale
+
+    Returns:
+        Impronta come intero senza segno, o None se Pillow manca o l'immagine è illeggibile
+    """
+    if Image is None:
+        return None
+    try:
+        handle = io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+        with Image.open(handle) as image:
+            small = image.convert('L').resize((9, 8), Image.BILINEAR)
+            pixels = list(small.getdata())
+    except Exception as e:
+        logger.warning("Impronta della foto non calcolabile: %s", e)
+        return None
+
+    value = 0
+    for row in range(8):
+        offset = row * 9
+        for col in range(8):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    """Numero di bit diversi tra due impronte"""
+    return _popcount(a ^ b)
+
+
+class PhotoHashIndex:
+    """
+    Indice persistente delle impronte delle foto pubblicate
+
+    Le impronte stanno in un array('Q') (8 byte per foto) con la lista parallela
+    degli ID articolo; per ogni banda un dizionario valore -> posizioni permette
+    di confrontare solo i candidati invece dell'intero archivio.
+    """
+
+    def __init__(self, path: str = PHOTO_HASH_INDEX_FILE, max_distance: int = PHASH_MAX_DISTANCE):
+        self.path = path
+        self.max_distance = min(max_distance, MAX_SEARCH_DISTANCE)
+        self.hashes = array('Q')
+        self.items: List[str] = []
+        self._bands: List[Dict[int, List[int]]] = [{} for _ in range(BANDS)]
+
+        data = load_json(path, {})
+        for value, item_id in zip(data.get('hashes', []), data.get('items', [])):
+            self._append(int(value, 16), item_id)
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def _append(self, value: int, item_id: str) -> None:
+        position = len(self.hashes)
+        self.hashes.append(value)
+        self.items.append(item_id)
+        for band in range(BANDS):
+            key = (value >> (band * BAND_BITS)) & BAND_MASK
+            self._bands[band].setdefault(key, []).append(position)
+
+    def _candidates(self, value: int) -> Iterable[int]:
+        seen = set()
+        for band in range(BANDS):
+            for position in self._bands[band].get((value >> (band * BAND_BITS)) & BAND_MASK, ()):
+                if position not in seen:
+                    seen.add(position)
+                    yield position
+
+    def find(self, value: int) -> Optional[Tuple[str, int]]:
+        """
+        Cerca la foto pubblicata più simile entro max_distance
+
+        Returns:
+            (ID articolo, distanza) oppure None
+        """
+        if self.max_distance < 0:
+            return None
+        best = None
+        for position in self._candidates(value):
+            distance = hamming(value, self.hashes[position])
+            if distance <= self.max_distance and (best is None or distance < best[1]):
+                best = (self.items[position], distance)
+                if distance == 0:
+                    break
+        return best
+
+    def add(self, values: Iterable[int], item_id: str) -> int:
+        """
+        Registra le impronte di una pubblicazione (senza salvare su disco)
+
+        Le foto già presenti per lo stesso articolo non vengono duplicate.
+
+        Returns:
+            Numero di impronte aggiunte
+        """
+        added = 0
+        for value in values:
+            if any(
+                self.items[p] == item_id and self.hashes[p] == value
+                for p in self._candidates(value)
+            ):
+                continue
+            self._append(value, item_id)
+            added += 1
+        return added
+
+    def save(self) -> None:
+        save_json(self.path, {
+            'hashes': [format(value, '016x') for value in self.hashes],
+            'items': self.items
+        })
@@ -0,0 +1,140 @@
+"""
+Configurazione del logging
+I record passano da una coda in memoria e vengono formattati e scritti da un
+thread dedicato: l'event loop del bot non si blocca mai sull'I/O dei log
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+from typing import Dict, Optional, Tuple
+
+from config import LOG_LEVEL, LOG_FORMAT, LOG_JSON
+
+# Attributi standard di LogRecord: tutto il resto (passato con extra=) finisce nel JSON
+_RESERVED_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+# Argomenti che il thread del listener può formattare più tardi: non cambiano dopo la chiamata
+_IMMUTABLE_ARGS = (str, int, float, bytes, type(None))
+
+
+class JsonFormatter(logging.Formatter):
+    """Un oggetto JSON per riga con i campi del record e gli eventuali extra"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith('_'):
+                payload[key] = value
+        if record.exc_info:
+            payload['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload['exc'] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+def _immutable(value) -> bool:
+    if isinstance(value, tuple):
+        return all(_immutable(item) for item in value)
+    return isinstance(value, _IMMUTABLE_ARGS)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler che formatta nel thread chiamante solo quando serve
+
+    Il QueueHandler standard unisce msg e args prima di mettere il record in coda;
+    qui la coda è in memoria nello stesso processo, quindi un record con argomenti
+    immutabili (stringhe, numeri) può essere accodato così com'è e formattato dal
+    thread del listener. Con argomenti mutabili (dizionari, liste, oggetti) il
+    messaggio viene unito subito, come nello standard: il log mostra lo stato al
+    momento della chiamata, non quello che avranno più tardi.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.args and not _immutable(record.args):
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            # Il traceback viene scritto ora: il record in coda non tiene vivi i frame
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def parse_levels(spec: str) -> Tuple[int, Dict[str, int]]:
+    """
+    Interpreta LOG_LEVEL, es. 'INFO' oppure 'INFO,scraper=DEBUG,httpx=WARNING'
+
+    Returns:
+        (livello di default, {nome logger: livello})
+    """
+    default = logging.INFO
+    per_module: Dict[str, int] = {}
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, level = part.rpartition('=')
+        value = logging.getLevelName(level.strip().upper())
+        if not isinstance(value, int):
+            raise ValueError(f"Livello di log non valido in LOG_LEVEL: {part}")
+        if name:
+            per_module[name.strip()] = value
+        else:
+            default = value
+    return default, per_module
+
+
+def setup_logging(level_spec: str = LOG_LEVEL, use_json: bool = LOG_JSON) -> None:
+    """
+    Configura il logging del processo: coda + listener in background
+
+    Args:
+        level_spec: Livello globale e livelli per modulo (vedi parse_levels)
+        use_json: Se True scrive record JSON strutturati, altrimenti testo (LOG_FORMAT)
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    default_level, per_module = parse_levels(level_spec)
+
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(JsonFormatter() if use_json else logging.Formatter(LOG_FORMAT))
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(DeferredQueueHandler(log_queue))
+    root.setLevel(default_level)
+
+    # Le librerie di rete e lo scheduler loggano ogni richiesta/job a INFO: di default solo gli avvisi
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+    logging.getLogger('apscheduler').setLevel(logging.WARNING)
+    for name, level in per_module.items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Svuota la coda e ferma il listener (chiamato automaticamente all'uscita)"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
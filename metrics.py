@@ -0,0 +1,37 @@
+"""
+Contatori del bot in memoria (bozze scadute, file eliminati, ...)
+Mostrati all'admin con /stats; si azzerano a ogni riavvio.
+"""
+
+import time
+from collections import Counter
+from typing import Dict, Union
+
+Number = Union[int, float]
+
+
+class Metrics:
+    """Contatori cumulativi e valori istantanei del processo"""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.counters: Counter = Counter()
+        self.gauges: Dict[str, Number] = {}
+
+    def increment(self, name: str, value: int = 1) -> None:
+        self.counters[name] += value
+
+    def set(self, name: str, value: Number) -> None:
+        self.gauges[name] = value
+
+    def snapshot(self) -> Dict[str, Number]:
+        """Tutti i valori correnti, compreso il tempo di attività in secondi"""
+        return {
+            'uptime_seconds': int(time.time() - self.started_at),
+            **self.gauges,
+            **self.counters
+        }
+
+
+# Istanza condivisa da tutti i moduli del processo del bot
+metrics = Metrics()
@@ -0,0 +1,139 @@
+"""
+Modifica ed eliminazione in blocco dei post già pubblicati
+Le operazioni partono in parallelo su tutti i canali del post; il RateLimiter
+distanzia le chiamate sullo stesso canale e gestisce i 429 di Telegram
+"""
+
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.constants import ParseMode
+from telegram.error import BadRequest, TelegramError
+
+from rate_limit import RateLimiter
+from templates import build_captions, get_buy_button_label, truncate_text
+
+logger = logging.getLogger(__name__)
+
+
+def buy_button_markup(referral_link: str, language: str) -> Optional[InlineKeyboardMarkup]:
+    """Tastiera con il bottone di acquisto (None se manca il link)"""
+    if not referral_link:
+        return None
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(get_buy_button_label(language), url=referral_link)]
+    ])
+
+
+# Lunghezza massima del nome del prodotto nei bottoni del digest
+DIGEST_BUTTON_NAME_LENGTH = 32
+
+
+def post_markup(post: Dict, language: str) -> Optional[InlineKeyboardMarkup]:
+    """
+    Tastiera del post: il bottone di acquisto, o nel digest un bottone per
+    prodotto numerato come nella caption
+    """
+    if not post.get('products'):
+        return buy_button_markup(post['referral_link'], language)
+    label = get_buy_button_label(language)
+    rows = [
+        [InlineKeyboardButton(
+            f"{label} · {number}. {truncate_text(product['product_name'].strip(), DIGEST_BUTTON_NAME_LENGTH)}",
+            url=product['referral_link']
+        )]
+        for number, product in enumerate(post['products'], 1)
+        if product.get('referral_link')
+    ]
+    return InlineKeyboardMarkup(rows) if rows else None
+
+
+async def _edit_channel(bot: Bot, limiter: RateLimiter, record: Dict, lang: str, caption: str) -> Optional[str]:
+    """Riscrive caption e bottone del primo messaggio dell'album; restituisce l'errore o None"""
+    target = record['channels'][lang]
+    try:
+        await limiter.call(target['chat_id'], lambda: bot.edit_message_caption(
+            chat_id=target['chat_id'],
+            message_id=target['message_ids'][0],
+            caption=caption,
+            parse_mode=ParseMode.MARKDOWN,
+            reply_markup=post_markup(record, lang)
+        ))
+    except BadRequest as e:
+        # Caption e bottone già aggiornati: non è un errore
+        if 'not modified' in str(e).lower():
+            return None
+        return str(e)
+    except TelegramError as e:
+        return str(e)
+    return None
+
+
+async def _delete_channel(bot: Bot, limiter: RateLimiter, target: Dict) -> Optional[str]:
+    """Elimina tutti i messaggi dell'album su un canale; restituisce l'errore o None"""
+    errors = []
+    for message_id in target['message_ids']:
+        try:
+            await limiter.call(target['chat_id'], lambda: bot.delete_message(
+                chat_id=target['chat_id'],
+                message_id=message_id
+            ))
+        except TelegramError as e:
+            # Messaggio già eliminato a mano: il risultato è comunque quello voluto
+            if 'not found' in str(e).lower():
+                continue
+            errors.append(f"{message_id}: {e}")
+    return "; ".join(errors) or None
+
+
+async def edit_post(
+    bot: Bot,
+    limiter: RateLimiter,
+    record: Dict,
+    languages: Optional[List[str]] = None
+) -> Dict[str, Optional[str]]:
+    """
+    Aggiorna caption e bottone del post su tutti i canali in parallelo
+
+    Args:
+        bot: Bot Telegram
+        limiter: Limitatore condiviso delle chiamate
+        record: Record del post (vedi PublishedStore) con i dati già aggiornati
+        languages: Canali da aggiornare (default: tutti quelli del post)
+
+    Returns:
+        Dizionario lingua -> errore (None se il canale è stato aggiornato)
+    """
+    languages = list(languages if languages is not None else record['channels'])
+    captions, problems = build_captions(record, languages)
+    if problems:
+        return {lang: "Caption non valida: " + "; ".join(problems.get(lang, ["errore in un'altra lingua"])) for lang in languages}
+
+    results = await asyncio.gather(*(
+        _edit_channel(bot, limiter, record, lang, captions[lang])
+        for lang in languages
+    ))
+    for lang, error in zip(languages, results):
+        if error:
+            logger.error("Modifica del post %s su %s fallita: %s", record['post_id'], lang, error)
+    return dict(zip(languages, results))
+
+
+async def delete_post(bot: Bot, limiter: RateLimiter, record: Dict) -> Dict[str, Optional[str]]:
+    """
+    Elimina il post (tutte le foto dell'album) da tutti i canali in parallelo
+
+    Returns:
+        Dizionario lingua -> errore (None se il post è stato eliminato dal canale)
+    """
+    languages: List[str] = list(record['channels'])
+    results = await asyncio.gather(*(
+        _delete_channel(bot, limiter, record['channels'][lang])
+        for lang in languages
+    ))
+    for lang, error in zip(languages, results):
+        if error:
+            logger.error("Eliminazione del post %s su %s fallita: %s", record['post_id'], lang, error)
+    return dict(zip(languages, results))
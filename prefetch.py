@@ -0,0 +1,114 @@
+"""
+Scraping anticipato del link della bozza
+Lo scraping parte appena arriva il link, mentre l'operatore scrive nome e
+prezzo: quando finisce, nome, prezzo e categoria trovati diventano
+suggerimenti da toccare. Se la bozza viene annullata o scade, lo scraping
+viene annullato con lei (vedi drafts.discard_draft).
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, MutableMapping, Optional
+
+from classifier import guess_category
+from metrics import metrics
+from pricing import parse_price
+
+logger = logging.getLogger(__name__)
+
+# Chiave di user_data con il task di scraping in corso
+TASK_KEY = 'prefetch_task'
+
+# Chiave di user_data con i suggerimenti trovati: {'product_name', 'price', 'category'}
+RESULT_KEY = 'prefetch'
+
+Scrape = Callable[[str], Awaitable[Dict[str, Optional[str]]]]
+OnReady = Callable[[Dict[str, Optional[str]]], Awaitable[None]]
+
+
+def suggestions_from(result: Dict[str, Optional[str]]) -> Dict[str, Optional[str]]:
+    """Suggerimenti da un risultato di scraping (il prezzo solo se interpretabile)"""
+    name = (result.get('product_name') or '').strip()
+    price = (result.get('price') or '').strip()
+    return {
+        'product_name': name or None,
+        'price': price if price and parse_price(price) is not None else None,
+        'category': guess_category(name)
+    }
+
+
+def start(
+    user_data: MutableMapping[str, Any],
+    url: str,
+    scrape: Scrape,
+    on_ready: Optional[OnReady] = None
+) -> asyncio.Task:
+    """
+    Avvia lo scraping del link in background (uno per bozza)
+
+    Args:
+        user_data: Dati della conversazione dell'operatore
+        url: Link del prodotto
+        scrape: Scraping asincrono che si può annullare (es. ScraperWorker.scrape)
+        on_ready: Chiamata con i suggerimenti quando lo scraping riesce
+
+    Returns:
+        Task dello scraping, salvato anche in user_data
+    """
+    cancel(user_data)
+
+    async def run() -> None:
+        try:
+            result = await scrape(url)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            metrics.increment('prefetch_failed')
+            logger.warning("Scraping anticipato di %s fallito: %s", url[:50], e)
+            return
+        if not result.get('success'):
+            metrics.increment('prefetch_failed')
+            logger.info("Scraping anticipato senza risultati: %s", result.get('error'))
+            return
+
+        found = suggestions_from(result)
+        user_data[RESULT_KEY] = found
+        metrics.increment('prefetch_ready')
+        logger.info("Scraping anticipato completato: %s", found)
+        if on_ready is not None:
+            try:
+                await on_ready(found)
+            except Exception as e:
+                logger.warning("Suggerimenti non inviati: %s", e)
+
+    task = asyncio.create_task(run(), name='prefetch')
+    user_data[TASK_KEY] = task
+    metrics.increment('prefetch_started')
+
+    def forget(done: asyncio.Task) -> None:
+        # Solo se nel frattempo non è partito lo scraping di un'altra bozza
+        if user_data.get(TASK_KEY) is done:
+            user_data.pop(TASK_KEY, None)
+
+    task.add_done_callback(forget)
+    return task
+
+
+def cancel(user_data: MutableMapping[str, Any]) -> bool:
+    """
+    Annulla lo scraping della bozza, se ancora in corso
+
+    Returns:
+        True se uno scraping è stato annullato
+    """
+    task = user_data.pop(TASK_KEY, None)
+    if task is None or task.done():
+        return False
+    task.cancel()
+    metrics.increment('prefetch_cancelled')
+    return True
+
+
+def suggestion(user_data: MutableMapping[str, Any], field: str) -> Optional[str]:
+    """Valore suggerito per il campo ('product_name', 'price' o 'category'), se disponibile"""
+    return (user_data.get(RESULT_KEY) or {}).get(field)
@@ -0,0 +1,118 @@
+"""
+Controllo dei canali all'avvio (pre-flight)
+Prima del polling il bot verifica in parallelo tutti i canali di CHANNELS:
+il canale esiste, il bot ne è amministratore e può pubblicare. Gli @username
+vengono risolti negli ID numerici, salvati in data/channel_ids.json e usati
+al posto dello username da tutti gli invii (anche dai worker di pubblicazione).
+Il controllo dura al massimo PREFLIGHT_TIMEOUT secondi: se Telegram non
+risponde in tempo il bot parte comunque, con gli ID salvati in precedenza.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from telegram import Bot, ChatMember
+from telegram.constants import ChatType
+from telegram.error import TelegramError
+
+from config import CHANNEL_IDS_FILE, CHANNELS, PREFLIGHT_TIMEOUT
+from storage import load_json, save_json
+
+logger = logging.getLogger(__name__)
+
+# Chiave di CHANNELS[lingua] con il valore configurato (username o ID) prima della risoluzione
+CONFIGURED_KEY = 'configured_chat_id'
+
+
+def _configured(info: Dict[str, Any]) -> str:
+    return str(info.setdefault(CONFIGURED_KEY, info['chat_id']))
+
+
+def apply_cached_ids(channels: Dict[str, Dict[str, Any]] = CHANNELS, path: str = CHANNEL_IDS_FILE) -> int:
+    """
+    Sostituisce gli username configurati con gli ID numerici già risolti
+
+    Returns:
+        Numero di canali aggiornati
+    """
+    cache = load_json(path, {})
+    applied = 0
+    for info in channels.values():
+        chat_id = cache.get(_configured(info))
+        if chat_id is not None and info['chat_id'] != chat_id:
+            info['chat_id'] = chat_id
+            applied += 1
+    return applied
+
+
+async def check_channel(bot: Bot, configured: str) -> Tuple[Optional[int], Optional[str]]:
+    """
+    Verifica un canale e ne risolve l'ID numerico
+
+    Returns:
+        (ID numerico o None, problema o None)
+    """
+    try:
+        chat = await bot.get_chat(configured)
+        member = await bot.get_chat_member(chat.id, bot.id)
+    except TelegramError as e:
+        return None, f"canale non raggiungibile: {e}"
+
+    if member.status == ChatMember.OWNER:
+        return chat.id, None
+    if member.status != ChatMember.ADMINISTRATOR:
+        return chat.id, f"il bot non è amministratore (stato: {member.status})"
+    if chat.type == ChatType.CHANNEL and not getattr(member, 'can_post_messages', False):
+        return chat.id, "il bot è amministratore ma non ha il permesso di pubblicare"
+    return chat.id, None
+
+
+async def run_preflight(
+    bot: Bot,
+    channels: Dict[str, Dict[str, Any]] = CHANNELS,
+    timeout: float = PREFLIGHT_TIMEOUT,
+    path: str = CHANNEL_IDS_FILE
+) -> Dict[str, Optional[str]]:
+    """
+    Controlla tutti i canali in parallelo entro `timeout` secondi
+
+    Gli ID risolti aggiornano `channels` e la cache su disco.
+
+    Returns:
+        Dizionario lingua -> problema (None se il canale è pronto)
+    """
+    started = time.perf_counter()
+    apply_cached_ids(channels, path)
+    tasks = {
+        lang: asyncio.ensure_future(check_channel(bot, _configured(info)))
+        for lang, info in channels.items()
+    }
+    done, pending = await asyncio.wait(tasks.values(), timeout=timeout)
+    for task in pending:
+        task.cancel()
+
+    cache = load_json(path, {})
+    problems: Dict[str, Optional[str]] = {}
+    for lang, task in tasks.items():
+        if task not in done:
+            problems[lang] = f"nessuna risposta entro {timeout:g} secondi"
+            continue
+        chat_id, problem = task.result()
+        problems[lang] = problem
+        if chat_id is not None:
+            channels[lang]['chat_id'] = chat_id
+            cache[_configured(channels[lang])] = chat_id
+    save_json(path, cache)
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    failed = {lang: problem for lang, problem in problems.items() if problem}
+    for lang, problem in failed.items():
+        logger.error("Canale %s (%s): %s", lang, _configured(channels[lang]), problem)
+    logger.info(
+        "Pre-flight dei canali in %.0f ms: %d pronti, %d con problemi",
+        elapsed_ms, len(problems) - len(failed), len(failed),
+        extra={'preflight': {'elapsed_ms': round(elapsed_ms), 'problems': failed}}
+    )
+    return problems
@@ -0,0 +1,221 @@
+"""
+Monitor dei prezzi dei post pubblicati
+A ogni giro ricontrolla con lo scraper solo i prodotti più "in scadenza":
+quelli recenti e con prezzi che cambiano spesso vengono rivisti più di frequente.
+Lo stato è salvato dopo ogni prodotto, quindi un giro interrotto riprende dal
+punto in cui si era fermato.
+"""
+
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from telegram import Bot
+from telegram.error import TelegramError
+from telegram.ext import ContextTypes
+
+from config import (
+    ADMIN_USER_ID,
+    MONITOR_BUDGET,
+    MONITOR_MAX_AGE_DAYS,
+    MONITOR_MAX_INTERVAL_HOURS,
+    MONITOR_MIN_INTERVAL_HOURS,
+    MONITOR_UPDATE_CAPTIONS,
+    PRICE_MONITOR_FILE
+)
+from post_editor import edit_post
+from pricing import Price, parse_price, render_prices
+from published_store import PublishedStore
+from rate_limit import RateLimiter
+from storage import load_json, save_json
+
+logger = logging.getLogger(__name__)
+
+# Gli errori ripetuti allungano l'intervallo fino a 2^4 volte
+MAX_FAILURE_BACKOFF = 4
+
+
+class PriceMonitor:
+    """
+    Ricontrollo incrementale dei prezzi
+
+    Per ogni post lo stato contiene: last_checked, checks, changes, failures, last_price.
+    """
+
+    def __init__(
+        self,
+        store: PublishedStore,
+        scrape: Callable[[str], Awaitable[Dict]],
+        is_busy: Callable[[], bool],
+        limiter: RateLimiter,
+        path: str = PRICE_MONITOR_FILE,
+        budget: int = MONITOR_BUDGET,
+        update_captions: bool = MONITOR_UPDATE_CAPTIONS
+    ):
+        """
+        Args:
+            store: Archivio dei post pubblicati
+            scrape: Coroutine che esegue lo scraping di un link in background
+                (annullato se arriva uno scraping interattivo)
+            is_busy: True se lo scraper sta servendo una richiesta interattiva
+            limiter: Limitatore condiviso delle chiamate alla Bot API
+        """
+        self.store = store
+        self.scrape = scrape
+        self.is_busy = is_busy
+        self.limiter = limiter
+        self.path = path
+        self.budget = budget
+        self.update_captions = update_captions
+        self.state: Dict[str, Dict] = load_json(path, {})
+
+    # ---------- Priorità ----------
+
+    def _interval(self, record: Dict, state: Dict, now: float) -> float:
+        """Secondi da attendere tra due controlli di questo post"""
+        age_days = (now - record['published_at']) / 86400
+        # Più il post è vecchio, meno spesso viene controllato
+        interval = MONITOR_MIN_INTERVAL_HOURS * 3600 * (1 + age_days / 7)
+        # Volatilità stimata con lo smoothing di Laplace (0.5 per un post mai controllato)
+        volatility = (state.get('changes', 0) + 1) / (state.get('checks', 0) + 2)
+        interval /= 1 + 3 * volatility
+        interval *= 2 ** min(state.get('failures', 0), MAX_FAILURE_BACKOFF)
+        return min(interval, MONITOR_MAX_INTERVAL_HOURS * 3600)
+
+    def due_items(self, now: Optional[float] = None) -> List[Tuple[float, str]]:
+        """
+        Post da ricontrollare, dal più urgente
+
+        Returns:
+            Lista di (priorità, post_id) con priorità >= 1 (tempo trascorso / intervallo)
+        """
+        now = now or time.time()
+        due = []
+        for post_id, record in self.store.posts.items():
+            if not record.get('referral_link'):
+                continue
+            if now - record['published_at'] > MONITOR_MAX_AGE_DAYS * 86400:
+                continue
+            state = self.state.get(post_id, {})
+            elapsed = now - state.get('last_checked', record['published_at'])
+            priority = elapsed / self._interval(record, state, now)
+            if priority >= 1:
+                due.append((priority, post_id))
+        due.sort(reverse=True)
+        return due
+
+    # ---------- Esecuzione ----------
+
+    def _save(self) -> None:
+        # Dimentica i post eliminati dall'archivio
+        for post_id in [p for p in self.state if p not in self.store.posts]:
+            del self.state[post_id]
+        save_json(self.path, self.state)
+
+    @staticmethod
+    def _reference_price(record: Dict, state: Dict, scraped: Price) -> Optional[Price]:
+        """Prezzo con cui confrontare quello letto: quello del post, o l'ultimo letto se la valuta è diversa"""
+        for text in (record.get('price'), state.get('last_price')):
+            reference = parse_price(text) if text else None
+            if reference is not None and reference.currency == scraped.currency:
+                return reference
+        return None
+
+    async def check(self, bot: Bot, post_id: str, result: Dict) -> Optional[str]:
+        """
+        Aggiorna stato e archivio di un post con il risultato del suo scraping
+
+        Returns:
+            Messaggio per l'admin se il prezzo è cambiato, altrimenti None
+        """
+        record = self.store.posts[post_id]
+        state = self.state.setdefault(post_id, {})
+        state['last_checked'] = time.time()
+
+        scraped = parse_price(result.get('price') or '') if result.get('success') else None
+        if scraped is None:
+            state['failures'] = state.get('failures', 0) + 1
+            logger.info("Monitor: prezzo di %s non disponibile (%s)", post_id, result.get('error'))
+            return None
+
+        state['failures'] = 0
+        state['checks'] = state.get('checks', 0) + 1
+        reference = self._reference_price(record, state, scraped)
+        state['last_price'] = result['price']
+        if reference is None or abs(reference.amount - scraped.amount) < 0.01:
+            return None
+
+        state['changes'] = state.get('changes', 0) + 1
+        old_price = record['price']
+        record = self.store.update(
+            post_id,
+            price=result['price'],
+            price_by_lang=render_prices(result['price'])
+        )
+        logger.info("Monitor: prezzo di %s cambiato da %s a %s", post_id, old_price, result['price'])
+
+        notice = f"💹 Prezzo cambiato: {record['product_name']} ({post_id}) {old_price} → {result['price']}"
+        if self.update_captions:
+            results = await edit_post(bot, self.limiter, record)
+            failed = [lang for lang, error in results.items() if error]
+            notice += " — caption aggiornate" + (f" (errori: {', '.join(failed)})" if failed else "")
+        else:
+            notice += f" — per aggiornare i canali: /edit {post_id} prezzo {result['price']}"
+        return notice
+
+    async def run_once(self, bot: Bot) -> Dict[str, int]:
+        """
+        Un giro del monitor: al massimo `budget` post, fermandosi se arriva
+        uno scraping interattivo (che annulla anche quello del monitor in corso)
+
+        Returns:
+            Statistiche del giro (due, checked, changed)
+        """
+        # Caricato insieme allo scraper, solo quando il monitor lavora
+        from scraper_worker import CANCELLED_ERROR
+
+        due = self.due_items()
+        stats = {'due': len(due), 'checked': 0, 'changed': 0}
+        notices = []
+
+        for _, post_id in due[:self.budget]:
+            if self.is_busy():
+                logger.info("Monitor: scraper occupato da una richiesta interattiva, riprendo al prossimo giro")
+                break
+            if post_id not in self.store.posts:
+                continue
+            result = await self.scrape(self.store.posts[post_id]['referral_link'])
+            if result.get('error') == CANCELLED_ERROR:
+                # Lo scraping ha ceduto il worker a una richiesta interattiva: il post resta in scadenza
+                logger.info("Monitor: scraping annullato per una richiesta interattiva, riprendo al prossimo giro")
+                break
+            if post_id not in self.store.posts:
+                continue
+            try:
+                notice = await self.check(bot, post_id, result)
+            finally:
+                self._save()
+            stats['checked'] += 1
+            if notice:
+                stats['changed'] += 1
+                notices.append(notice)
+
+        if notices:
+            try:
+                await self.limiter.call(ADMIN_USER_ID, lambda: bot.send_message(
+                    chat_id=ADMIN_USER_ID,
+                    text="\n".join(notices)
+                ))
+            except TelegramError as e:
+                logger.error("Monitor: impossibile avvisare l'admin: %s", e)
+
+        logger.info(
+            "Monitor prezzi: %d post in scadenza, %d controllati, %d cambiati",
+            stats['due'], stats['checked'], stats['changed'],
+            extra={'monitor': stats}
+        )
+        return stats
+
+    async def job(self, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Callback per la JobQueue"""
+        await self.run_once(context.bot)
@@ -0,0 +1,228 @@
+"""
+Motore prezzi: interpreta il prezzo inserito (importo + valuta) e lo converte
+nella valuta di ogni canale usando i tassi di cambio del file locale
+"""
+
+import logging
+import os
+import re
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from config import CHANNELS, DEFAULT_PRICE_CURRENCY, RATES_FILE
+from storage import load_json
+
+logger = logging.getLogger(__name__)
+
+# Simboli e sigle riconosciuti nel testo del prezzo
+CURRENCY_ALIASES = {
+    '¥': 'CNY', '￥': 'CNY', '元': 'CNY', 'RMB': 'CNY', 'CNY': 'CNY', 'YUAN': 'CNY',
+    '$': 'USD', 'US$': 'USD', 'USD': 'USD',
+    '€': 'EUR', 'EUR': 'EUR', 'EURO': 'EUR', 'EUROS': 'EUR',
+    '£': 'GBP', 'GBP': 'GBP',
+    'JPY': 'JPY', '円': 'JPY',
+}
+
+# Simbolo usato per mostrare ogni valuta
+CURRENCY_SYMBOLS = {'CNY': '¥', 'USD': '$', 'EUR': '€', 'GBP': '£', 'JPY': '¥'}
+
+# Lingue che usano la virgola come separatore decimale
+DECIMAL_COMMA_LANGUAGES = {'IT', 'ES'}
+
+_CURRENCY_RE = re.compile(
+    '|'.join(re.escape(alias) for alias in sorted(CURRENCY_ALIASES, key=len, reverse=True)),
+    re.IGNORECASE
+)
+# Cifre seguite da gruppi di migliaia (.ddd / ,ddd / spazio ddd) e da decimali di 1-2 cifre:
+# l'importo si ferma allo spazio, a meno che dopo non venga un gruppo di tre cifre
+_AMOUNT_RE = re.compile(r'\d+(?:[.,\s]\d{3}(?!\d))*(?:[.,]\d{1,2}(?!\d))?')
+# Moltiplicatori dopo l'importo (1,5k / 2万): non si possono ignorare, il prezzo viene rifiutato
+_UNIT_SUFFIX_RE = re.compile(r'\s?[kK万千](?![a-zA-Z])|[mM](?![a-zA-Z])')
+_SIGNS = '-+−'
+
+
+@dataclass(frozen=True)
+class Price:
+    """Prezzo strutturato"""
+    amount: float
+    currency: str
+
+
+def _parse_amount(raw: str) -> Optional[float]:
+    """
+    Interpreta un numero con separatori italiani o inglesi (1.299,00 / 1,299.00 / 49.99)
+
+    Un separatore seguito da 1-2 cifre finali è decimale (35,5 / 49.99); quelli
+    seguiti da tre cifre sono migliaia, sia con il punto che con la virgola
+    (1.299 e 1,299 valgono entrambi 1299). Segni e suffissi ('-5', '1,5k')
+    rendono il numero non valido.
+    """
+    if not re.fullmatch(r'[\d.,\s]+', raw):
+        return None
+    number = re.sub(r'\s', '', raw)
+    decimals = re.search(r'[.,](\d{1,2})$', number)
+    if decimals:
+        number = number[:decimals.start()]
+    number = re.sub(r'[.,]', '', number)
+    if not number:
+        return None
+    if decimals:
+        number = f"{number}.{decimals.group(1)}"
+
+    try:
+        return float(number)
+    except ValueError:
+        return None
+
+
+def _gap(span: Tuple[int, int], other: Tuple[int, int]) -> int:
+    """Caratteri tra due tratti del testo (0 se si toccano)"""
+    return max(other[0] - span[1], span[0] - other[1], 0)
+
+
+def parse_price(text: str, default_currency: str = DEFAULT_PRICE_CURRENCY) -> Optional[Price]:
+    """
+    Estrae importo e valuta da un prezzo scritto a mano o letto dalla pagina
+
+    Args:
+        text: Prezzo come testo (es. '¥399', '$49.99', '35 €', '1.299,00 EUR', '¥199-299')
+        default_currency: Valuta da usare se il testo non ne indica una
+
+    Returns:
+        Price oppure None se il testo non contiene un importo, o se l'importo ha
+        un segno ('-5') o un moltiplicatore ('1,5k')
+    """
+    matches = list(_AMOUNT_RE.finditer(text))
+    if not matches:
+        return None
+
+    currency_match = _CURRENCY_RE.search(text)
+    currency = CURRENCY_ALIASES[currency_match.group(0).upper()] if currency_match else default_currency
+
+    # Vale l'importo più vicino al simbolo della valuta ('2 x 50€' → 50); a parità
+    # di distanza il primo, come negli intervalli (¥199-299), e senza valuta il primo del testo
+    match = matches[0]
+    if currency_match:
+        match = min(matches, key=lambda m: _gap(m.span(), currency_match.span()))
+
+    before = text[:match.start()].rstrip()
+    # Il trattino dopo una cifra è un intervallo (199-299), non un segno
+    if before.endswith(tuple(_SIGNS)) and not before[:-1].rstrip()[-1:].isdigit():
+        return None
+    if _UNIT_SUFFIX_RE.match(text, match.end()):
+        return None
+    amount = _parse_amount(match.group(0))
+    if amount is None:
+        return None
+    return Price(amount=amount, currency=currency)
+
+
+# ---------- Tassi di cambio ----------
+
+_rates_cache: Dict[str, object] = {'key': None, 'rates': {}}
+
+
+def load_rates(path: str = RATES_FILE) -> Dict[str, float]:
+    """
+    Tassi di cambio rispetto alla valuta base del file (1 base = rate unità)
+    Il file viene riletto solo quando cambia la data di modifica
+    """
+    try:
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        key = (path, None, None)
+
+    if _rates_cache['key'] != key:
+        data = load_json(path, {})
+        rates = {code.upper(): float(rate) for code, rate in data.get('rates', {}).items() if rate}
+        if not rates:
+            logger.warning("Nessun tasso di cambio disponibile in %s: i prezzi non verranno convertiti", path)
+        _rates_cache['key'] = key
+        _rates_cache['rates'] = rates
+    return _rates_cache['rates']
+
+
+def convert(price: Price, target: str, rates: Optional[Dict[str, float]] = None) -> Optional[Price]:
+    """Converte un prezzo nella valuta indicata (None se manca il tasso)"""
+    if price.currency == target:
+        return price
+    rates = rates if rates is not None else load_rates()
+    if price.currency not in rates or target not in rates:
+        return None
+    return Price(price.amount * rates[target] / rates[price.currency], target)
+
+
+# ---------- Formattazione ----------
+
+def format_price(price: Price, language: str = 'EN') -> str:
+    """Formatta un prezzo con simbolo e separatori della lingua (es. €51,20 / $55.30)"""
+    symbol = CURRENCY_SYMBOLS.get(price.currency, price.currency + ' ')
+    if price.currency in ('CNY', 'JPY') and price.amount == int(price.amount):
+        number = f"{price.amount:,.0f}"
+    else:
+        number = f"{price.amount:,.2f}"
+    if language in DECIMAL_COMMA_LANGUAGES:
+        number = number.replace(',', '\x00').replace('.', ',').replace('\x00', '.')
+    return f"{symbol}{number}"
+
+
+def _render(price: Price, converted: Optional[Price], language: str) -> str:
+    if converted is None or converted.currency == price.currency:
+        return format_price(price, language)
+    return f"{format_price(converted, language)} ({format_price(price, language)})"
+
+
+def render_prices(text: str) -> Dict[str, str]:
+    """
+    Prezzo localizzato per ogni canale, calcolato una volta sola per bozza
+
+    Ogni valuta di destinazione viene convertita una volta, anche se più canali
+    la condividono. Se il testo non è interpretabile viene mostrato così com'è.
+
+    Returns:
+        Dizionario lingua -> prezzo da mostrare (es. {'IT': '€51,15 (¥399)', ...})
+    """
+    price = parse_price(text)
+    if price is None:
+        return {lang: text for lang in CHANNELS}
+
+    rates = load_rates()
+    targets = {info.get('currency', 'EUR') for info in CHANNELS.values()}
+    converted = {target: convert(price, target, rates) for target in targets}
+    return {
+        lang: _render(price, converted[info.get('currency', 'EUR')], lang)
+        for lang, info in CHANNELS.items()
+    }
+
+
+if __name__ == "__main__":
+    # Test del parser dei prezzi
+    assert _parse_amount('-5') is None and _parse_amount('1,5k') is None
+    cases = {
+        '¥399': Price(399.0, 'CNY'),
+        '$49.99': Price(49.99, 'USD'),
+        '35 €': Price(35.0, 'EUR'),
+        '35,5': Price(35.5, DEFAULT_PRICE_CURRENCY),
+        '1.299€': Price(1299.0, 'EUR'),
+        '1,299': Price(1299.0, DEFAULT_PRICE_CURRENCY),
+        '1 299 €': Price(1299.0, 'EUR'),
+        '1.299,00 EUR': Price(1299.0, 'EUR'),
+        '1,299.00 USD': Price(1299.0, 'USD'),
+        '¥199-299': Price(199.0, 'CNY'),
+        '49.99 5%': Price(49.99, DEFAULT_PRICE_CURRENCY),
+        '399 2': Price(399.0, DEFAULT_PRICE_CURRENCY),
+        '2 x 50€': Price(50.0, 'EUR'),
+        '-5': None,
+        '€ -5': None,
+        '1,5k': None,
+        '¥2万': None,
+        '¥199 - 299': Price(199.0, 'CNY'),
+        '399RMB': Price(399.0, 'CNY'),
+        'prezzo': None,
+    }
+    for text, expected in cases.items():
+        parsed = parse_price(text)
+        status = "✅" if parsed == expected else "❌"
+        print(f"{status} {text!r} → {parsed}")
+        assert parsed == expected, f"{text!r}: atteso {expected}, ottenuto {parsed}"
@@ -0,0 +1,161 @@
+"""
+Coda durevole delle pubblicazioni su disco
+Un job è un file JSON che passa tra tre cartelle:
+    pending/     bozze confermate in attesa di un worker
+    processing/  job presi in carico (il nome contiene il worker)
+    done/        risultati da consegnare al bot
+Ogni passaggio è un rename atomico: due worker non possono prendere lo stesso
+job e un crash non perde mai una bozza confermata.
+"""
+
+import logging
+import os
+import secrets
+import time
+from typing import Any, Dict, List, Optional, Set
+
+from config import PUBLISH_QUEUE_DIR
+from storage import load_json, save_json
+
+logger = logging.getLogger(__name__)
+
+# Separatore tra ID del job e nome del worker nei file di processing/
+WORKER_SEPARATOR = '@'
+
+
+def _job_files(directory: str) -> List[str]:
+    """File dei job in ordine di arrivo (i temporanei di save_json iniziano con '.')"""
+    return sorted(
+        name for name in os.listdir(directory)
+        if name.endswith('.json') and not name.startswith('.')
+    )
+
+
+class PublishQueue:
+    """Coda FIFO basata su file, condivisa tra il bot e i worker di pubblicazione"""
+
+    def __init__(self, root: str = PUBLISH_QUEUE_DIR):
+        self.root = root
+        self.pending_dir = os.path.join(root, 'pending')
+        self.processing_dir = os.path.join(root, 'processing')
+        self.done_dir = os.path.join(root, 'done')
+        for directory in (self.pending_dir, self.processing_dir, self.done_dir):
+            os.makedirs(directory, exist_ok=True)
+
+    # ---------- Lato bot ----------
+
+    def enqueue(self, draft: Dict[str, Any], notify_chat_id: int) -> str:
+        """
+        Mette in coda una bozza confermata
+
+        Args:
+            draft: Bozza (vedi publisher.build_draft)
+            notify_chat_id: Chat a cui inviare l'esito della pubblicazione
+
+        Returns:
+            ID del job (ordinabile per data di arrivo)
+        """
+        job_id = f"{time.time_ns():020d}-{secrets.token_hex(3)}"
+        save_json(os.path.join(self.pending_dir, f"{job_id}.json"), {
+            'job_id': job_id,
+            'draft': draft,
+            'notify_chat_id': notify_chat_id,
+            'enqueued_at': time.time()
+        })
+        logger.info("Job di pubblicazione %s in coda", job_id)
+        return job_id
+
+    def collect(self) -> List[Dict[str, Any]]:
+        """Job completati dai worker, in ordine di arrivo"""
+        jobs = []
+        for name in _job_files(self.done_dir):
+            job = load_json(os.path.join(self.done_dir, name), None)
+            if job is not None:
+                jobs.append(job)
+        return jobs
+
+    def acknowledge(self, job: Dict[str, Any]) -> None:
+        """Rimuove un risultato già consegnato"""
+        try:
+            os.remove(os.path.join(self.done_dir, f"{job['job_id']}.json"))
+        except FileNotFoundError:
+            pass
+
+    def backlog(self) -> int:
+        """Job non ancora completati (in attesa o in lavorazione)"""
+        return len(_job_files(self.pending_dir)) + len(_job_files(self.processing_dir))
+
+    def fanout_ids(self) -> Set[str]:
+        """ID delle pubblicazioni (vedi fanout.py) con un job in attesa, in lavorazione o da consegnare"""
+        ids = set()
+        for directory in (self.pending_dir, self.processing_dir, self.done_dir):
+            for name in _job_files(directory):
+                job = load_json(os.path.join(directory, name), None)
+                fanout_id = (job or {}).get('draft', {}).get('fanout_id')
+                if fanout_id:
+                    ids.add(fanout_id)
+        return ids
+
+    def requeue(self, worker: Optional[str] = None) -> int:
+        """
+        Rimette in attesa i job presi da un worker terminato (o da tutti)
+
+        Un job interrotto a metà può essere stato pubblicato su una parte dei canali:
+        lo stato per canale (vedi fanout.py) fa ripubblicare solo quelli non completati.
+
+        Returns:
+            Numero di job rimessi in coda
+        """
+        moved = 0
+        for name in _job_files(self.processing_dir):
+            job_id, _, owner = name[:-len('.json')].partition(WORKER_SEPARATOR)
+            if worker is not None and owner != worker:
+                continue
+            try:
+                os.rename(
+                    os.path.join(self.processing_dir, name),
+                    os.path.join(self.pending_dir, f"{job_id}.json")
+                )
+                moved += 1
+            except FileNotFoundError:
+                continue
+        if moved:
+            logger.warning("%d job di pubblicazione rimessi in coda", moved)
+        return moved
+
+    # ---------- Lato worker ----------
+
+    def claim(self, worker: str) -> Optional[Dict[str, Any]]:
+        """
+        Prende in carico il job più vecchio in attesa
+
+        Il rename in processing/ è atomico: se più worker provano a prendere lo
+        stesso job, solo uno ci riesce e gli altri passano al successivo.
+        """
+        for name in _job_files(self.pending_dir):
+            job_id = name[:-len('.json')]
+            target = os.path.join(self.processing_dir, f"{job_id}{WORKER_SEPARATOR}{worker}.json")
+            try:
+                os.rename(os.path.join(self.pending_dir, name), target)
+            except FileNotFoundError:
+                continue
+            job = load_json(target, None)
+            if job is None:
+                logger.error("Job %s illeggibile, scartato", job_id)
+                os.remove(target)
+                continue
+            return job
+        return None
+
+    def complete(self, job: Dict[str, Any], worker: str, results: Dict[str, Any]) -> None:
+        """Salva l'esito del job in done/ e lo toglie da processing/"""
+        save_json(os.path.join(self.done_dir, f"{job['job_id']}.json"), {
+            **job,
+            'results': results,
+            'worker': worker,
+            'finished_at': time.time()
+        })
+        try:
+            os.remove(os.path.join(self.processing_dir, f"{job['job_id']}{WORKER_SEPARATOR}{worker}.json"))
+        except FileNotFoundError:
+            pass
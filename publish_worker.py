@@ -0,0 +1,147 @@
+"""
+Worker di pubblicazione in processi separati
+Ogni worker ha il suo client Bot e il suo event loop: prende le bozze dalla
+coda su disco (publish_queue.py), le carica sui canali e salva l'esito.
+Il bot si limita a raccogliere le bozze confermate e a consegnare i risultati.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import signal
+from typing import Any, Dict, List, Optional
+
+from telegram import Bot
+
+from config import CHANNEL_MIN_INTERVAL, GLOBAL_RATE_LIMIT, PUBLISH_WORKERS
+from fanout import FanoutStore
+from http_pools import build_bot_request
+from preflight import apply_cached_ids
+from publish_queue import PublishQueue
+from publisher import publish_draft
+from rate_limit import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Pausa tra due controlli della coda vuota (secondi)
+POLL_INTERVAL = 0.2
+
+
+async def _worker_loop(name: str, token: str, bot_options: Dict[str, Any], workers: int, stop_event) -> None:
+    queue = PublishQueue()
+    fanouts = FanoutStore()
+    # Stessi ID numerici dei canali risolti dal bot all'avvio
+    apply_cached_ids()
+    # I limiti di Telegram valgono per il token: vengono divisi tra i worker
+    limiter = RateLimiter(
+        per_chat_interval=CHANNEL_MIN_INTERVAL * workers,
+        global_rate=GLOBAL_RATE_LIMIT / workers
+    )
+    bot = Bot(token, request=build_bot_request(), **bot_options)
+
+    async with bot:
+        logger.info("Worker di pubblicazione %s pronto", name)
+        while not stop_event.is_set():
+            job = queue.claim(name)
+            if job is None:
+                await asyncio.sleep(POLL_INTERVAL)
+                continue
+            # Un job ripreso dopo un crash salta i canali già completati
+            fanout_id = job['draft'].get('fanout_id')
+            fanout = fanouts.load(fanout_id)
+            if fanout_id and fanout is None:
+                # Pubblicazione già completata (o stato perso): ripubblicare creerebbe doppioni
+                logger.warning("Job %s saltato: la pubblicazione %s non è più da completare", job['job_id'], fanout_id)
+                queue.complete(job, name, {})
+                continue
+            results = await publish_draft(bot, limiter, job['draft'], fanout)
+            queue.complete(job, name, results)
+            logger.info("Job %s pubblicato da %s", job['job_id'], name)
+
+
+def _worker_main(name: str, token: str, bot_options: Dict[str, Any], workers: int, stop_event) -> None:
+    """Entry point del processo figlio"""
+    # Ctrl+C è gestito dal processo del bot, che ferma i worker con stop_event
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    from log_setup import setup_logging
+    setup_logging()
+    asyncio.run(_worker_loop(name, token, bot_options, workers, stop_event))
+
+
+class PublisherPool:
+    """
+    Pool di processi di pubblicazione supervisionato dal bot
+
+    I worker che terminano vengono riavviati e i job che avevano preso in carico
+    tornano in coda.
+    """
+
+    def __init__(
+        self,
+        token: str,
+        base_url: Optional[str] = None,
+        base_file_url: Optional[str] = None,
+        local_mode: bool = False,
+        workers: int = PUBLISH_WORKERS
+    ):
+        self.token = token
+        # Stessa Bot API del bot (anche un server self-hosted in modalità locale)
+        self.bot_options: Dict[str, Any] = {}
+        if base_url:
+            self.bot_options['base_url'] = base_url
+        if base_file_url:
+            self.bot_options['base_file_url'] = base_file_url
+        if local_mode:
+            self.bot_options['local_mode'] = True
+        self.workers = workers
+        self.queue = PublishQueue()
+        self.restarts = 0
+        self._ctx = multiprocessing.get_context('spawn')
+        self._stop_event = self._ctx.Event()
+        self._processes: Dict[str, multiprocessing.Process] = {}
+
+    def _spawn(self, name: str) -> None:
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(name, self.token, self.bot_options, self.workers, self._stop_event),
+            name=f'publisher-{name}',
+            daemon=True
+        )
+        process.start()
+        self._processes[name] = process
+        logger.info("Worker di pubblicazione %s avviato (pid %s)", name, process.pid)
+
+    def start(self) -> None:
+        """Avvia i worker; i job rimasti in lavorazione da un'esecuzione precedente tornano in coda"""
+        self.queue.requeue()
+        self._stop_event.clear()
+        for n in range(self.workers):
+            self._spawn(f"w{n + 1}")
+
+    def ensure_alive(self) -> List[str]:
+        """
+        Riavvia i worker terminati
+
+        Returns:
+            Nomi dei worker riavviati
+        """
+        restarted = []
+        for name, process in list(self._processes.items()):
+            if process.is_alive() or self._stop_event.is_set():
+                continue
+            logger.warning("Worker di pubblicazione %s terminato con codice %s", name, process.exitcode)
+            self.queue.requeue(name)
+            self._spawn(name)
+            self.restarts += 1
+            restarted.append(name)
+        return restarted
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Ferma i worker dopo il job in corso"""
+        self._stop_event.set()
+        for process in self._processes.values():
+            process.join(timeout=timeout)
+            if process.is_alive():
+                process.terminate()
+                process.join(timeout=5)
+        self._processes.clear()
@@ -0,0 +1,109 @@
+"""
+Archivio dei post pubblicati
+Per ogni prodotto ricorda i dati del post e, per ogni canale, i message_id
+restituiti da send_media_group: servono per modificare o eliminare il post
+"""
+
+import logging
+import secrets
+import time
+from typing import Dict, List, Optional
+
+from config import PUBLISHED_POSTS_FILE
+from storage import load_json, save_json
+
+logger = logging.getLogger(__name__)
+
+
+class PublishedStore:
+    """
+    Post pubblicati indicizzati da un ID breve (es. 'a3f9c1')
+
+    Formato di un record:
+        {'post_id', 'item_id', 'product_name', 'price', 'price_by_lang',
+         'referral_link', 'category', 'published_at',
+         'channels': {lingua: {'chat_id': ..., 'message_ids': [...]}}}
+    I digest hanno in più 'products' (nome, prezzo, link e categoria di ogni prodotto).
+    Un canale in cui una modifica non è riuscita ha in più 'outdated', con i
+    valori precedenti ancora visibili sul canale.
+    """
+
+    def __init__(self, path: str = PUBLISHED_POSTS_FILE):
+        self.path = path
+        self.posts: Dict[str, Dict] = load_json(path, {})
+
+    def _new_id(self) -> str:
+        while True:
+            post_id = secrets.token_hex(3)
+            if post_id not in self.posts:
+                return post_id
+
+    def add(self, record: Dict) -> str:
+        """
+        Registra un nuovo post e salva l'archivio
+
+        Returns:
+            ID breve assegnato al post
+        """
+        post_id = self._new_id()
+        self.posts[post_id] = {
+            **record,
+            'post_id': post_id,
+            'published_at': record.get('published_at', int(time.time()))
+        }
+        self.save()
+        logger.info("Post %s registrato su %d canali", post_id, len(record.get('channels', {})))
+        return post_id
+
+    def get(self, post_id: str) -> Optional[Dict]:
+        return self.posts.get(post_id.strip().lower())
+
+    def update(self, post_id: str, **fields) -> Dict:
+        """Aggiorna i campi di un post e salva l'archivio"""
+        record = self.posts[post_id]
+        record.update(fields)
+        self.save()
+        return record
+
+    def apply_edit(self, post_id: str, changes: Dict, failed: List[str]) -> Dict:
+        """
+        Registra una modifica riuscita su almeno un canale e salva l'archivio
+
+        I canali aggiornati mostrano tutti i dati del record; per quelli in cui la
+        modifica è fallita restano in 'outdated' i valori che mostrano ancora.
+        """
+        record = self.posts[post_id]
+        for lang, target in record['channels'].items():
+            if lang in failed:
+                outdated = target.setdefault('outdated', {})
+                for field in changes:
+                    outdated.setdefault(field, record.get(field))
+            else:
+                target.pop('outdated', None)
+        record.update(changes)
+        self.save()
+        return record
+
+    @staticmethod
+    def outdated_languages(record: Dict) -> List[str]:
+        """Canali in cui l'ultima modifica non è riuscita (mostrano ancora i valori precedenti)"""
+        return [lang for lang, target in record['channels'].items() if target.get('outdated')]
+
+    def remove_channels(self, post_id: str, languages: List[str]) -> None:
+        """Dimentica i canali da cui il post è stato eliminato (e il post, se non ne restano)"""
+        record = self.posts.get(post_id)
+        if record is None:
+            return
+        for lang in languages:
+            record['channels'].pop(lang, None)
+        if not record['channels']:
+            del self.posts[post_id]
+        self.save()
+
+    def recent(self, limit: int = 10) -> List[Dict]:
+        """Ultimi post pubblicati, dal più recente"""
+        ordered = sorted(self.posts.values(), key=lambda r: r['published_at'], reverse=True)
+        return ordered[:limit]
+
+    def save(self) -> None:
+        save_json(self.path, self.posts)
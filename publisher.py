@@ -0,0 +1,252 @@
+"""
+Pubblicazione di una bozza confermata su tutti i canali
+Usato sia dal bot (pubblicazione diretta) sia dai worker di pubblicazione
+(vedi publish_worker.py): la bozza è un dizionario serializzabile in JSON.
+Con un Fanout (vedi fanout.py) lo stato di ogni canale viene salvato a ogni
+passo e i canali già completati non vengono ripubblicati.
+"""
+
+import asyncio
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from telegram import Bot, InputMediaPhoto
+from telegram.constants import ParseMode
+
+from config import CHANNELS
+from duplicates import PublishedIndex, canonical_item_id
+from fanout import STATUS_DONE, STATUS_FAILED, STATUS_SENDING, STATUS_SENT, Fanout
+from post_editor import post_markup
+from published_store import PublishedStore
+from rate_limit import RateLimiter
+from templates import build_captions
+
+logger = logging.getLogger(__name__)
+
+
+def build_draft(user_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Estrae dalla conversazione i dati necessari alla pubblicazione
+
+    Args:
+        user_data: context.user_data della bozza confermata
+
+    Returns:
+        Bozza serializzabile in JSON
+    """
+    return {
+        'product_name': user_data.get('product_name', 'Prodotto'),
+        'price': user_data.get('price', 'N/A'),
+        'price_by_lang': user_data.get('price_by_lang', {}),
+        'referral_link': user_data.get('referral_link', ''),
+        'category': user_data.get('category', 'clothing'),
+        'photos': list(user_data.get('photos', [])),
+        'photos_are_urls': user_data.get('photos_are_urls', False),
+        'photo_uids': list(user_data.get('photo_uids', [])),
+        # Impronte percettive delle sole foto rimaste nella bozza
+        'photo_hashes': [
+            photo_hash for file_id, photo_hash in user_data.get('photo_hashes', {}).items()
+            if file_id in user_data.get('photos', [])
+        ],
+    }
+
+
+def _is_local_file(draft: Dict[str, Any], photo_id: str) -> bool:
+    return draft['photos_are_urls'] or photo_id.startswith('/') or photo_id.startswith('\\') or os.path.exists(photo_id)
+
+
+async def publish_to_channel(
+    bot: Bot,
+    limiter: RateLimiter,
+    draft: Dict[str, Any],
+    lang_code: str,
+    caption: str,
+    fanout: Optional[Fanout] = None
+) -> Dict[str, Any]:
+    """
+    Pubblica l'album della bozza (o del digest) su un canale e aggiunge i bottoni di acquisto
+
+    Con un fanout, se l'album di questo canale risulta già inviato viene
+    aggiunta solo la tastiera.
+
+    Returns:
+        {'success', 'chat_id', 'message_ids', 'error'}
+    """
+    channel_id = CHANNELS[lang_code]['chat_id']
+    result: Dict[str, Any] = {'success': False, 'chat_id': channel_id, 'message_ids': [], 'error': None}
+    state = fanout.channels[lang_code] if fanout is not None else {}
+
+    # I file locali dell'album restano aperti fino all'invio
+    files_to_close = []
+    try:
+        if state.get('message_ids'):
+            result['message_ids'] = list(state['message_ids'])
+            logger.info("Album già inviato su %s, aggiungo solo i bottoni", lang_code)
+        else:
+            if state.get('status') == STATUS_SENDING:
+                # Il processo si è fermato durante l'invio: Telegram non permette di sapere se è arrivato
+                logger.warning("Invio su %s interrotto in precedenza con esito sconosciuto, lo ripeto", lang_code)
+            if fanout is not None:
+                fanout.update(lang_code, status=STATUS_SENDING, attempts=state.get('attempts', 0) + 1)
+            result['message_ids'] = await _send_album(bot, limiter, draft, channel_id, caption, files_to_close)
+            if fanout is not None:
+                fanout.update(lang_code, status=STATUS_SENT, message_ids=result['message_ids'])
+
+        # Aggiungi i bottoni al primo messaggio del media group
+        reply_markup = post_markup(draft, lang_code)
+        if reply_markup and result['message_ids']:
+            await limiter.call(channel_id, lambda: bot.edit_message_reply_markup(
+                chat_id=channel_id,
+                message_id=result['message_ids'][0],
+                reply_markup=reply_markup
+            ))
+        result['success'] = True
+        if fanout is not None:
+            fanout.update(lang_code, status=STATUS_DONE, error=None)
+        logger.info("Post pubblicato con successo su %s", lang_code)
+    except Exception as e:
+        logger.error("Errore nella pubblicazione su %s: %s", lang_code, e)
+        result['error'] = str(e)
+        if fanout is not None:
+            fanout.update(lang_code, status=STATUS_FAILED, error=str(e))
+    finally:
+        for f in files_to_close:
+            f.close()
+    return result
+
+
+async def _send_album(
+    bot: Bot,
+    limiter: RateLimiter,
+    draft: Dict[str, Any],
+    channel_id,
+    caption: str,
+    files_to_close: List
+) -> List[int]:
+    """Invia l'album della bozza e restituisce i message_id (la prima foto porta la caption)"""
+    media_group = []
+    for idx, photo_id in enumerate(draft['photos']):
+        media = photo_id
+        if _is_local_file(draft, photo_id):
+            if bot.local_mode:
+                # Il server Bot API locale legge il file dal disco (file://), nessun upload
+                media = Path(photo_id).absolute()
+            else:
+                media = open(photo_id, 'rb')
+                files_to_close.append(media)
+        if idx == 0:
+            media_group.append(InputMediaPhoto(media=media, caption=caption, parse_mode=ParseMode.MARKDOWN))
+        else:
+            media_group.append(InputMediaPhoto(media=media))
+
+    sent_messages = await limiter.call(channel_id, lambda: bot.send_media_group(
+        chat_id=channel_id,
+        media=media_group
+    ))
+    return [m.message_id for m in sent_messages]
+
+
+async def publish_draft(
+    bot: Bot,
+    limiter: RateLimiter,
+    draft: Dict[str, Any],
+    fanout: Optional[Fanout] = None
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Pubblica la bozza su tutti i canali in parallelo
+
+    Le caption di tutte le lingue vengono controllate prima di caricare le foto:
+    se una non è valida non parte nessun upload. Con un fanout vengono
+    pubblicati solo i canali non ancora completati; per gli altri il risultato
+    è quello salvato.
+
+    Returns:
+        Dizionario lingua -> risultato di publish_to_channel
+    """
+    languages: List[str] = list(fanout.channels) if fanout is not None else list(CHANNELS)
+    captions, problems = build_captions(draft, languages)
+    if problems:
+        logger.error("Pubblicazione annullata, caption non valide: %s", problems)
+        results = {
+            lang_code: {
+                'success': False,
+                'chat_id': CHANNELS[lang_code]['chat_id'],
+                'message_ids': [],
+                'error': "Caption non valida: " + "; ".join(problems.get(lang_code, ["errore in un'altra lingua"]))
+            }
+            for lang_code in languages
+        }
+        if fanout is not None:
+            for lang_code in fanout.languages_to_send():
+                fanout.update(lang_code, status=STATUS_FAILED, error=results[lang_code]['error'])
+        return results
+
+    results: Dict[str, Dict[str, Any]] = {}
+    if fanout is not None:
+        for lang_code, state in fanout.channels.items():
+            if state['status'] == STATUS_DONE:
+                results[lang_code] = {
+                    'success': True,
+                    'chat_id': CHANNELS[lang_code]['chat_id'],
+                    'message_ids': state['message_ids'],
+                    'error': None
+                }
+    to_send = [lang_code for lang_code in languages if lang_code not in results]
+    sent = await asyncio.gather(*(
+        publish_to_channel(bot, limiter, draft, lang_code, captions[lang_code], fanout) for lang_code in to_send
+    ))
+    results.update(zip(to_send, sent))
+    return {lang_code: results[lang_code] for lang_code in languages}
+
+
+def record_publication(
+    index: PublishedIndex,
+    store: PublishedStore,
+    draft: Dict[str, Any],
+    results: Dict[str, Dict[str, Any]],
+    post_id: Optional[str] = None
+) -> Optional[str]:
+    """
+    Registra la pubblicazione nell'indice dei duplicati e nell'archivio dei post
+
+    Args:
+        post_id: Post già registrato da un tentativo precedente della stessa
+                 pubblicazione: i nuovi canali vengono aggiunti a quel post
+
+    Returns:
+        ID breve del post, o None se nessun messaggio è stato inviato
+    """
+    if any(r['success'] for r in results.values()):
+        # Un digest registra ogni suo prodotto, come se fosse stato pubblicato da solo
+        for product in draft.get('products') or [draft]:
+            index.add(product['referral_link'], product['photo_uids'], product['product_name'], product.get('photo_hashes', []))
+
+    # Anche i canali con errore sul bottone hanno messaggi da poter modificare o eliminare
+    posted_channels = {
+        lang_code: {'chat_id': r['chat_id'], 'message_ids': r['message_ids']}
+        for lang_code, r in results.items()
+        if r['message_ids']
+    }
+    if not posted_channels:
+        return None
+    existing = store.get(post_id) if post_id else None
+    if existing is not None:
+        store.update(existing['post_id'], channels={**existing['channels'], **posted_channels})
+        return existing['post_id']
+    record = {
+        'item_id': canonical_item_id(draft['referral_link']) if draft['referral_link'] else None,
+        'product_name': draft['product_name'],
+        'price': draft['price'],
+        'price_by_lang': draft['price_by_lang'],
+        'referral_link': draft['referral_link'],
+        'category': draft['category'],
+        'channels': posted_channels
+    }
+    if draft.get('products'):
+        record['products'] = [
+            {key: product[key] for key in ('product_name', 'price', 'price_by_lang', 'referral_link', 'category')}
+            for product in draft['products']
+        ]
+    return store.add(record)
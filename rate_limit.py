@@ -0,0 +1,85 @@
+"""
+Limitatore delle chiamate alla Bot API
+Distanzia le chiamate sullo stesso canale, limita quelle totali al secondo e
+ripete la chiamata quando Telegram risponde 429 (RetryAfter)
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, TypeVar, Union
+
+from telegram.error import RetryAfter
+
+from config import API_MAX_RETRIES, CHANNEL_MIN_INTERVAL, GLOBAL_RATE_LIMIT
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+class RateLimiter:
+    """
+    Prenotazione di slot temporali per canale e globali
+
+    Ogni chiamata prenota il primo slot libero del proprio canale e il primo
+    slot globale, poi attende il più tardo dei due. La prenotazione avviene
+    senza await, quindi è atomica rispetto alle altre coroutine: canali diversi
+    procedono in parallelo, le chiamate sullo stesso canale restano distanziate.
+    """
+
+    def __init__(
+        self,
+        per_chat_interval: float = CHANNEL_MIN_INTERVAL,
+        global_rate: float = GLOBAL_RATE_LIMIT,
+        max_retries: int = API_MAX_RETRIES
+    ):
+        self.per_chat_interval = per_chat_interval
+        self.global_interval = 1.0 / global_rate if global_rate > 0 else 0.0
+        self.max_retries = max_retries
+        self._next_chat: Dict[str, float] = {}
+        self._next_global = 0.0
+
+    async def acquire(self, chat_id: Union[int, str]) -> None:
+        """Attende il proprio turno per una chiamata sul canale indicato"""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        key = str(chat_id)
+
+        chat_slot = max(now, self._next_chat.get(key, 0.0))
+        self._next_chat[key] = chat_slot + self.per_chat_interval
+        global_slot = max(now, self._next_global)
+        self._next_global = global_slot + self.global_interval
+
+        delay = max(chat_slot, global_slot) - now
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def penalize(self, chat_id: Union[int, str], seconds: float) -> None:
+        """Sposta in avanti il prossimo slot del canale (dopo un 429)"""
+        key = str(chat_id)
+        resume_at = asyncio.get_running_loop().time() + seconds
+        self._next_chat[key] = max(self._next_chat.get(key, 0.0), resume_at)
+
+    async def call(self, chat_id: Union[int, str], make_call: Callable[[], Awaitable[T]]) -> T:
+        """
+        Esegue una chiamata rispettando i limiti e ripetendola dopo un RetryAfter
+
+        Args:
+            chat_id: Canale su cui agisce la chiamata
+            make_call: Funzione senza argomenti che crea la coroutine della chiamata
+
+        Returns:
+            Il risultato della chiamata
+        """
+        attempt = 0
+        while True:
+            await self.acquire(chat_id)
+            try:
+                return await make_call()
+            except RetryAfter as e:
+                if attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                wait = float(e.retry_after)
+                logger.warning("Limite di Telegram su %s: nuovo tentativo tra %.0f s", chat_id, wait)
+                self.penalize(chat_id, wait)
@@ -18,10 +18,69 @@ from selenium.common.exceptions import TimeoutException, NoSuchElementException
 from webdriver_manager.chrome import ChromeDriverManager
 from bs4 import BeautifulSoup
 
-from config import SCRAPING_TIMEOUT, USER_AGENT
+from config import SCRAPING_TIMEOUT, USER_AGENT, SCRAPING_LEAN_SITES, SCRAPING_BLOCKED_URLS, PHASH_MAX_DISTANCE, IMAGES_CACHE_DIR
+from extractors import extract
+from image_hash import dhash, hamming
 
 logger = logging.getLogger(__name__)
 
+# Selettori XPath del prezzo e del nome, in ordine di priorità
+OOPBUY_PRICE_SELECTORS = [
+    "//span[contains(@class, 'price')]",
+    "//div[contains(@class, 'price')]",
+    "//*[contains(text(), '¥') or contains(text(), '$') or contains(text(), '€')]",
+    "//span[contains(@class, 'amount')]",
+    "//*[@class='product-price']"
+]
+OOPBUY_TITLE_SELECTORS = [
+    "//h1",
+    "//title",
+    "//*[contains(@class, 'product-title')]",
+    "//*[contains(@class, 'product-name')]",
+    "//h2"
+]
+WEIDIAN_PRICE_SELECTORS = [
+    "//span[contains(@class, 'price')]",
+    "//*[contains(text(), '¥')]",
+    "//div[@class='product-price']"
+]
+
+
+def build_chrome_options(lean: bool = False, page_load_strategy: Optional[str] = None) -> Options:
+    """
+    Opzioni di Chrome headless usate da tutti i motori di scraping
+
+    Args:
+        lean: Se True blocca immagini e media e usa il caricamento 'eager'
+        page_load_strategy: Strategia di caricamento esplicita (es. 'none' per le schede)
+    """
+    chrome_options = Options()
+    chrome_options.add_argument('--headless')  # Modalità senza interfaccia grafica
+    chrome_options.add_argument('--no-sandbox')
+    chrome_options.add_argument('--disable-dev-shm-usage')
+    chrome_options.add_argument(f'user-agent={USER_AGENT}')
+    chrome_options.add_argument('--disable-blink-features=AutomationControlled')
+    chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    chrome_options.add_experimental_option('useAutomationExtension', False)
+    
+    if lean:
+        chrome_options.page_load_strategy = 'eager'
+        chrome_options.add_argument('--blink-settings=imagesEnabled=false')
+        chrome_options.add_argument('--autoplay-policy=user-gesture-required')
+        chrome_options.add_experimental_option('prefs', {
+            'profile.managed_default_content_settings.images': 2,
+            'profile.managed_default_content_settings.media_stream': 2,
+        })
+    if page_load_strategy:
+        chrome_options.page_load_strategy = page_load_strategy
+    return chrome_options
+
+
+def create_driver(chrome_options: Options) -> webdriver.Chrome:
+    """Avvia Chrome (webdriver-manager gestisce automaticamente ChromeDriver)"""
+    service = Service(ChromeDriverManager().install())
+    return webdriver.Chrome(service=service, options=chrome_options)
+
 
 class ProductScraper:
     """
@@ -31,31 +90,35 @@ class ProductScraper:
     def __init__(self):
         """Inizializza il browser Selenium in modalità headless"""
         self.driver = None
-        self.images_cache_dir = "downloaded_images"
-        if not os.path.exists(self.images_cache_dir):
-            os.makedirs(self.images_cache_dir)
+        self.lean_sites = list(SCRAPING_LEAN_SITES)
+        self.images_cache_dir = IMAGES_CACHE_DIR
+        
+    def _use_lean_profile(self, url: str) -> bool:
+        """Verifica se il sito del link è abilitato al profilo leggero"""
+        url_lower = url.lower()
+        return any(site in url_lower for site in self.lean_sites)
+    
+    def _init_driver(self, lean: bool = False):
+        """
+        Inizializza il driver Chrome in modalità headless
         
-    def _init_driver(self):
-        """Inizializza il driver Chrome in modalità headless"""
+        Args:
+            lean: Se True blocca immagini, media, font e tracker e usa il
+                caricamento 'eager' (la pagina è pronta al DOMContentLoaded)
+        """
         try:
-            chrome_options = Options()
-            chrome_options.add_argument('--headless')  # Modalità senza interfaccia grafica
-            chrome_options.add_argument('--no-sandbox')
-            chrome_options.add_argument('--disable-dev-shm-usage')
-            chrome_options.add_argument(f'user-agent={USER_AGENT}')
-            chrome_options.add_argument('--disable-blink-features=AutomationControlled')
-            chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
-            chrome_options.add_experimental_option('useAutomationExtension', False)
+            self.driver = create_driver(build_chrome_options(lean=lean))
             
-            # Usa webdriver-manager per gestire automaticamente ChromeDriver
-            service = Service(ChromeDriverManager().install())
-            self.driver = webdriver.Chrome(service=service, options=chrome_options)
+            if lean:
+                # Blocca font, media e host di terze parti prima di caricare la pagina
+                self.driver.execute_cdp_cmd('Network.enable', {})
+                self.driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': SCRAPING_BLOCKED_URLS})
             
-            logger.info("Driver Chrome inizializzato con successo in modalità headless")
+            logger.info("Driver Chrome inizializzato con successo in modalità headless (profilo %s)", 'leggero' if lean else 'completo')
             return True
             
         except Exception as e:
-            logger.error(f"Errore nell'inizializzazione del driver: {e}")
+            logger.error("Errore nell'inizializzazione del driver: %s", e)
             return False
     
     def _close_driver(self):
@@ -65,13 +128,16 @@ class ProductScraper:
                 self.driver.quit()
                 logger.info("Driver Chrome chiuso correttamente")
             except Exception as e:
-                logger.error(f"Errore nella chiusura del driver: {e}")
+                logger.error("Errore nella chiusura del driver: %s", e)
             finally:
                 self.driver = None
     
     def _download_images(self, image_urls: List[str]) -> List[str]:
-        """Scarica le immagini localmente e restituisce i percorsi"""
+        """Scarica le immagini localmente e restituisce i percorsi (senza varianti quasi uguali)"""
         downloaded_paths = []
+        kept_hashes = []
+        # La cartella viene creata solo quando serve davvero
+        os.makedirs(self.images_cache_dir, exist_ok=True)
         
         for idx, img_url in enumerate(image_urls):
             try:
@@ -82,6 +148,14 @@ class ProductScraper:
                 response = requests.get(img_url, timeout=10, headers={'User-Agent': USER_AGENT})
                 response.raise_for_status()
                 
+                # Le gallerie dei negozi ripetono spesso la stessa foto in formati diversi
+                photo_hash = dhash(response.content)
+                if photo_hash is not None:
+                    if any(hamming(photo_hash, other) <= PHASH_MAX_DISTANCE for other in kept_hashes):
+                        logger.info("Immagine quasi uguale a una già scaricata, saltata: %s", img_url)
+                        continue
+                    kept_hashes.append(photo_hash)
+                
                 # Salva localmente
                 ext = img_url.split('.')[-1].split('?')[0][:4]  # jpg, png, etc
                 if ext not in ['jpg', 'jpeg', 'png', 'webp', 'gif']:
@@ -92,10 +166,10 @@ class ProductScraper:
                     f.write(response.content)
                 
                 downloaded_paths.append(filename)
-                logger.info(f"Immagine scaricata: {filename}")
+                logger.info("Immagine scaricata: %s", filename)
                 
             except Exception as e:
-                logger.warning(f"Impossibile scaricare {img_url}: {e}")
+                logger.warning("Impossibile scaricare %s: %s", img_url, e)
                 continue
         
         return downloaded_paths
@@ -119,10 +193,10 @@ class ProductScraper:
         }
         
         try:
-            logger.info(f"Avvio scraping Oopbuy: {url[:50]}...")
+            logger.info("Avvio scraping Oopbuy: %s...", url[:50])
             
             # Inizializza il driver
-            if not self._init_driver():
+            if not self._init_driver(lean=self._use_lean_profile(url)):
                 result['error'] = "Impossibile inizializzare il browser"
                 return result
             
@@ -132,16 +206,8 @@ class ProductScraper:
             
             # Attendi che il prezzo venga caricato (Oopbuy usa caricamento dinamico)
             # Prova diversi selettori comuni per il prezzo
-            price_selectors = [
-                "//span[contains(@class, 'price')]",
-                "//div[contains(@class, 'price')]",
-                "//*[contains(text(), '¥') or contains(text(), '$') or contains(text(), '€')]",
-                "//span[contains(@class, 'amount')]",
-                "//*[@class='product-price']"
-            ]
-            
             price = None
-            for selector in price_selectors:
+            for selector in OOPBUY_PRICE_SELECTORS:
                 try:
                     element = WebDriverWait(self.driver, SCRAPING_TIMEOUT).until(
                         EC.presence_of_element_located((By.XPATH, selector))
@@ -149,28 +215,20 @@ class ProductScraper:
                     price_text = element.text.strip()
                     if price_text and any(c.isdigit() for c in price_text):
                         price = price_text
-                        logger.info(f"Prezzo trovato: {price}")
+                        logger.info("Prezzo trovato: %s", price)
                         break
                 except TimeoutException:
                     continue
             
             # Estrai il nome del prodotto
             product_name = None
-            title_selectors = [
-                "//h1",
-                "//title",
-                "//*[contains(@class, 'product-title')]",
-                "//*[contains(@class, 'product-name')]",
-                "//h2"
-            ]
-            
-            for selector in title_selectors:
+            for selector in OOPBUY_TITLE_SELECTORS:
                 try:
                     element = self.driver.find_element(By.XPATH, selector)
                     name_text = element.text.strip()
                     if name_text and len(name_text) > 3:
                         product_name = name_text
-                        logger.info(f"Nome prodotto trovato: {product_name[:50]}...")
+                        logger.info("Nome prodotto trovato: %s...", product_name[:50])
                         break
                 except NoSuchElementException:
                     continue
@@ -226,9 +284,9 @@ class ProductScraper:
         }
         
         try:
-            logger.info(f"Avvio scraping Weidian: {url[:50]}...")
+            logger.info("Avvio scraping Weidian: %s...", url[:50])
             
-            if not self._init_driver():
+            if not self._init_driver(lean=self._use_lean_profile(url)):
                 result['error'] = "Impossibile inizializzare il browser"
                 return result
             
@@ -239,14 +297,8 @@ class ProductScraper:
             time.sleep(3)
             
             # Selettori specifici per Weidian
-            price_selectors = [
-                "//span[contains(@class, 'price')]",
-                "//*[contains(text(), '¥')]",
-                "//div[@class='product-price']"
-            ]
-            
             price = None
-            for selector in price_selectors:
+            for selector in WEIDIAN_PRICE_SELECTORS:
                 try:
                     element = WebDriverWait(self.driver, SCRAPING_TIMEOUT).until(
                         EC.presence_of_element_located((By.XPATH, selector))
@@ -287,9 +339,15 @@ class ProductScraper:
         
         return result
     
+    def _scrape_with_browser(self, site: str, url: str) -> Dict[str, Optional[str]]:
+        """Scraping con Chrome usando i selettori del sito indicato"""
+        if site == 'weidian':
+            return self.scrape_weidian(url)
+        return self.scrape_oopbuy(url)
+    
     def scrape_product(self, url: str) -> Dict[str, Optional[str]]:
         """
-        Determina automaticamente il sito e fa lo scraping appropriato
+        Sceglie l'estrattore del sito e la strategia più economica (vedi extractors.py)
         
         Args:
             url: Link del prodotto
@@ -297,16 +355,7 @@ class ProductScraper:
         Returns:
             Dizionario con i dati estratti
         """
-        url_lower = url.lower()
-        
-        if 'oopbuy' in url_lower:
-            return self.scrape_oopbuy(url)
-        elif 'weidian' in url_lower:
-            return self.scrape_weidian(url)
-        else:
-            # Prova lo scraping generico con Oopbuy come fallback
-            logger.warning(f"Sito non riconosciuto, provo scraping generico: {url[:50]}")
-            return self.scrape_oopbuy(url)
+        return extract(url, self._scrape_with_browser)
 
 
 def test_scraper():
@@ -0,0 +1,391 @@
+"""
+Motore di scraping a schede (SCRAPER_ENGINE=tabs)
+Un solo Chrome headless resta aperto nel processo del worker e ogni scraping
+gira in una scheda separata: le pagine si caricano in parallelo (fino a
+SCRAPER_MAX_TABS) senza avviare un browser per ogni link.
+
+I comandi WebDriver di una sessione non possono girare in parallelo (la scheda
+attiva è una sola), quindi passano da un lock; il caricamento delle pagine,
+che è la parte lenta, avviene invece contemporaneamente in tutte le schede.
+
+Ogni scheda vive in un contesto del browser tutto suo (Target.createBrowserContext,
+come una finestra in incognito): cookie, storage e cache di uno scraping non
+passano agli altri e spariscono alla chiusura della scheda. Sui siti di
+SCRAPING_LEAN_SITES la scheda blocca le stesse risorse del profilo leggero
+(SCRAPING_BLOCKED_URLS, immagini comprese); le opzioni di avvio del profilo
+leggero invece valgono per tutto il browser e qui non vengono usate. Se il
+browser non permette di creare contesti, le schede tornano al profilo condiviso
+(viene segnalato nei log).
+"""
+
+import logging
+import os
+import queue
+import signal
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Dict, Optional, Tuple
+
+from config import (
+    SCRAPER_MAX_TABS,
+    SCRAPING_BLOCKED_URLS,
+    SCRAPING_LEAN_SITES,
+    SCRAPING_TIMEOUT
+)
+from scraper_worker import CANCELLED_ERROR, POLL_INTERVAL, ScraperWorker, _error_result
+
+logger = logging.getLogger(__name__)
+
+# Intervallo tra due controlli della stessa scheda mentre la pagina carica (secondi)
+TAB_POLL_INTERVAL = 0.3
+
+# Pausa minima dopo l'apertura prima di cercare il prezzo (Weidian lo carica in ritardo)
+WEIDIAN_SETTLE_SECONDS = 1.0
+
+
+class TabBrowser:
+    """
+    Browser condiviso: una scheda per ogni scraping in corso
+
+    La prima scheda resta vuota e aperta, così la sessione sopravvive alla
+    chiusura delle altre. Se Chrome si chiude o si blocca, il browser viene
+    ricreato al prossimo scraping.
+    """
+
+    def __init__(self):
+        self.driver = None
+        self._home: Optional[str] = None
+        self._lock = threading.Lock()
+        # Contesto del browser di ogni scheda aperta
+        self._contexts: Dict[str, str] = {}
+        self._isolated = True
+
+    def _ensure_driver(self) -> None:
+        if self.driver is not None:
+            return
+        from scraper import build_chrome_options, create_driver
+        # 'none': driver.get() ritorna subito e la scheda carica in background
+        self.driver = create_driver(build_chrome_options(page_load_strategy='none'))
+        self._home = self.driver.current_window_handle
+        logger.info("Browser condiviso avviato")
+
+    def _reset(self) -> None:
+        """Chiude un browser non più raggiungibile (le schede aperte falliscono)"""
+        driver, self.driver = self.driver, None
+        self._contexts.clear()
+        if driver is not None:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+
+    def close(self) -> None:
+        with self._lock:
+            self._reset()
+
+    def _new_tab(self) -> str:
+        """Apre una scheda in un contesto del browser nuovo e la rende attiva"""
+        from selenium.common.exceptions import WebDriverException
+
+        if self._isolated:
+            context_id = None
+            try:
+                context_id = self.driver.execute_cdp_cmd('Target.createBrowserContext', {})['browserContextId']
+                target = self.driver.execute_cdp_cmd('Target.createTarget', {
+                    'url': 'about:blank',
+                    'browserContextId': context_id
+                })
+                # Per chromedriver l'handle di una finestra è l'ID del target
+                handle = target['targetId']
+                self.driver.switch_to.window(handle)
+                self._contexts[handle] = context_id
+                return handle
+            except WebDriverException as e:
+                if context_id is not None:
+                    self._dispose_context(context_id)
+                self._isolated = False
+                logger.warning("Contesti separati non disponibili, le schede condividono il profilo: %s", e)
+
+        self.driver.switch_to.new_window('tab')
+        return self.driver.current_window_handle
+
+    def _dispose_context(self, context_id: str) -> None:
+        try:
+            self.driver.execute_cdp_cmd('Target.disposeBrowserContext', {'browserContextId': context_id})
+        except Exception as e:
+            logger.warning("Chiusura del contesto della scheda non riuscita: %s", e)
+
+    def _open_tab(self, url: str) -> str:
+        from selenium.common.exceptions import WebDriverException
+
+        lean = any(site in url.lower() for site in SCRAPING_LEAN_SITES)
+        with self._lock:
+            self._ensure_driver()
+            try:
+                handle = self._new_tab()
+                if lean:
+                    # Il blocco vale solo per questa scheda
+                    self.driver.execute_cdp_cmd('Network.enable', {})
+                    self.driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': SCRAPING_BLOCKED_URLS})
+                self.driver.get(url)
+            except WebDriverException:
+                self._reset()
+                raise
+            return handle
+
+    def _close_tab(self, handle: str) -> None:
+        with self._lock:
+            if self.driver is None:
+                return
+            try:
+                self.driver.switch_to.window(handle)
+                self.driver.close()
+                self.driver.switch_to.window(self._home)
+            except Exception as e:
+                logger.warning("Chiusura della scheda non riuscita: %s", e)
+            # Cookie e storage dello scraping spariscono con il suo contesto
+            context_id = self._contexts.pop(handle, None)
+            if context_id is not None:
+                self._dispose_context(context_id)
+
+    def _inspect(self, handle: str, price_selectors, title_selectors) -> Tuple[Optional[str], Optional[str], bool]:
+        """
+        Cerca prezzo e nome nella scheda senza attendere
+
+        Returns:
+            (prezzo, nome, pagina completamente caricata)
+        """
+        from selenium.webdriver.common.by import By
+
+        with self._lock:
+            driver = self.driver
+            driver.switch_to.window(handle)
+            price = None
+            for selector in price_selectors:
+                elements = driver.find_elements(By.XPATH, selector)
+                if not elements:
+                    continue
+                text = elements[0].text.strip()
+                if text and any(c.isdigit() for c in text):
+                    price = text
+                    break
+
+            name = None
+            if price:
+                for selector in title_selectors:
+                    elements = driver.find_elements(By.XPATH, selector)
+                    text = elements[0].text.strip() if elements else ''
+                    if len(text) > 3:
+                        name = text
+                        break
+                if not name:
+                    name = driver.title.strip() or "Prodotto"
+
+            complete = driver.execute_script('return document.readyState') == 'complete'
+            return price, name, complete
+
+    def scrape(self, site: str, url: str) -> Dict[str, Optional[str]]:
+        """
+        Scraping di un link in una scheda dedicata, nello stesso formato di ProductScraper
+
+        Args:
+            site: Selettori da usare ('oopbuy' o 'weidian', vedi extractors.py)
+            url: Link del prodotto
+        """
+        from scraper import OOPBUY_PRICE_SELECTORS, OOPBUY_TITLE_SELECTORS, WEIDIAN_PRICE_SELECTORS
+
+        result = _error_result(None)
+        if site == 'weidian':
+            price_selectors, title_selectors, settle = WEIDIAN_PRICE_SELECTORS, ["//h1"], WEIDIAN_SETTLE_SECONDS
+        else:
+            price_selectors, title_selectors, settle = OOPBUY_PRICE_SELECTORS, OOPBUY_TITLE_SELECTORS, 0.0
+
+        started = time.monotonic()
+        try:
+            handle = self._open_tab(url)
+        except Exception as e:
+            result['error'] = f"Impossibile aprire la pagina: {e}"
+            return result
+
+        try:
+            # Come con un browser dedicato: SCRAPING_TIMEOUT per caricare la pagina...
+            deadline = started + SCRAPING_TIMEOUT
+            loaded_at = None
+            while True:
+                time.sleep(TAB_POLL_INTERVAL)
+                if time.monotonic() - started < settle:
+                    continue
+                price, name, complete = self._inspect(handle, price_selectors, title_selectors)
+                if price:
+                    result.update(price=price, product_name=name, success=True)
+                    logger.info("Scraping in scheda completato in %.1fs", time.monotonic() - started)
+                    break
+                if complete and loaded_at is None:
+                    # Pagina caricata: il prezzo dinamico ha altri SCRAPING_TIMEOUT secondi
+                    loaded_at = time.monotonic()
+                    deadline = loaded_at + SCRAPING_TIMEOUT
+                if time.monotonic() > deadline:
+                    if loaded_at is None:
+                        result['error'] = f"Timeout: la pagina non si è caricata entro {SCRAPING_TIMEOUT} secondi"
+                    else:
+                        result['error'] = "Prezzo non trovato sulla pagina"
+                    logger.warning("Scraping in scheda fallito: %s", result['error'])
+                    break
+        except Exception as e:
+            result['error'] = f"Errore durante lo scraping: {e}"
+            logger.error(result['error'], exc_info=True)
+        finally:
+            self._close_tab(handle)
+        return result
+
+
+def _tabs_worker_main(jobs, results, max_tabs: int):
+    """Ciclo del processo figlio: fino a max_tabs scraping contemporanei nello stesso browser"""
+    if hasattr(os, 'setsid'):
+        os.setsid()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    from log_setup import setup_logging
+    setup_logging()
+
+    from extractors import extract
+    browser = TabBrowser()
+
+    def run(job_id: int, url: str):
+        try:
+            # Le pagine leggibili senza browser non occupano una scheda
+            result = extract(url, browser.scrape)
+        except Exception as e:
+            result = _error_result(f"Errore durante lo scraping: {e}")
+        results.put((job_id, result))
+
+    with ThreadPoolExecutor(max_workers=max_tabs, thread_name_prefix='tab') as pool:
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+            pool.submit(run, *job)
+    browser.close()
+
+
+class TabScraperWorker(ScraperWorker):
+    """
+    Client lato bot del motore a schede
+
+    Stessa interfaccia e stesso riciclo di ScraperWorker, ma con più job in
+    volo contemporaneamente (al massimo max_tabs): un thread legge i risultati
+    del processo figlio e sblocca il job corrispondente. Il riciclo per numero
+    di job o per memoria avviene quando non ci sono scraping in corso.
+    """
+
+    def __init__(self, max_tabs: int = SCRAPER_MAX_TABS, **kwargs):
+        super().__init__(**kwargs)
+        self.max_tabs = max_tabs
+        self._slots = threading.BoundedSemaphore(max_tabs)
+        self._pending: Dict[int, Future] = {}
+
+    # ---------- Ciclo di vita del processo ----------
+
+    def _worker_target(self):
+        return _tabs_worker_main, (self._jobs, self._results, self.max_tabs)
+
+    def _start(self):
+        super()._start()
+        # Ogni processo ha i suoi job in attesa: un lettore vecchio non tocca quelli nuovi
+        self._pending = {}
+        threading.Thread(
+            target=self._read_results,
+            args=(self._process, self._results, self._pending),
+            name='scraper-tabs-results',
+            daemon=True
+        ).start()
+
+    def _stop(self, graceful: bool = True):
+        pending = self._pending
+        super()._stop(graceful)
+        self._fail(pending, "Il worker di scraping si è interrotto")
+
+    @staticmethod
+    def _fail(pending: Dict[int, Future], error: str) -> None:
+        for job_id in list(pending):
+            future = pending.pop(job_id, None)
+            if future is not None and not future.done():
+                future.set_result(_error_result(error))
+
+    def _read_results(self, process, results, pending: Dict[int, Future]) -> None:
+        while True:
+            try:
+                job_id, result = results.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                if not process.is_alive():
+                    break
+                continue
+            except (EOFError, OSError, ValueError):
+                # Coda chiusa da _stop
+                break
+            future = pending.pop(job_id, None)
+            if future is not None and not future.done():
+                future.set_result(result)
+        self._fail(pending, "Il worker di scraping si è interrotto")
+
+    def _recycle_if_idle(self) -> None:
+        if self._pending or self._process is None:
+            return
+        if self._jobs_done >= self.max_jobs:
+            self._restart(f"raggiunti {self._jobs_done} job")
+            return
+        rss = self.rss_mb()
+        if rss > self.max_rss_mb:
+            self._restart(f"memoria {rss:.0f} MB oltre la soglia di {self.max_rss_mb} MB")
+
+    @property
+    def busy(self) -> bool:
+        """True se almeno uno scraping è in corso"""
+        return bool(self._pending)
+
+    # ---------- Esecuzione dei job ----------
+
+    def _run_job(self, url: str, job_id: Optional[int] = None) -> Dict[str, Optional[str]]:
+        """
+        Esegue lo scraping in una scheda del browser condiviso e aspetta il risultato
+        Oltre max_tabs job contemporanei, i successivi attendono uno slot libero.
+        """
+        job_id = job_id or next(self._job_ids)
+
+        with self._slots:
+            if job_id in self._cancelled:
+                self._cancelled.discard(job_id)
+                return _error_result(CANCELLED_ERROR)
+
+            future: Future = Future()
+            with self._lock:
+                self._ensure_started()
+                pending = self._pending
+                pending[job_id] = future
+                self._jobs.put((job_id, url))
+            deadline = time.monotonic() + self.job_timeout
+
+            while True:
+                try:
+                    result = future.result(timeout=POLL_INTERVAL)
+                    break
+                except FutureTimeout:
+                    pass
+                if job_id in self._cancelled:
+                    # La scheda si chiude da sola entro SCRAPING_TIMEOUT: il browser non va riciclato
+                    self._cancelled.discard(job_id)
+                    pending.pop(job_id, None)
+                    return _error_result(CANCELLED_ERROR)
+                if time.monotonic() > deadline:
+                    with self._lock:
+                        if self._pending is pending:
+                            self._restart(f"job {job_id} bloccato da più di {self.job_timeout}s")
+                    return _error_result(
+                        f"Timeout: lo scraping non è terminato entro {self.job_timeout} secondi"
+                    )
+
+            with self._lock:
+                self._jobs_done += 1
+                self._recycle_if_idle()
+            self._cancelled.discard(job_id)
+            return result
@@ -0,0 +1,371 @@
+"""
+Worker di scraping in un processo separato
+Chrome gira sotto un processo figlio supervisionato: se perde memoria, si blocca
+o lascia processi orfani viene riciclato senza coinvolgere il processo del bot
+"""
+
+import asyncio
+import itertools
+import logging
+import os
+import queue
+import signal
+import threading
+import time
+import multiprocessing
+from typing import Dict, List, Optional, Set
+
+from circuit_breaker import breaker_for
+from config import (
+    SCRAPER_WORKER_MAX_JOBS,
+    SCRAPER_WORKER_MAX_RSS_MB,
+    SCRAPER_WORKER_JOB_TIMEOUT
+)
+from extractors import site_domain
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Intervallo di controllo mentre si attende il risultato di un job (secondi)
+POLL_INTERVAL = 0.5
+
+# Errore dei job annullati (non dice nulla sullo stato del sito)
+CANCELLED_ERROR = "Scraping annullato"
+
+
+def _error_result(error: str) -> Dict[str, Optional[str]]:
+    """Risultato nello stesso formato di ProductScraper per un job fallito"""
+    return {
+        'price': None,
+        'product_name': None,
+        'images': [],
+        'success': False,
+        'error': error
+    }
+
+
+def _worker_main(jobs, results):
+    """Ciclo del processo figlio: esegue gli scraping uno alla volta"""
+    # Nuova sessione: Chrome e chromedriver finiscono nel nostro process group
+    # e possono essere terminati tutti insieme in caso di riciclo
+    if hasattr(os, 'setsid'):
+        os.setsid()
+    # Ctrl+C è gestito dal processo del bot
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    from log_setup import setup_logging
+    setup_logging()
+
+    from scraper import ProductScraper
+    scraper = ProductScraper()
+
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        job_id, url = job
+        try:
+            result = scraper.scrape_product(url)
+        except Exception as e:
+            result = _error_result(f"Errore durante lo scraping: {e}")
+        results.put((job_id, result))
+
+
+def _process_tree(root_pid: int) -> List[int]:
+    """Restituisce il pid indicato e tutti i suoi discendenti (solo Linux, via /proc)"""
+    children: Dict[int, List[int]] = {}
+    try:
+        entries = os.listdir('/proc')
+    except OSError:
+        return [root_pid]
+
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # Il nome del processo può contenere spazi: il ppid segue la ')' finale
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    tree, stack = [], [root_pid]
+    while stack:
+        pid = stack.pop()
+        tree.append(pid)
+        stack.extend(children.get(pid, []))
+    return tree
+
+
+def _rss_mb(pids: List[int]) -> float:
+    """Memoria residente totale dei processi indicati, in MB"""
+    page_size = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+    total = 0
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/statm') as f:
+                total += int(f.read().split()[1]) * page_size
+        except (OSError, IndexError, ValueError):
+            continue
+    return total / (1024 * 1024)
+
+
+class ScraperWorker:
+    """
+    Client lato bot del worker di scraping
+
+    Espone la stessa interfaccia di ProductScraper (scrape_product) più una
+    versione asincrona; i job sono eseguiti uno alla volta nel processo figlio.
+    Il processo viene avviato al primo job e riciclato dopo max_jobs job, quando
+    la memoria dell'albero di processi supera max_rss_mb o quando un job supera
+    job_timeout secondi.
+
+    I job in background (es. il monitor dei prezzi) cedono il passo a quelli
+    interattivi: non partono mentre uno scraping interattivo è in corso o in
+    attesa, e quelli già in esecuzione vengono annullati quando ne arriva uno.
+    """
+
+    def __init__(
+        self,
+        max_jobs: int = SCRAPER_WORKER_MAX_JOBS,
+        max_rss_mb: int = SCRAPER_WORKER_MAX_RSS_MB,
+        job_timeout: int = SCRAPER_WORKER_JOB_TIMEOUT
+    ):
+        self.max_jobs = max_jobs
+        self.max_rss_mb = max_rss_mb
+        self.job_timeout = job_timeout
+        self.restarts = 0
+        self._ctx = multiprocessing.get_context('spawn')
+        self._process = None
+        self._jobs = None
+        self._results = None
+        self._jobs_done = 0
+        self._lock = threading.Lock()
+        self._job_ids = itertools.count(1)
+        self._cancelled: Set[int] = set()
+        # Priorità: job interattivi in corso o in attesa e job in background in esecuzione
+        self._priority_lock = threading.Lock()
+        self._interactive_jobs = 0
+        self._background_jobs: Set[int] = set()
+
+    # ---------- Ciclo di vita del processo ----------
+
+    def _worker_target(self):
+        """Entry point del processo figlio e suoi argomenti (sovrascritto da TabScraperWorker)"""
+        return _worker_main, (self._jobs, self._results)
+
+    def _start(self):
+        self._jobs = self._ctx.Queue()
+        self._results = self._ctx.Queue()
+        target, args = self._worker_target()
+        self._process = self._ctx.Process(
+            target=target,
+            args=args,
+            name='scraper-worker',
+            daemon=True
+        )
+        self._process.start()
+        self._jobs_done = 0
+        logger.info("Worker di scraping avviato (pid %s)", self._process.pid)
+
+    def _stop(self, graceful: bool = True):
+        """Ferma il processo figlio e termina eventuali Chrome rimasti orfani"""
+        process = self._process
+        if process is None:
+            return
+        self._process = None
+
+        if graceful and process.is_alive():
+            try:
+                self._jobs.put(None)
+                process.join(timeout=5)
+            except Exception:
+                pass
+
+        if process.is_alive():
+            process.terminate()
+            process.join(timeout=5)
+        if process.is_alive():
+            process.kill()
+            process.join(timeout=5)
+
+        # Il figlio è leader del suo process group: uccide Chrome/chromedriver orfani
+        if hasattr(os, 'killpg') and process.pid:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+                logger.info("Processi orfani del worker %s terminati", process.pid)
+            except ProcessLookupError:
+                pass
+            except OSError as e:
+                logger.warning("Impossibile terminare il process group %s: %s", process.pid, e)
+
+        for q in (self._jobs, self._results):
+            q.close()
+            q.cancel_join_thread()
+
+    def _restart(self, reason: str):
+        logger.warning("Riciclo del worker di scraping: %s", reason)
+        self._stop(graceful=False)
+        self.restarts += 1
+
+    def _ensure_started(self):
+        if self._process is None or not self._process.is_alive():
+            if self._process is not None:
+                self._restart(f"processo terminato con codice {self._process.exitcode}")
+            self._start()
+
+    @property
+    def busy(self) -> bool:
+        """True se un job è in esecuzione (o un altro è in attesa del lock)"""
+        return self._lock.locked()
+
+    def rss_mb(self) -> float:
+        """Memoria residente del worker e dei suoi processi Chrome, in MB"""
+        if self._process is None or not self._process.pid:
+            return 0.0
+        return _rss_mb(_process_tree(self._process.pid))
+
+    def close(self):
+        """Ferma il worker (da chiamare allo spegnimento del bot)"""
+        with self._lock:
+            self._stop(graceful=True)
+
+    # ---------- Esecuzione dei job ----------
+
+    def _begin(self, job_id: int, background: bool) -> bool:
+        """
+        Registra il job: uno interattivo annulla i job in background in esecuzione
+
+        Returns:
+            False se il job è in background e c'è uno scraping interattivo in corso o in attesa
+        """
+        with self._priority_lock:
+            if background:
+                if self._interactive_jobs:
+                    return False
+                self._background_jobs.add(job_id)
+                return True
+            self._interactive_jobs += 1
+            preempted = list(self._background_jobs)
+        for other in preempted:
+            metrics.increment('scraper_background_preempted')
+            logger.info("Job %s in background annullato: precedenza allo scraping interattivo", other)
+            self.cancel(other)
+        return True
+
+    def _end(self, job_id: int, background: bool) -> None:
+        with self._priority_lock:
+            if background:
+                self._background_jobs.discard(job_id)
+            else:
+                self._interactive_jobs -= 1
+
+    def scrape_product(
+        self,
+        url: str,
+        job_id: Optional[int] = None,
+        background: bool = False
+    ) -> Dict[str, Optional[str]]:
+        """
+        Esegue lo scraping e aspetta il risultato, se il circuito del sito lo
+        permette (vedi circuit_breaker.py): con il circuito aperto lo scraping
+        fallisce subito, senza occupare il worker
+
+        Args:
+            url: Link del prodotto
+            job_id: Identificativo del job (usato da cancel)
+            background: Job a bassa priorità, annullato se arriva uno scraping interattivo
+
+        Returns:
+            Dizionario nello stesso formato di ProductScraper.scrape_product
+        """
+        domain = site_domain(url)
+        breaker = breaker_for(domain)
+        if not breaker.allow():
+            metrics.increment('circuit_rejected')
+            retry_after = breaker.retry_after()
+            wait = f" (nuovo tentativo tra {retry_after:.0f} s)" if retry_after else ""
+            logger.info("Scraping di %s saltato: circuito aperto", domain)
+            return _error_result(f"{domain} non risponde: scraping sospeso{wait}")
+
+        job_id = job_id or next(self._job_ids)
+        if not self._begin(job_id, background):
+            breaker.release()
+            return _error_result(CANCELLED_ERROR)
+        try:
+            result = self._run_job(url, job_id)
+        except BaseException:
+            breaker.release()
+            raise
+        finally:
+            self._end(job_id, background)
+        if result.get('success'):
+            breaker.record_success()
+        elif result.get('error') == CANCELLED_ERROR:
+            breaker.release()
+        else:
+            breaker.record_failure()
+        return result
+
+    def _run_job(self, url: str, job_id: Optional[int] = None) -> Dict[str, Optional[str]]:
+        """Esegue lo scraping nel processo figlio e aspetta il risultato"""
+        job_id = job_id or next(self._job_ids)
+
+        with self._lock:
+            if job_id in self._cancelled:
+                self._cancelled.discard(job_id)
+                return _error_result(CANCELLED_ERROR)
+
+            self._ensure_started()
+            self._jobs.put((job_id, url))
+            deadline = time.monotonic() + self.job_timeout
+
+            while True:
+                try:
+                    result_id, result = self._results.get(timeout=POLL_INTERVAL)
+                except queue.Empty:
+                    if job_id in self._cancelled:
+                        self._cancelled.discard(job_id)
+                        self._restart(f"job {job_id} annullato")
+                        return _error_result(CANCELLED_ERROR)
+                    if not self._process.is_alive():
+                        self._restart(f"processo terminato durante il job {job_id}")
+                        return _error_result("Il worker di scraping si è interrotto")
+                    if time.monotonic() > deadline:
+                        self._restart(f"job {job_id} bloccato da più di {self.job_timeout}s")
+                        return _error_result(
+                            f"Timeout: lo scraping non è terminato entro {self.job_timeout} secondi"
+                        )
+                    continue
+
+                # Scarta risultati di job precedenti annullati
+                if result_id == job_id:
+                    break
+
+            self._jobs_done += 1
+            if self._jobs_done >= self.max_jobs:
+                self._restart(f"raggiunti {self._jobs_done} job")
+            else:
+                rss = self.rss_mb()
+                if rss > self.max_rss_mb:
+                    self._restart(f"memoria {rss:.0f} MB oltre la soglia di {self.max_rss_mb} MB")
+
+            # Un annullamento arrivato a job già concluso non serve più
+            self._cancelled.discard(job_id)
+            return result
+
+    async def scrape(self, url: str, background: bool = False) -> Dict[str, Optional[str]]:
+        """
+        Versione asincrona di scrape_product, non blocca l'event loop
+        Se il task viene annullato, annulla anche il job nel worker
+        """
+        job_id = next(self._job_ids)
+        try:
+            return await asyncio.to_thread(self.scrape_product, url, job_id, background)
+        except asyncio.CancelledError:
+            self.cancel(job_id)
+            raise
+
+    def cancel(self, job_id: int):
+        """Annulla un job in attesa o in esecuzione (il worker in esecuzione viene riciclato)"""
+        self._cancelled.add(job_id)
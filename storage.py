@@ -0,0 +1,54 @@
+"""
+Persistenza locale su file JSON
+Scritture atomiche: un crash a metà non lascia mai un file troncato
+"""
+
+import json
+import logging
+import os
+import tempfile
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+def load_json(path: str, default: Any) -> Any:
+    """
+    Legge un file JSON
+
+    Args:
+        path: Percorso del file
+        default: Valore restituito se il file non esiste o non è leggibile
+
+    Returns:
+        Contenuto del file o il valore di default
+    """
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error("Impossibile leggere %s: %s", path, e)
+        return default
+
+
+def save_json(path: str, data: Any) -> None:
+    """
+    Scrive un file JSON in modo atomico (file temporaneo + rename)
+
+    Args:
+        path: Percorso del file
+        data: Dati serializzabili in JSON
+    """
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix='.json')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -3,9 +3,113 @@ Template multilingua per i messaggi del bot
 Include template per i post sui canali in diverse lingue
 """
 
-from typing import Dict
+import re
+from typing import Dict, Iterable, List, Tuple
 from config import CATEGORIES
 
+# Limite di Telegram per la caption di una foto (caratteri visibili, in unità UTF-16)
+CAPTION_MAX_LENGTH = 1024
+
+# Lunghezza minima a cui può essere accorciato il nome del prodotto
+MIN_PRODUCT_NAME_LENGTH = 16
+
+# Caratteri speciali del Markdown (legacy) di Telegram
+_MARKDOWN_SPECIAL_RE = re.compile(r'([_*`\[])')
+_LINK_RE = re.compile(r'\[([^\]]*)\]\(([^)\s]*)\)')
+
+
+def escape_markdown(text: str) -> str:
+    """Escape dei caratteri speciali per il testo fuori dalle entità (_ * ` [)"""
+    return _MARKDOWN_SPECIAL_RE.sub(r'\\\1', text)
+
+
+def _entity_text(text: str, marker: str) -> str:
+    """
+    Testo da mettere dentro un'entità (es. *grassetto*)
+    Dentro un'entità il Markdown legacy non ammette escape: l'unico carattere
+    che la romperebbe è il suo delimitatore, sostituito con un simbolo simile
+    """
+    lookalikes = {'*': '∗', '_': '＿', '`': "'"}
+    return text.replace(marker, lookalikes[marker]).replace('\n', ' ')
+
+
+def _link_url(url: str) -> str:
+    """URL sicuro dentro (...) di un link Markdown: niente spazi né parentesi"""
+    return url.strip().replace(' ', '%20').replace('(', '%28').replace(')', '%29')
+
+
+def _utf16_length(text: str) -> int:
+    return len(text.encode('utf-16-le')) // 2
+
+
+def _parse_markdown(caption: str) -> Tuple[str, List[str]]:
+    """Interpreta la caption come il Markdown legacy di Telegram: (testo visibile, problemi)"""
+    problems = []
+    visible = []
+    i = 0
+    while i < len(caption):
+        char = caption[i]
+        if char == '\\' and i + 1 < len(caption) and caption[i + 1] in '_*`[':
+            visible.append(caption[i + 1])
+            i += 2
+        elif char in '*_`':
+            end = caption.find(char, i + 1)
+            if end == -1:
+                problems.append(f"entità {char} aperta alla posizione {i} e mai chiusa")
+                visible.append(caption[i + 1:])
+                break
+            visible.append(caption[i + 1:end])
+            i = end + 1
+        elif char == '[':
+            match = _LINK_RE.match(caption, i)
+            if not match:
+                problems.append(f"link non valido alla posizione {i}")
+                visible.append(char)
+                i += 1
+            else:
+                visible.append(match.group(1))
+                i = match.end()
+        else:
+            visible.append(char)
+            i += 1
+    return ''.join(visible), problems
+
+
+def caption_length(caption: str) -> int:
+    """Lunghezza visibile della caption (senza simboli Markdown e URL dei link), in unità UTF-16"""
+    return _utf16_length(_parse_markdown(caption)[0])
+
+
+def check_caption(caption: str) -> List[str]:
+    """
+    Controlla in locale una caption in Markdown legacy, come farebbe Telegram
+
+    Verifica che ogni entità (*, _, `) sia chiusa, che i link siano nella forma
+    [testo](url) e che il testo visibile non superi CAPTION_MAX_LENGTH.
+
+    Returns:
+        Lista dei problemi trovati (vuota se la caption è valida)
+    """
+    text, problems = _parse_markdown(caption)
+    length = _utf16_length(text)
+    if length > CAPTION_MAX_LENGTH:
+        problems.append(f"caption di {length} caratteri, il limite è {CAPTION_MAX_LENGTH}")
+    return problems
+
+
+def truncate_text(text: str, limit: int) -> str:
+    """
+    Accorcia il testo a `limit` caratteri, preferibilmente a fine parola, con '…'
+    """
+    if len(text) <= limit:
+        return text
+    cut = text[:max(limit - 1, 1)]
+    space = cut.rfind(' ')
+    # Taglia sullo spazio solo se non si perde più di un terzo del testo disponibile
+    if space >= len(cut) * 2 // 3:
+        cut = cut[:space]
+    return cut.rstrip(' ,.-–/|') + '…'
+
 
 def hide_link(url: str, text: str) -> str:
     """
@@ -31,6 +135,9 @@ def create_post_caption(
     """
     Crea la didascalia per il post del prodotto nella lingua specificata
     
+    Nome, prezzo e link vengono resi sicuri per il Markdown; se la caption supera
+    CAPTION_MAX_LENGTH il nome del prodotto viene accorciato a fine parola.
+    
     Args:
         product_name: Nome del prodotto
         price: Prezzo del prodotto
@@ -41,6 +148,27 @@ def create_post_caption(
     Returns:
         Didascalia formattata per Telegram con Markdown
     """
+    name = _entity_text(product_name.strip(), '*')
+    safe_price = escape_markdown(price)
+    safe_link = _link_url(referral_link)
+    
+    caption = _render_post_caption(name, safe_price, safe_link, category, language)
+    overflow = caption_length(caption) - CAPTION_MAX_LENGTH
+    while overflow > 0 and len(name) > MIN_PRODUCT_NAME_LENGTH:
+        name = truncate_text(name, max(len(name) - overflow, MIN_PRODUCT_NAME_LENGTH))
+        caption = _render_post_caption(name, safe_price, safe_link, category, language)
+        overflow = caption_length(caption) - CAPTION_MAX_LENGTH
+    return caption
+
+
+def _render_post_caption(
+    product_name: str,
+    price: str,
+    referral_link: str,
+    category: str,
+    language: str
+) -> str:
+    """Applica il template della lingua a valori già resi sicuri per il Markdown"""
     
     # Recupera i dati della categoria per la lingua specificata
     cat_data = CATEGORIES.get(category, CATEGORIES['clothing']).get(language, {})
@@ -98,6 +226,98 @@ def create_post_caption(
     return templates.get(language, templates['EN'])
 
 
+# Testi fissi del digest (più prodotti in un solo post) per lingua
+DIGEST_TEXTS = {
+    'IT': {'title': "Nuovi arrivi", 'hashtags': "#Fashion #Style #Shopping", 'footer': "👇 Tocca il bottone del prodotto per acquistarlo"},
+    'EN': {'title': "New arrivals", 'hashtags': "#Fashion #Style #Shopping", 'footer': "👇 Tap a product's button to buy it"},
+    'ES': {'title': "Novedades", 'hashtags': "#Moda #Estilo #Compras", 'footer': "👇 Toca el botón del producto para comprarlo"},
+}
+
+# Lunghezza iniziale dei nomi nel digest, ridotta finché la caption non rientra nel limite
+DIGEST_NAME_LENGTH = 60
+
+
+def create_digest_caption(products: List[Dict], language: str) -> str:
+    """
+    Caption di un digest: un elenco numerato dei prodotti con il loro prezzo
+    
+    I link sono nei bottoni sotto l'album (uno per prodotto, con lo stesso numero);
+    se la caption supera CAPTION_MAX_LENGTH i nomi vengono accorciati.
+    
+    Args:
+        products: Bozze dei prodotti (product_name, price, price_by_lang, category)
+        language: Codice lingua ('IT', 'EN', 'ES')
+    """
+    texts = DIGEST_TEXTS.get(language, DIGEST_TEXTS['EN'])
+    hashtags = []
+    for product in products:
+        hashtag = CATEGORIES.get(product['category'], CATEGORIES['clothing']).get(language, {}).get('hashtag', '#FASHION')
+        if hashtag not in hashtags:
+            hashtags.append(hashtag)
+    
+    def render(name_length: int) -> str:
+        lines = [f"🔥 *{texts['title']}* 🔥", ""]
+        for number, product in enumerate(products, 1):
+            emoji = CATEGORIES.get(product['category'], CATEGORIES['clothing']).get(language, {}).get('emoji', '✨')
+            name = _entity_text(truncate_text(product['product_name'].strip(), name_length), '*')
+            price = escape_markdown(product.get('price_by_lang', {}).get(language, product['price']))
+            lines.append(f"{number}. {emoji} *{name}* · {price}")
+        lines += ["", " ".join(hashtags + [texts['hashtags']]), "", texts['footer']]
+        return "\n".join(lines)
+    
+    name_length = DIGEST_NAME_LENGTH
+    caption = render(name_length)
+    while caption_length(caption) > CAPTION_MAX_LENGTH and name_length > MIN_PRODUCT_NAME_LENGTH:
+        name_length = max(name_length - 8, MIN_PRODUCT_NAME_LENGTH)
+        caption = render(name_length)
+    return caption
+
+
+def build_captions(post: Dict, languages: Iterable[str]) -> Tuple[Dict[str, str], Dict[str, List[str]]]:
+    """
+    Crea e controlla le caption di tutte le lingue, prima di qualsiasi chiamata di rete
+    
+    Args:
+        post: Bozza o post pubblicato (product_name, price, price_by_lang, referral_link, category),
+              oppure digest con la lista 'products'
+        languages: Lingue dei canali
+        
+    Returns:
+        (lingua -> caption, lingua -> problemi) con il secondo dizionario vuoto se tutte sono valide
+    """
+    captions: Dict[str, str] = {}
+    problems: Dict[str, List[str]] = {}
+    for lang_code in languages:
+        if post.get('products'):
+            caption = create_digest_caption(post['products'], lang_code)
+        else:
+            caption = create_post_caption(
+                product_name=post['product_name'],
+                price=post.get('price_by_lang', {}).get(lang_code, post['price']),
+                referral_link=post['referral_link'],
+                category=post['category'],
+                language=lang_code
+            )
+        captions[lang_code] = caption
+        errors = check_caption(caption)
+        if errors:
+            problems[lang_code] = errors
+    return captions, problems
+
+
+# Etichetta del bottone di acquisto sotto ogni post
+BUY_BUTTON_LABELS = {
+    'IT': '🛒 Acquista qui',
+    'EN': '🛒 Buy here',
+    'ES': '🛒 Comprar aquí'
+}
+
+
+def get_buy_button_label(language: str) -> str:
+    """Restituisce l'etichetta del bottone di acquisto nella lingua specificata"""
+    return BUY_BUTTON_LABELS.get(language, BUY_BUTTON_LABELS['EN'])
+
+
 def get_bot_messages(language: str = 'IT') -> Dict[str, str]:
     """
     Restituisce i messaggi del bot nella lingua specificata
@@ -154,6 +374,25 @@ Per favore, inviami il prezzo del prodotto manualmente (es. ¥199 o $29.99)
             
             'need_media_and_link': "⚠️ Inviami un gruppo di foto insieme al link del prodotto nel messaggio.",
             
+            'duplicate_warning': "⚠️ Possibile duplicato: «{product}» è già stato pubblicato il {date}. Se vuoi ripubblicarlo continua pure, altrimenti usa /cancel.",
+            
+            'duplicate_photo_dropped': "♻️ Questa foto è quasi uguale a un'altra già ricevuta: l'ho scartata.",
+            
+            'draft_expired': "⌛ La bozza è scaduta per inattività ed è stata eliminata. Inviami di nuovo foto e link per ricominciare.",
+            'draft_evicted': "⌛ Troppe bozze aperte: la tua, la più vecchia, è stata eliminata. Inviami di nuovo foto e link per ricominciare.",
+            
+            'suggest_name': "💡 Dal link ho trovato il nome: tocca il suggerimento o scrivine uno tuo.",
+            'suggest_price': "💡 Dal link ho trovato il prezzo: tocca il suggerimento o scrivine uno tuo.",
+            'suggested_category': "⭐ {name} (suggerita)",
+            'category_detected': "🏷 Categoria riconosciuta dal nome: {name}",
+            'button_change_category': "✏️ Cambia categoria",
+            
+            'digest_queued': "🗂 Aggiunto al digest ({count}/{max}). Usa /digest per pubblicarlo subito.",
+            'digest_publishing': "⏳ Pubblico il digest di {count} prodotti...",
+            'digest_empty': "📭 Nessun prodotto in attesa del digest.",
+            
+            'preflight_problems': "⚠️ Problemi sui canali all'avvio:\n{details}\n\nLe pubblicazioni su questi canali falliranno finché non li correggi.",
+            
             'button_confirm': "✅ Conferma e Pubblica",
             'button_cancel': "❌ Annulla"
         },
@@ -202,6 +441,25 @@ Please send me the product price manually (e.g., ¥199 or $29.99)
             
             'need_media_and_link': "⚠️ Send me a media group with the product link in the message.",
             
+            'duplicate_warning': "⚠️ Possible duplicate: «{product}» was already published on {date}. Continue to publish it again, or use /cancel.",
+            
+            'duplicate_photo_dropped': "♻️ This photo is nearly identical to one you already sent: I skipped it.",
+            
+            'draft_expired': "⌛ Your draft expired after a period of inactivity and was deleted. Send photos and link again to start over.",
+            'draft_evicted': "⌛ Too many open drafts: yours was the oldest and was deleted. Send photos and link again to start over.",
+            
+            'suggest_name': "💡 I found the name from the link: tap the suggestion or type your own.",
+            'suggest_price': "💡 I found the price from the link: tap the suggestion or type your own.",
+            'suggested_category': "⭐ {name} (suggested)",
+            'category_detected': "🏷 Category recognised from the name: {name}",
+            'button_change_category': "✏️ Change category",
+            
+            'digest_queued': "🗂 Added to the digest ({count}/{max}). Use /digest to publish it now.",
+            'digest_publishing': "⏳ Publishing the digest of {count} products...",
+            'digest_empty': "📭 No products waiting for the digest.",
+            
+            'preflight_problems': "⚠️ Channel problems at startup:\n{details}\n\nPublishing to these channels will fail until you fix them.",
+            
             'button_confirm': "✅ Confirm and Publish",
             'button_cancel': "❌ Cancel"
         },
@@ -250,6 +508,25 @@ Por favor, envíame el precio del producto manualmente (ej. ¥199 o $29.99)
             
             'need_media_and_link': "⚠️ Envíame un grupo de fotos con el enlace del producto en el mensaje.",
             
+            'duplicate_warning': "⚠️ Posible duplicado: «{product}» ya se publicó el {date}. Continúa para publicarlo de nuevo, o usa /cancel.",
+            
+            'duplicate_photo_dropped': "♻️ Esta foto es casi igual a otra que ya enviaste: la he descartado.",
+            
+            'draft_expired': "⌛ El borrador caducó por inactividad y se eliminó. Envíame de nuevo fotos y enlace para empezar otra vez.",
+            'draft_evicted': "⌛ Demasiados borradores abiertos: el tuyo era el más antiguo y se eliminó. Envíame de nuevo fotos y enlace para empezar otra vez.",
+            
+            'suggest_name': "💡 He encontrado el nombre en el enlace: toca la sugerencia o escribe el tuyo.",
+            'suggest_price': "💡 He encontrado el precio en el enlace: toca la sugerencia o escribe el tuyo.",
+            'suggested_category': "⭐ {name} (sugerida)",
+            'category_detected': "🏷 Categoría reconocida por el nombre: {name}",
+            'button_change_category': "✏️ Cambiar categoría",
+            
+            'digest_queued': "🗂 Añadido al resumen ({count}/{max}). Usa /digest para publicarlo ahora.",
+            'digest_publishing': "⏳ Publicando el resumen de {count} productos...",
+            'digest_empty': "📭 No hay productos esperando el resumen.",
+            
+            'preflight_problems': "⚠️ Problemas en los canales al arrancar:\n{details}\n\nLas publicaciones en estos canales fallarán hasta que los corrijas.",
+            
             'button_confirm': "✅ Confirmar y Publicar",
             'button_cancel': "❌ Cancelar"
         }
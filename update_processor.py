@@ -0,0 +1,119 @@
+"""
+Elaborazione concorrente degli update con ordine garantito per conversazione
+Update di utenti o chat diversi vengono elaborati in parallelo; quelli della
+stessa conversazione (chat + utente, come il ConversationHandler) uno dopo
+l'altro, nell'ordine di arrivo.
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Dict, Hashable, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+
+class _Batch:
+    """Gruppo di update consecutivi della stessa conversazione eseguiti insieme"""
+
+    __slots__ = ('media_group_id', 'previous', 'done', 'running')
+
+    def __init__(self, media_group_id: Optional[str], previous: Optional[asyncio.Future]):
+        self.media_group_id = media_group_id
+        self.previous = previous
+        self.done: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.running = 0
+
+
+class ConversationOrderedProcessor(BaseUpdateProcessor):
+    """
+    Update processor con una coda FIFO per ogni conversazione
+
+    Ogni update attende che sia terminato il gruppo precedente della propria
+    conversazione. Le foto di uno stesso album (stesso media_group_id) formano
+    un unico gruppo ed entrano in parallelo: così l'attesa di handle_media_group
+    raccoglie tutte le foto invece di bloccare le successive. Il messaggio
+    seguente (es. il nome del prodotto) parte solo quando l'album è completato.
+
+    L'attesa del proprio turno avviene prima di occupare uno dei
+    max_concurrent_updates posti: un operatore con molti messaggi in coda
+    (es. durante uno scraping lento) non blocca le altre conversazioni.
+    """
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self._tails: Dict[Hashable, _Batch] = {}
+
+    @staticmethod
+    def _key(update: object) -> Optional[Hashable]:
+        if not isinstance(update, Update):
+            return None
+        chat = update.effective_chat
+        user = update.effective_user
+        if chat is None and user is None:
+            return None
+        return (chat.id if chat else None, user.id if user else None)
+
+    def _join(self, key: Hashable, media_group_id: Optional[str]) -> _Batch:
+        """Aggiunge l'update all'album in corso o accoda un nuovo gruppo"""
+        tail = self._tails.get(key)
+        if (
+            tail is not None
+            and media_group_id is not None
+            and tail.media_group_id == media_group_id
+            and not tail.done.done()
+        ):
+            batch = tail
+        else:
+            batch = _Batch(media_group_id, tail.done if tail else None)
+            self._tails[key] = batch
+        batch.running += 1
+        return batch
+
+    def _leave(self, key: Hashable, batch: _Batch) -> None:
+        batch.running -= 1
+        if batch.running == 0:
+            batch.done.set_result(None)
+            if self._tails.get(key) is batch:
+                del self._tails[key]
+
+    async def process_update(self, update: object, coroutine: Awaitable[Any]) -> None:  # type: ignore[misc]
+        """
+        Come BaseUpdateProcessor.process_update, ma il posto del semaforo viene
+        preso solo quando è il turno dell'update nella sua conversazione
+        """
+        key = self._key(update)
+        if key is None:
+            async with self._semaphore:
+                await self.do_process_update(update, coroutine)
+            return
+
+        message = update.effective_message if isinstance(update, Update) else None
+        batch = self._join(key, message.media_group_id if message else None)
+        try:
+            if batch.previous is not None:
+                try:
+                    # shield: un update annullato non deve annullare l'attesa degli altri
+                    await asyncio.shield(batch.previous)
+                except asyncio.CancelledError:
+                    if asyncio.iscoroutine(coroutine):
+                        coroutine.close()
+                    raise
+            async with self._semaphore:
+                await self.do_process_update(update, coroutine)
+        finally:
+            self._leave(key, batch)
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        await coroutine
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pending = len(self._tails)
+        if pending:
+            logger.info("Update processor fermato con %d conversazioni ancora in coda", pending)
+        self._tails.clear()